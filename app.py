@@ -1,11 +1,39 @@
 import streamlit as st
+import streamlit.components.v1 as components
 import os
 import re
 import subprocess
 import shutil
 import platform
+import sqlite3
+import queue
 import tempfile
 import sys
+import threading
+import time
+import traceback
+import uuid
+import wave
+import zlib
+
+import base64
+import functools
+import hashlib
+import hmac
+import importlib
+import importlib.util
+import json
+import struct
+import unicodedata
+import urllib.request
+import warnings
+import zipfile
+from collections import Counter, OrderedDict
+
+# Startup timing - measured from here to the end of module setup
+_APP_IMPORT_STARTED = time.perf_counter()
+IMPORT_BUDGET_MS = float(os.environ.get("EATTS_IMPORT_BUDGET_MS", "1500"))
+STARTUP_TIMING_KEY = "app startup"
 
 # Core imports with error handling
 # These are required - if they fail, we'll handle it gracefully
@@ -14,30 +42,82 @@ try:
 except ImportError:
     np = None
     # Don't use st.error here as Streamlit might not be ready yet
-    import warnings
     warnings.warn("numpy is required but not installed")
 
-try:
-    from transformers import pipeline
-except ImportError as e:
-    pipeline = None
-    import warnings
-    warnings.warn(f"transformers library is required but not installed: {e}")
+# Optional dependencies - LAZY IMPORTS
+# Availability is checked without importing (find_spec is cheap); the
+# heavy modules (transformers, gTTS, pdfplumber, PyPDF2, python-docx,
+# reportlab, pyttsx3, deep_translator) are imported on first use so a
+# session only pays for what it actually touches.
+def _module_available(module_name):
+    """Check whether a module can be imported without importing it"""
+    if module_name in sys.modules:
+        return True
+    try:
+        return importlib.util.find_spec(module_name) is not None
+    except (ImportError, ValueError):
+        return False
+
+@st.cache_resource
+def get_import_timings():
+    """Process-wide record of deferred import costs (module -> seconds)"""
+    return {}
+
+def get_import_report():
+    """Startup cost against the EATTS_IMPORT_BUDGET_MS budget, plus deferred import costs"""
+    timings = dict(_import_timings)
+    startup_ms = timings.pop(STARTUP_TIMING_KEY, 0.0) * 1000
+    deferred_ms = {name: seconds * 1000 for name, seconds in sorted(timings.items(), key=lambda x: -x[1])}
+    return {
+        'startup_ms': startup_ms,
+        'budget_ms': IMPORT_BUDGET_MS,
+        'within_budget': startup_ms <= IMPORT_BUDGET_MS,
+        'deferred_ms': deferred_ms,
+    }
+
+def _lazy_import(module_name):
+    """Import a module on first use and record how long the import took"""
+    module = sys.modules.get(module_name)
+    # A module another thread is still importing is only partly initialised;
+    # import_module waits for that import to finish instead
+    if module is not None and not getattr(getattr(module, "__spec__", None), "_initializing", False):
+        return module
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    _import_timings[module_name] = time.perf_counter() - started
+    return module
+
+# Bound once per script run so background threads never call the cached
+# accessor themselves (Streamlit logs a warning for every cache call made
+# outside a session thread)
+_import_timings = get_import_timings()
+
+TRANSFORMERS_AVAILABLE = _module_available("transformers")
+if not TRANSFORMERS_AVAILABLE:
+    warnings.warn("transformers library is required but not installed")
+
+GTTS_AVAILABLE = _module_available("gtts")
+if not GTTS_AVAILABLE:
+    warnings.warn("gTTS library is required but not installed")
+
+def _get_gtts():
+    """Lazy import of the gTTS class"""
+    return _lazy_import("gtts").gTTS
 
-try:
-    from gtts import gTTS
-except ImportError as e:
-    gTTS = None
-    import warnings
-    warnings.warn(f"gTTS library is required but not installed: {e}")
 # Audio processing - LAZY IMPORTS ONLY
 # pydub is imported only when needed to avoid any startup errors
 # This function safely imports pydub and returns availability status
 def _get_pydub():
     """Lazy import of pydub - only imports when actually needed"""
     global _pydub_cache
-    if _pydub_cache is None:
-        _pydub_cache = {'available': False, 'AudioSegment': None, 'speedup': None, 'normalize': None}
+    if _pydub_cache is not None:
+        return _pydub_cache
+    # Batch workers speak several files at once; the others wait here
+    # rather than seeing a half-built cache that says pydub is missing
+    with _pydub_lock:
+        if _pydub_cache is not None:
+            return _pydub_cache
+        unavailable = {'available': False, 'AudioSegment': None, 'speedup': None, 'normalize': None}
         try:
             # Check if audioop is available first (Python 3.11 has it built-in)
             try:
@@ -47,9 +127,11 @@ def _get_pydub():
                 try:
                     import pyaudioop  # type: ignore
                 except ImportError:
+                    _pydub_cache = unavailable
                     return _pydub_cache  # No audioop available, pydub won't work
             
             # Now try to import pydub
+            _lazy_import("pydub")
             from pydub import AudioSegment  # type: ignore
             from pydub.effects import speedup, normalize  # type: ignore
             _pydub_cache = {
@@ -60,58 +142,35 @@ def _get_pydub():
             }
         except Exception:
             # pydub not available or failed to import - that's OK
-            pass
+            _pydub_cache = unavailable
     return _pydub_cache
 
 # Initialize cache
 _pydub_cache = None
+_pydub_lock = threading.Lock()
+from contextlib import contextmanager
 from io import BytesIO
 from datetime import datetime
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from streamlit.errors import StreamlitAPIException
 
-# PDF and Document processing
-try:
-    import pdfplumber
-    PDFPLUMBER_AVAILABLE = True
-except ImportError:
-    PDFPLUMBER_AVAILABLE = False
-
-try:
-    import PyPDF2
-    PYPDF2_AVAILABLE = True
-except ImportError:
-    PYPDF2_AVAILABLE = False
+import id3_chapters
+from project_store import ProjectStore
 
-try:
-    from docx import Document
-    DOCX_AVAILABLE = True
-except ImportError:
-    DOCX_AVAILABLE = False
+# PDF and Document processing
+PDFPLUMBER_AVAILABLE = _module_available("pdfplumber")
+PYPDF2_AVAILABLE = _module_available("PyPDF2")
+DOCX_AVAILABLE = _module_available("docx")
 
 # PDF generation
-try:
-    from reportlab.lib.pagesizes import letter, A4
-    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-    from reportlab.lib.units import inch
-    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
-    from reportlab.lib import colors
-    from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_JUSTIFY
-    REPORTLAB_AVAILABLE = True
-except ImportError:
-    REPORTLAB_AVAILABLE = False
+REPORTLAB_AVAILABLE = _module_available("reportlab")
 
 # Text-to-Speech with voice selection
-try:
-    import pyttsx3
-    PYTTSX3_AVAILABLE = True
-except ImportError:
-    PYTTSX3_AVAILABLE = False
+PYTTSX3_AVAILABLE = _module_available("pyttsx3")
 
 # Translation support
-try:
-    from deep_translator import GoogleTranslator
-    TRANSLATOR_AVAILABLE = True
-except ImportError:
-    TRANSLATOR_AVAILABLE = False
+TRANSLATOR_AVAILABLE = _module_available("deep_translator")
 
 # Supported languages for translation & TTS
 SUPPORTED_LANGUAGES = {
@@ -138,17 +197,32 @@ def get_tts_language_code(lang_code: str) -> str:
     return GTT_LANGUAGE_MAP.get(lang_code.lower(), lang_code.lower())
 
 # Page configuration
-st.set_page_config(
-    page_title="Emotion-Aware Text-to-Speech Tutor",
-    page_icon="🎙️",
-    layout="wide"
-)
+def configure_page():
+    """Must be the first Streamlit command of every script run"""
+    st.set_page_config(
+        page_title="Emotion-Aware Text-to-Speech Tutor",
+        page_icon="🎙️",
+        layout="wide"
+    )
 
 # Initialize emotion classifier
-@st.cache_resource
-def load_emotion_model():
-    """Load the emotion classification model"""
-    if pipeline is None:
+# The deployment's model: a key of model_weights.EMOTION_MODELS (small,
+# base, multilingual), a model name on the HuggingFace Hub, or a local directory
+EMOTION_MODEL_NAME = os.environ.get("EATTS_EMOTION_MODEL", "base")
+# Further models sessions may pick in the sidebar (comma-separated, same forms)
+EMOTION_MODEL_CHOICES = [name.strip() for name in os.environ.get("EATTS_EMOTION_MODELS", "").split(",") if name.strip()]
+
+def resolve_emotion_model(model=None):
+    """(key, spec) of `model`, or of the deployment's model when None"""
+    return _lazy_import("model_weights").resolve_model(model or EMOTION_MODEL_NAME)
+
+def load_emotion_model(model=None):
+    """Load an emotion classification model (the deployment's when None)"""
+    return _load_emotion_model(resolve_emotion_model(model)[0])
+
+def _load_emotion_model(model_key):
+    """Build one model's pipeline; the inference server registry keeps one per model, so every session choosing it shares that copy"""
+    if not TRANSFORMERS_AVAILABLE:
         return None
     try:
         # Use CPU for Streamlit Cloud compatibility
@@ -158,10 +232,12 @@ def load_emotion_model():
         except ImportError:
             device = -1  # Default to CPU if torch not available
         
-        classifier = pipeline(
-            "text-classification",
-            model="j-hartmann/emotion-english-distilroberta-base",
-            top_k=1,
+        # Parameters map the safetensors file (see model_weights.py), so
+        # every server process on the host shares one copy of the weights
+        # top_k=None: every label's score, so callers get whole probability rows
+        classifier = _lazy_import("model_weights").load_pipeline(
+            model_key,
+            top_k=None,
             device=device
         )
         return classifier
@@ -172,6 +248,271 @@ def load_emotion_model():
         warnings.warn(f"Error loading emotion model: {e}")
         return None
 
+# Shared inference service
+# Every session calls the same cached pipeline from its own script thread.
+# Routing those calls through one server thread coalesces them into
+# micro-batches and stops concurrent calls fighting over torch's threads.
+INFERENCE_BATCH_SIZE = int(os.environ.get("EATTS_INFERENCE_BATCH_SIZE", "32"))
+INFERENCE_BATCH_WINDOW_MS = float(os.environ.get("EATTS_INFERENCE_BATCH_WINDOW_MS", "10"))
+INFERENCE_MAX_IN_FLIGHT = int(os.environ.get("EATTS_INFERENCE_MAX_IN_FLIGHT", "512"))
+# Worker-pool mode: with EATTS_INFERENCE_WORKERS > 0 the model runs in that
+# many separate processes (see inference_worker.py), each pinned to its own
+# cores with EATTS_INFERENCE_THREADS torch threads, and every batch is
+# sharded across them. 0 keeps the pipeline in the server process.
+INFERENCE_WORKERS = int(os.environ.get("EATTS_INFERENCE_WORKERS", "0"))
+INFERENCE_THREADS = int(os.environ.get("EATTS_INFERENCE_THREADS", "0")) or None
+
+class InferenceServer:
+    """Owns the classifier and serves sentences from all sessions in micro-batches
+    
+    Callable like the pipeline itself, so detect_emotion()/detect_emotions()
+    work unchanged whichever one they are given. `label_map` renames the
+    model's labels to the emotions EMOTION_PARAMS voices.
+    """
+    
+    def __init__(self, classifier, batch_size=INFERENCE_BATCH_SIZE, window_ms=INFERENCE_BATCH_WINDOW_MS,
+                 max_in_flight=INFERENCE_MAX_IN_FLIGHT, label_map=None):
+        self.classifier = classifier
+        self.label_map = label_map or {}
+        self.batch_size = max(1, batch_size)
+        self.window = max(0.0, window_ms) / 1000.0
+        self._queue = queue.Queue()
+        # Callers block here once too many sentences are waiting (backpressure)
+        self._slots = threading.BoundedSemaphore(max(1, max_in_flight))
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'batches': 0, 'largest_batch': 0, 'errors': 0}
+        threading.Thread(target=self._serve, name="eatts-inference", daemon=True).start()
+    
+    def submit(self, texts):
+        """Queue texts for classification; returns one Future per text"""
+        futures = []
+        for text in texts:
+            self._slots.acquire()
+            future = Future()
+            self._queue.put((text, future))
+            futures.append(future)
+        return futures
+    
+    def __call__(self, inputs, timeout=None):
+        if isinstance(inputs, str):
+            return [self.submit([inputs])[0].result(timeout)]
+        return [future.result(timeout) for future in self.submit(list(inputs))]
+    
+    def stats(self):
+        with self._stats_lock:
+            stats = dict(self._stats)
+        stats['queued'] = self._queue.qsize()
+        stats['avg_batch'] = stats['requests'] / stats['batches'] if stats['batches'] else 0.0
+        if hasattr(self.classifier, 'stats'):
+            stats['workers'] = self.classifier.stats()
+        return stats
+    
+    def _map_labels(self, output):
+        if isinstance(output, list):
+            if output and all(isinstance(item, dict) and 'label' in item for item in output):
+                # One sentence's labels: those mapped onto the same emotion
+                # (small's "love" and "joy") are merged, best first
+                merged = {}
+                for item in output:
+                    label = self.label_map.get(item['label'].lower(), item['label'])
+                    merged[label] = merged.get(label, 0.0) + float(item.get('score', 0.0))
+                return [{'label': label, 'score': score}
+                        for label, score in sorted(merged.items(), key=lambda entry: -entry[1])]
+            return [self._map_labels(item) for item in output]
+        if isinstance(output, dict) and 'label' in output:
+            return {**output, 'label': self.label_map.get(output['label'].lower(), output['label'])}
+        return output
+    
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.window
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+    
+    def _serve(self):
+        while True:
+            batch = self._next_batch()
+            try:
+                with trace_span("inference.batch", sentences=len(batch)):
+                    outputs = self.classifier([text for text, _ in batch], batch_size=len(batch), truncation=True)
+                for (_, future), output in zip(batch, outputs):
+                    future.set_result(self._map_labels(output) if self.label_map else output)
+                failed = False
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                failed = True
+            finally:
+                for _ in batch:
+                    self._slots.release()
+            with self._stats_lock:
+                self._stats['requests'] += len(batch)
+                self._stats['batches'] += 1
+                self._stats['largest_batch'] = max(self._stats['largest_batch'], len(batch))
+                self._stats['errors'] += int(failed)
+
+def start_inference_workers(model_key):
+    """Worker pool for EATTS_INFERENCE_WORKERS > 0, or None to use the in-process pipeline"""
+    if INFERENCE_WORKERS <= 0 or not TRANSFORMERS_AVAILABLE:
+        return None
+    try:
+        pool_module = _lazy_import("inference_worker")
+        return pool_module.InferenceWorkerPool(model_key, INFERENCE_WORKERS, INFERENCE_THREADS)
+    except Exception as e:
+        warnings.warn(f"Inference workers could not start, using the in-process model: {e}")
+        return None
+
+def get_inference_server(model=None):
+    """Process-wide inference server around a shared emotion model (the deployment's when None)"""
+    return _inference_servers.get(resolve_emotion_model(model)[0])
+
+def build_inference_server(model_key):
+    """Load `model_key` and start an inference server around it; None if the model can't be loaded"""
+    label_map = resolve_emotion_model(model_key)[1]['labels']
+    # Worker processes serve the deployment's model; models picked per
+    # session run in this process
+    pool = start_inference_workers(model_key) if model_key == resolve_emotion_model()[0] else None
+    if pool is not None:
+        # Each batch is split across the workers, so let it grow with them
+        return InferenceServer(pool, batch_size=INFERENCE_BATCH_SIZE * pool.workers, label_map=label_map)
+    classifier = load_emotion_model(model_key)
+    if classifier is None:
+        return None
+    return InferenceServer(classifier, label_map=label_map)
+
+class ModelRegistry:
+    """Process-wide objects built by `build(model_key)`, one per emotion model, on first use
+    
+    Bound once at import instead of being a cached function per model, so
+    the warm-up thread and API requests reach them without calling a cache
+    accessor off the script thread.
+    """
+    
+    def __init__(self, build):
+        self._build = build
+        self._entries = {}
+        self._building = {}  # model key -> lock held while its entry is built
+        self._lock = threading.Lock()
+    
+    def get(self, model_key):
+        with self._lock:
+            if model_key in self._entries:
+                return self._entries[model_key]
+            building = self._building.setdefault(model_key, threading.Lock())
+        # Callers asking for a model that is still loading wait for that one load
+        with building:
+            if model_key not in self._entries:
+                self._entries[model_key] = self._build(model_key)
+            return self._entries[model_key]
+
+@st.cache_resource
+def get_inference_servers():
+    return ModelRegistry(build_inference_server)
+
+_inference_servers = get_inference_servers()
+
+def emotion_model_choices():
+    """Registry keys (or names) of the models sessions can choose, the deployment's first"""
+    return list(dict.fromkeys(resolve_emotion_model(model)[0] for model in [None] + EMOTION_MODEL_CHOICES))
+
+def describe_emotion_model(model_key, profiles):
+    """Selector label: the model plus its measured profile on this host, when there is one"""
+    profile = profiles.get(model_key) or {}
+    details = []
+    if profile:
+        details.append(f"{profile['latency_ms']:.0f} ms/sentence")
+        if profile.get('rss_mb') is not None:
+            details.append(f"{profile['rss_mb']:.0f} MB")
+        if profile.get('agreement') is not None and profile.get('reference') != model_key:
+            details.append(f"{profile['agreement']:.0%} agreement")
+    # Without a neutral class, every sentence is voiced with some emotion
+    if resolve_emotion_model(model_key)[1].get('neutral') is False:
+        details.append("no neutral class")
+    return f"{model_key} - {', '.join(details)}" if details else model_key
+
+def weights_sharing_report(server):
+    """Startup check that the model's weights are shared page-cache memory
+    
+    Reads /proc/self/smaps in-process; worker processes report their own
+    check when they start.
+    """
+    pool_info = getattr(server.classifier, "info", None)
+    if pool_info is not None:
+        reports = [info.get('weights', {}) for info in pool_info if info]
+        return {
+            'enabled': any(report.get('enabled') for report in reports),
+            'verified': all(report.get('verified') for report in reports) if reports else None,
+            'workers': reports,
+        }
+    return _lazy_import("model_weights").sharing_report()
+
+# Background model warm-up
+# Loads the model and runs one dummy inference as soon as the server
+# handles its first script run, so the first "Analyze" click doesn't pay
+# the multi-second load.
+MODEL_WARMUP_ENABLED = os.environ.get("EATTS_MODEL_WARMUP", "1") != "0"
+WARMUP_TEXT = "Welcome to today's lesson."
+
+class ModelWarmup:
+    """Readiness of the shared emotion model"""
+    
+    def __init__(self):
+        self.state = "idle"  # idle -> loading -> ready / failed
+        self.error = None
+        self.seconds = None
+        self.server = None
+        self.weights = None
+        self._lock = threading.Lock()
+    
+    @property
+    def ready(self):
+        return self.state == "ready"
+    
+    def start(self, servers):
+        """Start the warm-up thread unless it already ran; it loads the deployment's model from `servers`"""
+        with self._lock:
+            if self.state != "idle":
+                return
+            self.state = "loading"
+        threading.Thread(target=self._run, args=(servers,), name="eatts-warmup", daemon=True).start()
+    
+    def _run(self, servers):
+        started = time.perf_counter()
+        try:
+            _capability_registry.detect()
+            server = servers.get(resolve_emotion_model()[0])
+            if server is None:
+                raise RuntimeError("emotion model could not be loaded")
+            # One dummy inference initializes the tokenizer and torch kernels
+            server([WARMUP_TEXT])
+            self.weights = weights_sharing_report(server)
+            if self.weights.get('verified') is False:
+                warnings.warn(f"Emotion model weights are not shared between processes: {self.weights}")
+            self.server = server
+            self.state = "ready"
+        except Exception as e:
+            self.error = str(e)
+            self.state = "failed"
+        finally:
+            self.seconds = time.perf_counter() - started
+
+@st.cache_resource
+def get_model_warmup():
+    return ModelWarmup()
+
+_model_warmup = get_model_warmup()
+
+def start_model_warmup():
+    """Start the warm-up thread once per process and return its status"""
+    if MODEL_WARMUP_ENABLED:
+        _model_warmup.start(_inference_servers)
+    return _model_warmup
+
 # Global variable to cache FFmpeg path
 _ffmpeg_path_cache = None
 
@@ -222,21 +563,31 @@ def find_ffmpeg_path():
 
 # Check if we're on Streamlit Cloud
 def is_streamlit_cloud():
-    """Detect if running on Streamlit Cloud"""
+    """Detect if running on Streamlit Community Cloud
+    
+    STREAMLIT_SERVER_* variables are set by any `streamlit run` with config
+    overrides, so they don't identify the hosted service; only the sharing
+    mode flag and the Cloud checkout path do. EATTS_STREAMLIT_CLOUD=1/0
+    overrides the detection.
+    """
+    override = os.environ.get("EATTS_STREAMLIT_CLOUD")
+    if override is not None:
+        return override.strip().lower() in ("1", "true", "yes")
     try:
         return (
-            os.environ.get("STREAMLIT_SERVER_PORT") is not None or
-            os.environ.get("STREAMLIT_SERVER_ADDRESS") is not None or
             os.environ.get("STREAMLIT_SHARING_MODE") is not None or
-            os.environ.get("STREAMLIT_SERVER_HEADLESS") is not None or
-            "/mount/src" in os.path.abspath(__file__) if hasattr(os.path, 'abspath') else False
+            "/mount/src" in os.path.abspath(__file__)
         )
     except Exception:
         return False
 
 # Check if ffmpeg is available
 def check_ffmpeg():
-    """Check if ffmpeg is installed and accessible"""
+    """Check if ffmpeg is installed and accessible (probed once per process)"""
+    return _capability_registry.detect()['ffmpeg'], _capability_registry.ffmpeg_message
+
+def _probe_ffmpeg():
+    """Run the actual FFmpeg check; use check_ffmpeg() to get the cached result"""
     # On Streamlit Cloud, FFmpeg is typically not available
     # Skip subprocess checks to avoid health check failures
     if is_streamlit_cloud():
@@ -250,9 +601,7 @@ def check_ffmpeg():
             # Use a very short timeout to avoid blocking health checks
             result = subprocess.run(
                 [ffmpeg_path, "-version"],
-                capture_output=True,
-                text=True,
-                timeout=1,  # Very short timeout to avoid blocking
+                timeout=5,  # Runs once per process, never on a health check
                 check=False,  # Don't raise exception on non-zero return
                 stderr=subprocess.DEVNULL,  # Suppress stderr
                 stdout=subprocess.DEVNULL  # Suppress stdout for health checks
@@ -320,6 +669,440 @@ def check_ffmpeg():
     After installing, restart this Streamlit app.
     """
 
+# Output formats
+# Every generated file goes through export_audio, so the codec and bitrate
+# are set per deployment. Opus at speech bitrates is several times smaller
+# than MP3; browsers that can't play Ogg get MP3 as their default instead.
+AUDIO_FORMATS = {
+    'mp3': {'label': "MP3", 'suffix': ".mp3", 'mime': "audio/mpeg", 'encoder': "libmp3lame"},
+    'opus': {'label': "Opus (smallest)", 'suffix': ".ogg", 'mime': "audio/ogg", 'encoder': "libopus"},
+    'wav': {'label': "WAV (uncompressed)", 'suffix': ".wav", 'mime': "audio/wav", 'encoder': None},
+}
+AUDIO_FORMAT = os.environ.get("EATTS_AUDIO_FORMAT", "mp3").lower()
+if AUDIO_FORMAT not in AUDIO_FORMATS:
+    warnings.warn(f"Unknown EATTS_AUDIO_FORMAT {AUDIO_FORMAT!r}, using mp3")
+    AUDIO_FORMAT = "mp3"
+MP3_BITRATE = os.environ.get("EATTS_MP3_BITRATE", "128k")
+MP3_VBR_QUALITY = os.environ.get("EATTS_MP3_VBR_QUALITY", "")  # LAME -q:a 0 (best) - 9; empty = constant bitrate
+OPUS_BITRATE = os.environ.get("EATTS_OPUS_BITRATE", "24k")
+
+def _probe_audio_formats(ffmpeg_available):
+    """Output formats this process can write: WAV always, MP3/Opus when FFmpeg has the encoder"""
+    encoders = ""
+    if ffmpeg_available:
+        try:
+            encoders = subprocess.run(
+                [find_ffmpeg_path() or "ffmpeg", "-hide_banner", "-encoders"],
+                capture_output=True, text=True, timeout=5, check=False
+            ).stdout
+        except (subprocess.TimeoutExpired, OSError):
+            pass
+    return [
+        name for name, spec in AUDIO_FORMATS.items()
+        if spec['encoder'] is None or re.search(rf"\s{spec['encoder']}\s", encoders)
+    ]
+
+def export_audio(audio, audio_format=None, tags=None):
+    """Encode an AudioSegment to a temp file in `audio_format` (default EATTS_AUDIO_FORMAT); returns its path"""
+    audio_format = audio_format or AUDIO_FORMAT
+    spec = AUDIO_FORMATS[audio_format]
+    if audio_format == "mp3":
+        options = {'format': "mp3", 'parameters': ["-q:a", MP3_VBR_QUALITY]} if MP3_VBR_QUALITY \
+            else {'format': "mp3", 'bitrate': MP3_BITRATE}
+    elif audio_format == "opus":
+        options = {'format': "ogg", 'codec': "libopus", 'bitrate': OPUS_BITRATE, 'parameters': ["-application", "voip"]}
+    else:
+        options = {'format': audio_format}
+    if tags:
+        options['tags'] = tags
+    output_path = tempfile.NamedTemporaryFile(delete=False, suffix=spec['suffix'])
+    output_path.close()
+    with trace_span("audio.export", format=audio_format, audio_ms=len(audio)) as span:
+        audio.export(output_path.name, **options)
+        span.set(bytes=os.path.getsize(output_path.name))
+    return output_path.name
+
+def _ffmpeg_output_args(audio_format, tags=None):
+    """FFmpeg encoder and container arguments matching export_audio's settings"""
+    if audio_format == "mp3":
+        args = ["-c:a", "libmp3lame"] + (["-q:a", MP3_VBR_QUALITY] if MP3_VBR_QUALITY else ["-b:a", MP3_BITRATE])
+        container = "mp3"
+    elif audio_format == "opus":
+        args = ["-c:a", "libopus", "-b:a", OPUS_BITRATE, "-application", "voip"]
+        container = "ogg"
+    else:
+        args, container = ["-c:a", "pcm_s16le"], "wav"
+    for key, value in (tags or {}).items():
+        args += ["-metadata", f"{key}={value}"]
+    if tags and audio_format == "mp3":
+        args += ["-id3v2_version", "3"]
+    return args + ["-f", container]
+
+def encode_pcm_blocks(blocks, audio_format=None, tags=None, frame_rate=None):
+    """Encode mono int16 PCM arriving in blocks to a temp file; returns its path
+    
+    The blocks are piped into FFmpeg (or written straight into a WAV file)
+    one at a time, so memory use doesn't depend on the length of the audio.
+    """
+    audio_format = audio_format or AUDIO_FORMAT
+    frame_rate = frame_rate or PCM_FRAME_RATE
+    output_path = tempfile.NamedTemporaryFile(delete=False, suffix=AUDIO_FORMATS[audio_format]['suffix'])
+    output_path.close()
+    samples = 0
+    try:
+        with trace_span("audio.export", format=audio_format, streamed=True) as span:
+            if audio_format == "wav":
+                with wave.open(output_path.name, 'wb') as out:
+                    out.setnchannels(1)
+                    out.setsampwidth(2)
+                    out.setframerate(frame_rate)
+                    for block in blocks:
+                        out.writeframes(np.ascontiguousarray(block).tobytes())
+                        samples += len(block)
+            else:
+                process = subprocess.Popen(
+                    [find_ffmpeg_path() or "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+                     "-f", "s16le", "-ar", str(frame_rate), "-ac", "1", "-i", "pipe:0",
+                     *_ffmpeg_output_args(audio_format, tags), output_path.name],
+                    stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE
+                )
+                try:
+                    for block in blocks:
+                        process.stdin.write(np.ascontiguousarray(block).tobytes())
+                        samples += len(block)
+                except BrokenPipeError:
+                    pass  # FFmpeg exited early; its error is reported below
+                except BaseException:
+                    # The blocks failed (a cancelled job, a spool read error):
+                    # stop FFmpeg instead of letting it finish a partial file
+                    process.kill()
+                    raise
+                finally:
+                    try:
+                        process.stdin.close()
+                    except BrokenPipeError:
+                        pass
+                    error = process.stderr.read()
+                    process.wait()
+                if process.returncode != 0:
+                    raise RuntimeError(f"FFmpeg encoding failed: {error.decode('utf-8', 'replace').strip()}")
+            span.set(audio_ms=round(samples * 1000 / frame_rate), bytes=os.path.getsize(output_path.name))
+    except BaseException:
+        os.unlink(output_path.name)
+        raise
+    return output_path.name
+
+def audio_format_of(path):
+    """AUDIO_FORMATS key of a generated audio file, from its extension (None if unknown)"""
+    suffix = os.path.splitext(path)[1].lower()
+    for name, spec in AUDIO_FORMATS.items():
+        if spec['suffix'] == suffix:
+            return name
+    return None
+
+def audio_mime(path):
+    """MIME type for a generated audio file, from its extension"""
+    return AUDIO_FORMATS[audio_format_of(path) or "mp3"]['mime']
+
+def client_plays(audio_format, user_agent):
+    """Whether a browser with this User-Agent can play `audio_format` in an <audio> element"""
+    if audio_format != "opus" or not user_agent:
+        return True
+    # Every iOS browser uses WebKit, and WebKit only plays Ogg Opus from 18.4
+    ios = re.search(r"(?:iPhone|iPad|iPod).*? OS (\d+)_(\d+)", user_agent)
+    if ios:
+        return (int(ios.group(1)), int(ios.group(2))) >= (18, 4)
+    safari = re.search(r"Version/(\d+)(?:\.(\d+))?.*Safari/", user_agent)
+    if safari and not re.search(r"Chrome|Chromium|Edg/|Firefox|OPR/", user_agent):
+        return (int(safari.group(1)), int(safari.group(2) or 0)) >= (18, 4)
+    return True
+
+def negotiate_audio_format(available, user_agent=""):
+    """Default output format for a client: the deployment's, unless this server or the browser can't handle it"""
+    for candidate in (AUDIO_FORMAT, "mp3", "wav"):
+        if candidate in available and client_plays(candidate, user_agent):
+            return candidate
+    return available[0]
+
+# Capability registry
+# Optional features are detected once per process and then read by the UI
+# and the readiness endpoint without re-probing (the FFmpeg check spawns a
+# subprocess).
+class CapabilityRegistry:
+    """Which optional features this process can use"""
+    
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._capabilities = None
+        self.ffmpeg_message = None
+    
+    def detect(self):
+        """Detect capabilities on first call; later calls return the cached result"""
+        with self._lock:
+            if self._capabilities is None:
+                ffmpeg_available, self.ffmpeg_message = _probe_ffmpeg()
+                self._capabilities = {
+                    'ffmpeg': ffmpeg_available,
+                    'audio_formats': _probe_audio_formats(ffmpeg_available),
+                    'pydub': _module_available("pydub"),
+                    'emotion_model': TRANSFORMERS_AVAILABLE,
+                    'gtts': GTTS_AVAILABLE,
+                    'translation': TRANSLATOR_AVAILABLE,
+                    'pdf_input': PDFPLUMBER_AVAILABLE or PYPDF2_AVAILABLE,
+                    'docx_input': DOCX_AVAILABLE,
+                    'pdf_reports': REPORTLAB_AVAILABLE,
+                    'pyttsx3': PYTTSX3_AVAILABLE,
+                    'streamlit_cloud': is_streamlit_cloud(),
+                }
+            return dict(self._capabilities)
+    
+    def snapshot(self):
+        """Capabilities if already detected, else None (never probes)"""
+        capabilities = self._capabilities
+        return dict(capabilities) if capabilities is not None else None
+
+@st.cache_resource
+def get_capability_registry():
+    return CapabilityRegistry()
+
+_capability_registry = get_capability_registry()
+
+# Tracing
+# Lightweight spans around each pipeline stage. Spans opened while a job
+# runs are collected into that job's trace (shown in the sidebar and
+# exported as JSON); every span also feeds per-stage counters and latency
+# histograms for the Prometheus-style /metrics dump. With EATTS_TRACING=0
+# span() returns a shared no-op object, so instrumented code pays one
+# attribute check per stage.
+TRACING_ENABLED = os.environ.get("EATTS_TRACING", "1") != "0"
+TRACE_RETENTION = int(os.environ.get("EATTS_TRACE_RETENTION", "200"))
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Numeric span attributes that are summed into eatts_stage_items_total
+COUNTED_ATTRIBUTES = ("sentences", "chars", "bytes", "pages", "rows", "escalated")
+
+class _NoopSpan:
+    """Stand-in returned when tracing is disabled or no span is open"""
+    
+    def set(self, **attributes):
+        pass
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+_NOOP_SPAN = _NoopSpan()
+
+class Span:
+    """One timed stage; use as a context manager and add attributes with set()"""
+    
+    __slots__ = ("tracer", "name", "attributes", "trace", "started", "duration", "error")
+    
+    def __init__(self, tracer, name, attributes, trace=None):
+        self.tracer = tracer
+        self.name = name
+        self.attributes = attributes
+        self.trace = trace
+        self.started = None
+        self.duration = None
+        self.error = None
+    
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+    
+    def __enter__(self):
+        stack = self.tracer._stack()
+        if self.trace is None and stack:
+            self.trace = stack[-1].trace
+        stack.append(self)
+        self.started = time.perf_counter()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        self.duration = time.perf_counter() - self.started
+        if exc_type is not None:
+            self.error = exc_type.__name__
+        stack = self.tracer._stack()
+        if stack and stack[-1] is self:
+            stack.pop()
+        self.tracer._finish(self)
+        return False
+    
+    def to_dict(self, origin):
+        return {
+            'name': self.name,
+            'start_ms': (self.started - origin) * 1000,
+            'duration_ms': self.duration * 1000,
+            'attributes': dict(self.attributes),
+            'error': self.error,
+        }
+
+class Tracer:
+    """Process-wide span recorder with per-stage metrics and recent traces"""
+    
+    def __init__(self, enabled=TRACING_ENABLED, retention=TRACE_RETENTION):
+        self.enabled = enabled
+        self.retention = max(1, retention)
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._traces = OrderedDict()  # trace_id -> trace dict, oldest first
+        self._stages = {}  # stage name -> metric totals
+    
+    def _stack(self):
+        stack = getattr(self._local, 'stack', None)
+        if stack is None:
+            stack = self._local.stack = []
+        return stack
+    
+    def span(self, name, **attributes):
+        """Time a stage; nested inside a trace() it becomes part of that trace"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        return Span(self, name, attributes)
+    
+    def trace(self, trace_id, name, **attributes):
+        """Root span that collects every span opened inside it on this thread"""
+        if not self.enabled:
+            return _NOOP_SPAN
+        trace = {
+            'trace_id': trace_id,
+            'name': name,
+            'started_at': time.time(),
+            'spans': [],
+        }
+        trace['root'] = Span(self, name, attributes, trace)
+        return trace['root']
+    
+    def current_span(self):
+        stack = getattr(self._local, 'stack', None)
+        return stack[-1] if stack else _NOOP_SPAN
+    
+    def _finish(self, span):
+        with self._lock:
+            stage = self._stages.get(span.name)
+            if stage is None:
+                stage = self._stages[span.name] = {
+                    'count': 0, 'errors': 0, 'seconds': 0.0,
+                    'buckets': [0] * len(LATENCY_BUCKETS),
+                    'items': {}, 'cache_hits': 0, 'cache_misses': 0,
+                }
+            stage['count'] += 1
+            stage['seconds'] += span.duration
+            stage['errors'] += int(span.error is not None)
+            for i, bound in enumerate(LATENCY_BUCKETS):
+                if span.duration <= bound:
+                    stage['buckets'][i] += 1
+            for key in COUNTED_ATTRIBUTES:
+                value = span.attributes.get(key)
+                if isinstance(value, (int, float)):
+                    stage['items'][key] = stage['items'].get(key, 0) + value
+            if 'cache_hit' in span.attributes:
+                stage['cache_hits' if span.attributes['cache_hit'] else 'cache_misses'] += 1
+            
+            trace = span.trace
+            if trace is None:
+                return
+            trace['spans'].append(span)
+            if trace['root'] is span:
+                del trace['root']
+                trace['duration_ms'] = span.duration * 1000
+                trace['error'] = span.error
+                trace['attributes'] = dict(span.attributes)
+                origin = span.started
+                trace['spans'] = [s.to_dict(origin) for s in trace['spans']]
+                self._traces[trace['trace_id']] = trace
+                self._traces.move_to_end(trace['trace_id'])
+                while len(self._traces) > self.retention:
+                    self._traces.popitem(last=False)
+    
+    def get_trace(self, trace_id):
+        with self._lock:
+            return self._traces.get(trace_id)
+    
+    def traces(self, trace_ids=None):
+        """Finished traces, oldest first (optionally only the given ids)"""
+        with self._lock:
+            if trace_ids is None:
+                return list(self._traces.values())
+            return [self._traces[trace_id] for trace_id in trace_ids if trace_id in self._traces]
+    
+    def export_json(self, trace_ids=None):
+        return json.dumps({'traces': self.traces(trace_ids)}, indent=2, default=str)
+    
+    @staticmethod
+    def breakdown(trace):
+        """Per-stage totals for one trace: [(stage, calls, total ms, share of trace)]"""
+        totals = {}
+        for span in trace['spans'][:-1]:  # the root span is last
+            calls, ms = totals.get(span['name'], (0, 0.0))
+            totals[span['name']] = (calls + 1, ms + span['duration_ms'])
+        duration = trace.get('duration_ms') or 0.0
+        return [
+            (name, calls, ms, ms / duration if duration else 0.0)
+            for name, (calls, ms) in sorted(totals.items(), key=lambda x: -x[1][1])
+        ]
+    
+    def prometheus_text(self):
+        """Prometheus text exposition of the per-stage counters and histograms"""
+        with self._lock:
+            stages = {name: dict(stage, buckets=list(stage['buckets']), items=dict(stage['items']))
+                      for name, stage in sorted(self._stages.items())}
+        lines = [
+            "# HELP eatts_stage_duration_seconds Time spent in each pipeline stage",
+            "# TYPE eatts_stage_duration_seconds histogram",
+        ]
+        for name, stage in stages.items():
+            for bound, count in zip(LATENCY_BUCKETS, stage['buckets']):
+                lines.append(f'eatts_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {count}')
+            lines.append(f'eatts_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {stage["count"]}')
+            lines.append(f'eatts_stage_duration_seconds_sum{{stage="{name}"}} {stage["seconds"]:.6f}')
+            lines.append(f'eatts_stage_duration_seconds_count{{stage="{name}"}} {stage["count"]}')
+        lines += ["# HELP eatts_stage_errors_total Stage calls that raised", "# TYPE eatts_stage_errors_total counter"]
+        lines += [f'eatts_stage_errors_total{{stage="{name}"}} {stage["errors"]}' for name, stage in stages.items()]
+        lines += ["# HELP eatts_stage_items_total Work processed per stage (sentences, chars, bytes, pages, rows)",
+                  "# TYPE eatts_stage_items_total counter"]
+        for name, stage in stages.items():
+            for unit, value in sorted(stage['items'].items()):
+                lines.append(f'eatts_stage_items_total{{stage="{name}",unit="{unit}"}} {value:g}')
+        lines += ["# HELP eatts_stage_cache_total Cache lookups per stage", "# TYPE eatts_stage_cache_total counter"]
+        for name, stage in stages.items():
+            if stage['cache_hits'] or stage['cache_misses']:
+                lines.append(f'eatts_stage_cache_total{{stage="{name}",result="hit"}} {stage["cache_hits"]}')
+                lines.append(f'eatts_stage_cache_total{{stage="{name}",result="miss"}} {stage["cache_misses"]}')
+        return "\n".join(lines) + "\n"
+
+@st.cache_resource
+def get_tracer():
+    """Process-wide tracer shared by all sessions and background threads"""
+    return Tracer()
+
+_tracer = get_tracer()
+
+def trace_span(name, **attributes):
+    """Context manager timing one pipeline stage"""
+    return _tracer.span(name, **attributes)
+
+def current_span():
+    """Innermost open span on this thread (a no-op object when there is none)"""
+    return _tracer.current_span()
+
+def traced(name, attributes=None):
+    """Decorator running a function inside a span
+    
+    attributes, if given, is called with the function's arguments and
+    returns the span's initial attributes.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not _tracer.enabled:
+                return fn(*args, **kwargs)
+            with _tracer.span(name, **(attributes(*args, **kwargs) if attributes else {})):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
 # Emotion to voice parameters mapping
 EMOTION_PARAMS = {
     "joy": {"pitch_shift": 1.05, "speed": 1.2, "volume": 1.1, "tone": "Energetic"},
@@ -339,63 +1122,142 @@ def split_into_sentences(text):
     sentences = [s.strip() for s in sentences if len(s.strip()) > 0]
     return sentences
 
-def extract_text_from_pdf(file_bytes, filename):
-    """Extract text from PDF file"""
-    text = ""
+def sentence_key(sentence):
+    """Dedup key for a sentence: Unicode-normalized, whitespace collapsed
+    
+    Case is kept because the emotion model is case-sensitive. Repeats of a
+    key are classified, translated and synthesized once and the result is
+    reused for every occurrence.
+    """
+    return " ".join(unicodedata.normalize("NFKC", sentence).split())
+
+# Repeated page furniture in PDFs: running headers/footers and page numbers
+STRIP_PDF_FURNITURE = os.environ.get("EATTS_STRIP_PDF_FURNITURE", "1") != "0"
+FURNITURE_EDGE_LINES = 3
+PAGE_NUMBER_PATTERN = re.compile(r'^\W*(page\s*)?\d+(\s*(of|/)\s*\d+)?\W*$', re.IGNORECASE)
+
+def _furniture_key(line):
+    # Page numbers inside a running header shouldn't make each page's copy unique
+    return re.sub(r'\d+', '#', " ".join(line.split()).lower())
+
+def _edge_slots(lines):
+    """(slot, line) for the lines near the top (0, 1, ...) and bottom (-1, -2, ...) of a page"""
+    edge = min(FURNITURE_EDGE_LINES, len(lines) // 2)
+    return [(j, lines[j]) for j in range(edge)] + [(j, lines[j]) for j in range(-edge, 0)]
+
+def strip_page_furniture(pages, min_share=0.5):
+    """Drop running headers, footers and page numbers from per-page PDF text
+    
+    A line in one of the first or last few slots of a page counts as
+    furniture when the same line (digits ignored) sits in that slot on at
+    least `min_share` of the pages. Bare page numbers in those slots are
+    always dropped. Documents with fewer than three pages are returned
+    unchanged.
+    """
+    if len(pages) < 3:
+        return pages
+    page_lines = [page.splitlines() for page in pages]
+    counts = Counter()
+    for lines in page_lines:
+        counts.update({(slot, _furniture_key(line)) for slot, line in _edge_slots(lines) if line.strip()})
+    threshold = max(2, int(len(pages) * min_share + 0.5))
+    furniture = {key for key, count in counts.items() if count >= threshold}
+    
+    cleaned = []
+    for lines in page_lines:
+        dropped = {
+            slot % len(lines) for slot, line in _edge_slots(lines)
+            if (slot, _furniture_key(line)) in furniture or PAGE_NUMBER_PATTERN.match(line.strip())
+        }
+        cleaned.append("\n".join(line for j, line in enumerate(lines) if j not in dropped))
+    return cleaned
+
+def _join_pdf_pages(pages, strip_furniture):
+    if strip_furniture:
+        stripped = strip_page_furniture(pages)
+        removed = sum(len(page.splitlines()) for page in pages) - sum(len(page.splitlines()) for page in stripped)
+        current_span().set(furniture_lines=removed)
+        pages = stripped
+    return "\n".join(page for page in pages if page).strip()
+
+@traced("extract.pdf", lambda file_bytes, *args, **kwargs: {'bytes': len(file_bytes)})
+def extract_text_from_pdf(file_bytes, filename, strip_furniture=False):
+    """Extract text from PDF file, optionally without repeated headers/footers"""
+    pages = []
     try:
         # Try pdfplumber first (better for complex PDFs)
         if PDFPLUMBER_AVAILABLE:
             try:
-                with pdfplumber.open(BytesIO(file_bytes)) as pdf:
+                with _lazy_import("pdfplumber").open(BytesIO(file_bytes)) as pdf:
+                    current_span().set(pages=len(pdf.pages), parser="pdfplumber")
                     for page in pdf.pages:
-                        page_text = page.extract_text()
-                        if page_text:
-                            text += page_text + "\n"
-                return text.strip()
+                        pages.append(page.extract_text() or "")
+                return _join_pdf_pages(pages, strip_furniture)
             except Exception as e:
-                st.warning(f"pdfplumber extraction failed: {e}. Trying PyPDF2...")
+                notify_user(f"pdfplumber extraction failed: {e}. Trying PyPDF2...")
         
         # Fallback to PyPDF2
         if PYPDF2_AVAILABLE:
+            pages = []
             pdf_file = BytesIO(file_bytes)
-            pdf_reader = PyPDF2.PdfReader(pdf_file)
+            pdf_reader = _lazy_import("PyPDF2").PdfReader(pdf_file)
+            current_span().set(pages=len(pdf_reader.pages), parser="PyPDF2")
             for page in pdf_reader.pages:
-                text += page.extract_text() + "\n"
-            return text.strip()
+                pages.append(page.extract_text() or "")
+            return _join_pdf_pages(pages, strip_furniture)
         
         # If neither library is available
-        st.error("PDF processing libraries not installed. Please install pdfplumber or PyPDF2.")
+        notify_user("PDF processing libraries not installed. Please install pdfplumber or PyPDF2.", error=True)
         return None
         
     except Exception as e:
-        st.error(f"Error extracting text from PDF: {e}")
+        notify_user(f"Error extracting text from PDF: {e}", error=True)
         return None
 
+@traced("extract.docx", lambda file_bytes, filename: {'bytes': len(file_bytes)})
 def extract_text_from_docx(file_bytes, filename):
     """Extract text from DOCX file"""
     try:
         if not DOCX_AVAILABLE:
-            st.error("python-docx library not installed. Please install it to process DOCX files.")
+            notify_user("python-docx library not installed. Please install it to process DOCX files.", error=True)
             return None
         
-        doc = Document(BytesIO(file_bytes))
+        doc = _lazy_import("docx").Document(BytesIO(file_bytes))
         text = ""
         for paragraph in doc.paragraphs:
             text += paragraph.text + "\n"
         return text.strip()
         
     except Exception as e:
-        st.error(f"Error extracting text from DOCX: {e}")
+        notify_user(f"Error extracting text from DOCX: {e}", error=True)
         return None
 
-def extract_text_from_file(uploaded_file):
+def extract_document_outline(uploaded_file):
+    """Top-level chapter titles of an uploaded document: the PDF outline
+    (bookmarks) or the Word "Heading 1" paragraphs; empty when it has none"""
+    file_bytes = uploaded_file.getvalue()
+    file_ext = uploaded_file.name.split('.')[-1].lower()
+    try:
+        if file_ext == 'pdf' and PYPDF2_AVAILABLE:
+            outline = _lazy_import("PyPDF2").PdfReader(BytesIO(file_bytes)).outline
+            # Nested lists hold the sub-entries of the entry before them
+            return [entry.title for entry in outline if not isinstance(entry, list) and entry.title]
+        if file_ext in ['docx', 'doc'] and DOCX_AVAILABLE:
+            doc = _lazy_import("docx").Document(BytesIO(file_bytes))
+            return [p.text.strip() for p in doc.paragraphs
+                    if p.style is not None and p.style.name == "Heading 1" and p.text.strip()]
+    except Exception as e:
+        warnings.warn(f"Could not read the outline of {uploaded_file.name}: {e}")
+    return []
+
+def extract_text_from_file(uploaded_file, strip_furniture=False):
     """Extract text from uploaded file based on file type"""
-    file_bytes = uploaded_file.read()
+    file_bytes = uploaded_file.getvalue()
     filename = uploaded_file.name
     file_ext = filename.split('.')[-1].lower()
     
     if file_ext == 'pdf':
-        return extract_text_from_pdf(file_bytes, filename)
+        return extract_text_from_pdf(file_bytes, filename, strip_furniture)
     elif file_ext in ['docx', 'doc']:
         return extract_text_from_docx(file_bytes, filename)
     elif file_ext in ['txt', 'md']:
@@ -405,12 +1267,13 @@ def extract_text_from_file(uploaded_file):
             try:
                 return file_bytes.decode('latin-1')
             except Exception as e:
-                st.error(f"Error decoding text file: {e}")
+                notify_user(f"Error decoding text file: {e}", error=True)
                 return None
     else:
-        st.error(f"Unsupported file type: {file_ext}")
+        notify_user(f"Unsupported file type: {file_ext}", error=True)
         return None
 
+@traced("translate", lambda text, *args, **kwargs: {'chars': len(text or "")})
 def translate_text(text, target_lang='en', source_lang='auto'):
     """Translate text to target language using Google Translator (matches Google Translate behavior)"""
     if not TRANSLATOR_AVAILABLE:
@@ -426,7 +1289,7 @@ def translate_text(text, target_lang='en', source_lang='auto'):
     try:
         # Create translator instance with Google Translator
         # GoogleTranslator uses the same engine as Google Translate
-        translator = GoogleTranslator(source=source_lang, target=target_lang)
+        translator = _lazy_import("deep_translator").GoogleTranslator(source=source_lang, target=target_lang)
         
         # Translate the text (this matches Google Translate output)
         # GoogleTranslator uses the same Google Translate API
@@ -446,7 +1309,7 @@ def translate_text(text, target_lang='en', source_lang='auto'):
                 if source_lang == 'auto':
                     try:
                         # Try with explicit English source
-                        translator_en = GoogleTranslator(source='en', target=target_lang)
+                        translator_en = _lazy_import("deep_translator").GoogleTranslator(source='en', target=target_lang)
                         translated_en = translator_en.translate(text)
                         if translated_en and translated_en.strip() and translated_en.lower().strip() != text.lower().strip():
                             translated = translated_en.strip()
@@ -469,7 +1332,7 @@ def translate_text(text, target_lang='en', source_lang='auto'):
         if source_lang == 'auto':
             try:
                 # Fallback: try with explicit English source
-                translator = GoogleTranslator(source='en', target=target_lang)
+                translator = _lazy_import("deep_translator").GoogleTranslator(source='en', target=target_lang)
                 translated = translator.translate(text)
                 if translated and translated.strip():
                     return translated.strip(), ""
@@ -477,6 +1340,33 @@ def translate_text(text, target_lang='en', source_lang='auto'):
                 return text, f"Translation error: {error_msg}. Fallback error: {str(e2)}"
         return text, f"Translation error: {error_msg}"
 
+def _parse_emotion_result(result):
+    """Extract (emotion, score) from a classifier output item"""
+    # Handle different output formats
+    if isinstance(result, list):
+        if len(result) > 0:
+            if isinstance(result[0], dict):
+                emotion = result[0].get('label', 'neutral').lower()
+                score = result[0].get('score', 0.0)
+            elif isinstance(result[0], list) and len(result[0]) > 0:
+                emotion = result[0][0].get('label', 'neutral').lower()
+                score = result[0][0].get('score', 0.0)
+            else:
+                emotion = "neutral"
+                score = 0.0
+        else:
+            emotion = "neutral"
+            score = 0.0
+    elif isinstance(result, dict):
+        emotion = result.get('label', 'neutral').lower()
+        score = result.get('score', 0.0)
+    else:
+        emotion = "neutral"
+        score = 0.0
+    
+    return emotion, score
+
+@traced("classifier", lambda text, classifier: {'sentences': 1})
 def detect_emotion(text, classifier):
     """Detect emotion in text"""
     if not text or len(text.strip()) == 0:
@@ -487,33 +1377,376 @@ def detect_emotion(text, classifier):
     
     try:
         result = classifier(text)
-        # Handle different output formats
-        if isinstance(result, list):
-            if len(result) > 0:
-                if isinstance(result[0], dict):
-                    emotion = result[0].get('label', 'neutral').lower()
-                    score = result[0].get('score', 0.0)
-                elif isinstance(result[0], list) and len(result[0]) > 0:
-                    emotion = result[0][0].get('label', 'neutral').lower()
-                    score = result[0][0].get('score', 0.0)
-                else:
-                    emotion = "neutral"
-                    score = 0.0
-            else:
-                emotion = "neutral"
-                score = 0.0
-        elif isinstance(result, dict):
-            emotion = result.get('label', 'neutral').lower()
-            score = result.get('score', 0.0)
-        else:
-            emotion = "neutral"
-            score = 0.0
-        
-        return emotion, score
+        return _parse_emotion_result(result)
     except Exception as e:
-        st.warning(f"Emotion detection error: {e}")
+        notify_user(f"Emotion detection error: {e}")
         return "neutral", 0.0
 
+def detect_emotions(texts, classifier):
+    """Detect emotions for a list of texts in one batched call
+    
+    Returns a list of (emotion, score) in input order. Works with the raw
+    pipeline and with the shared InferenceServer.
+    """
+    return detect_emotion_matrix(texts, classifier)[0]
+
+@traced("classifier", lambda texts, classifier: {'sentences': len(texts)})
+def detect_emotion_matrix(texts, classifier):
+    """(emotion, score) per text plus the (texts, EMOTION_LABELS) probability matrix, from one batched call
+    
+    The matrix is None without numpy. Empty texts and failed calls get
+    neutral rows.
+    """
+    results = [("neutral", 0.0)] * len(texts)
+    matrix = None
+    if np is not None:
+        matrix = np.zeros((len(texts), len(EMOTION_LABELS)), dtype=np.float32)
+        matrix[:, EMOTION_LABELS.index("neutral")] = 1.0
+    if classifier is None:
+        return results, matrix
+    
+    # Empty sentences never reach the model
+    indices = [i for i, text in enumerate(texts) if text and len(text.strip()) > 0]
+    if not indices:
+        return results, matrix
+    
+    try:
+        outputs = classifier([texts[i] for i in indices])
+        for i, output in zip(indices, outputs):
+            # Batched pipeline output has one entry per text; wrap it like a single-text call
+            results[i] = _parse_emotion_result([output])
+            if matrix is not None:
+                matrix[i] = probability_row(output)
+    except Exception as e:
+        notify_user(f"Emotion detection error: {e}")
+    return results, matrix
+
+# Emotion probabilities
+# The pipeline scores every label, so one batched pass yields the whole
+# document as a (sentences, emotions) matrix. Smoothing across neighbouring
+# sentences, hysteresis against rapid flips and document summaries are
+# array operations on that matrix; none of them calls the model again.
+EMOTION_LABELS = list(EMOTION_PARAMS)
+# Centred window of sentences averaged together (1 = no smoothing)
+SMOOTHING_WINDOW = int(os.environ.get("EATTS_EMOTION_SMOOTHING_WINDOW", "1"))
+# How far another emotion must beat the current one before a sentence switches to it (0 = off)
+HYSTERESIS_MARGIN = float(os.environ.get("EATTS_EMOTION_HYSTERESIS", "0"))
+
+def probability_row(output, labels=EMOTION_LABELS):
+    """One classifier output as a probability vector over `labels`
+    
+    Labels without voice settings count as neutral, the way they are
+    voiced. Outputs that carry only the top label (top_k=1 pipelines)
+    spread the remaining probability evenly over the other labels.
+    """
+    entries = output if isinstance(output, list) else [output]
+    while entries and isinstance(entries[0], list):
+        entries = entries[0]
+    row = np.zeros(len(labels), dtype=np.float32)
+    for entry in entries:
+        if isinstance(entry, dict):
+            label = str(entry.get('label', 'neutral')).lower()
+            row[labels.index(label) if label in labels else labels.index("neutral")] += float(entry.get('score', 0.0))
+    scored = row > 0
+    missing = 1.0 - row.sum()
+    if missing > 1e-6 and not scored.all():
+        row[~scored] = missing / (~scored).sum()
+    total = row.sum()
+    if total <= 0:
+        row[labels.index("neutral")] = total = 1.0
+    return row / total
+
+def emotion_matrix(items):
+    """Stacked 'probabilities' rows of analysis items, or None if any item lacks them"""
+    if hasattr(items, "smoothed"):
+        return items.matrix  # a ProjectSentences view
+    if np is None or not items or any('probabilities' not in item for item in items):
+        return None
+    return np.asarray([item['probabilities'] for item in items], dtype=np.float32)
+
+def smooth_probabilities(matrix, window=SMOOTHING_WINDOW):
+    """Average each row with its neighbours over a centred window that shrinks at the edges"""
+    if window <= 1 or len(matrix) < 2:
+        return matrix.copy()
+    half = window // 2
+    sums = np.vstack([np.zeros((1, matrix.shape[1]), dtype=np.float64), np.cumsum(matrix, axis=0, dtype=np.float64)])
+    rows = np.arange(len(matrix))
+    low = np.maximum(rows - half, 0)
+    high = np.minimum(rows + half + 1, len(matrix))
+    return ((sums[high] - sums[low]) / (high - low)[:, None]).astype(np.float32)
+
+def hysteresis_labels(matrix, margin=HYSTERESIS_MARGIN):
+    """Label index per row that only changes when another label leads the current one by `margin`"""
+    best = matrix.argmax(axis=1)
+    if margin <= 0 or len(matrix) < 2:
+        return best
+    # The running label depends on the rows before it, so walk the runs of
+    # equal argmax: inside a run the only possible switch is to the run's
+    # winner, at the first row where it leads the running label by the margin
+    labels = np.empty_like(best)
+    starts = np.flatnonzero(np.r_[True, best[1:] != best[:-1]])
+    current = best[0]
+    for start, end in zip(starts, np.r_[starts[1:], len(best)]):
+        winner = best[start]
+        if winner != current:
+            switch = np.flatnonzero(matrix[start:end, winner] - matrix[start:end, current] >= margin)
+            if len(switch):
+                labels[start:start + switch[0]] = current
+                current = winner
+                start += switch[0]
+        labels[start:end] = current
+    return labels
+
+def apply_emotion_smoothing(items, window=SMOOTHING_WINDOW, margin=HYSTERESIS_MARGIN):
+    """Analysis items relabelled from their smoothed probability rows
+    
+    Items come back unchanged when smoothing is off or they have no
+    probability rows (results from before they were recorded).
+    """
+    # Checked by attribute: a view kept in session state can come from an
+    # earlier script run, whose ProjectSentences class is a different object
+    if hasattr(items, "smoothed"):
+        return items.smoothed(window, margin)
+    matrix = emotion_matrix(items)
+    if matrix is None or (window <= 1 and margin <= 0):
+        return list(items)
+    smoothed = smooth_probabilities(matrix, window)
+    labels = hysteresis_labels(smoothed, margin)
+    scores = smoothed[np.arange(len(items)), labels]
+    return [
+        {**item, 'emotion': EMOTION_LABELS[label], 'score': float(score)}
+        for item, label, score in zip(items, labels, scores)
+    ]
+
+def emotion_summary(matrix, labels=EMOTION_LABELS):
+    """Document-level aggregates of a probability matrix
+    
+    'mean' is the average probability of each emotion, 'shares' the share
+    of sentences it wins, 'changes' how often consecutive sentences differ,
+    and 'uncertainty' the mean entropy scaled to 0 (sure) .. 1 (uniform).
+    """
+    best = matrix.argmax(axis=1)
+    mean = matrix.mean(axis=0)
+    entropy = -(matrix * np.log(np.clip(matrix, 1e-9, 1.0))).sum(axis=1)
+    emotional = mean.copy()
+    emotional[labels.index("neutral")] = -1.0
+    return {
+        'mean': {label: float(value) for label, value in zip(labels, mean)},
+        'shares': {label: float(value) for label, value in zip(labels, np.bincount(best, minlength=len(labels)) / len(matrix))},
+        'dominant': labels[int(mean.argmax())],
+        'dominant_emotional': labels[int(emotional.argmax())],
+        'changes': int((best[1:] != best[:-1]).sum()),
+        'uncertainty': float(entropy.mean() / np.log(len(labels))),
+    }
+
+# Emotion cascade
+# Most sentences in course material are plain explanation. A hashed n-gram
+# linear model, seeded from a small lexicon for the voiced labels, answers
+# those itself in one vectorized pass; only sentences whose top two labels
+# are closer than EATTS_CASCADE_MARGIN go to the transformer, as do those
+# with no feature the linear model knows. The neutral prior alone is not
+# evidence that a sentence is neutral: it also has to read as exposition,
+# i.e. contain the function words of explanatory text, while personal
+# pronouns and words of loss or pain pull it below the margin. With
+# EATTS_CASCADE_LEARN, each escalated sentence also trains the linear model
+# on the transformer's label; by default the weights stay at the seeded
+# lexicon, so a document gets the same labels whatever other sessions
+# analyzed before it. Each emotion model has its own cascade. A stable
+# EATTS_CASCADE_AUDIT_RATE share of the confident sentences is sent to the
+# transformer as well, so agreement with the full model stays measurable.
+CASCADE_ENABLED = os.environ.get("EATTS_CASCADE", "1") != "0"
+CASCADE_MARGIN = float(os.environ.get("EATTS_CASCADE_MARGIN", "0.5"))
+CASCADE_AUDIT_RATE = float(os.environ.get("EATTS_CASCADE_AUDIT_RATE", "0.05"))
+CASCADE_LEARN = os.environ.get("EATTS_CASCADE_LEARN", "0") == "1"
+CASCADE_FEATURE_BITS = 16
+CASCADE_LEARNING_RATE = 0.2
+CASCADE_NEUTRAL_PRIOR = 2.5  # bias towards neutral when the cues found are weak
+LEXICON_WEIGHT = 2.5  # one cue word ties with the neutral prior, so it is escalated
+LEXICON_TOKEN_PATTERN = re.compile(r"[a-z]+(?:'[a-z]+)?|[!?]")
+EMOTION_LEXICON = {
+    "joy": "happy happiness glad joy joyful delighted excited exciting thrilled wonderful great amazing fantastic "
+           "excellent celebrate congratulations pleased fun enjoy enjoyed cheerful awesome proud success hooray",
+    "love": "love loved loving adore cherish affection caring beloved fond warmth kindness tender grateful thankful",
+    "surprise": "surprise surprised surprising astonishing astonished amazed amazing unexpected unexpectedly "
+                "suddenly shocked shocking wow incredible unbelievable remarkable",
+    "anger": "angry anger furious outraged outrageous rage hate hated annoyed annoying frustrated frustrating "
+             "unfair mad irritated resent hostile disgusting disgusted",
+    "sadness": "sad sadness unhappy sorrow grief grieve cry crying tears lonely loss devastating devastated "
+               "disappointed disappointment depressed miserable tragic tragedy regret mourn heartbroken",
+    "fear": "afraid fear fearful scared frightened terrified terror anxious anxiety worried worry nervous panic "
+            "danger dangerous threat threatening dread alarming horror",
+}
+# Cues that make some emotion more likely without saying which: they lower
+# the neutral score so borderline sentences reach the transformer. Any one
+# of them takes a sentence without other cues below the margin.
+UNCERTAINTY_CUES = {
+    "!": 1.5, "?": 0.5, "not": 0.75, "never": 0.75, "no": 0.5,
+    **dict.fromkeys("i me my we us our he him his she her".split(), 0.5),
+    **dict.fromkeys("terrible awful horrible cried died death dead lost hurt pain miss missed passed alone worst "
+                    "feel felt".split(), 0.75),
+}
+# Function words of explanatory text: carrying no weight, they are the
+# evidence that lets the neutral prior answer a sentence without the model
+NEUTRAL_REGISTER = (
+    "the a an of in into on onto to for from by with as at about between through during within without under over "
+    "is are was were be been being has have had can may must will would should could does do "
+    "this that these those which each every its it their they there than then also and or but if when where while "
+    "because so such both either per how what called known defined refers consists contains includes shows lists "
+    "describes explains example instance figure table section chapter equation"
+)
+
+class EmotionCascade:
+    """Cheap first-tier classifier that only escalates uncertain sentences to the model
+    
+    Called like the pipeline, plus the model to escalate to (see
+    with_cascade()). Confident sentences get the linear model's scores for
+    every label, best first; escalated and audited ones get the model's
+    own output.
+    """
+    
+    def __init__(self, labels=tuple(EMOTION_PARAMS), margin=CASCADE_MARGIN, audit_rate=CASCADE_AUDIT_RATE,
+                 feature_bits=CASCADE_FEATURE_BITS, learn=CASCADE_LEARN):
+        self.labels = list(labels)
+        self.margin = margin
+        self.audit_rate = audit_rate
+        self.learn = learn
+        self._buckets = 1 << feature_bits
+        self._weights = np.zeros((len(self.labels), self._buckets), dtype=np.float32)
+        self._register = np.zeros(self._buckets, dtype=bool)
+        self._lock = threading.Lock()
+        self._stats = {'sentences': 0, 'escalated': 0, 'audited': 0, 'audit_agreed': 0, 'compared': 0, 'agreed': 0}
+        self._seed()
+    
+    def _bucket(self, feature):
+        # Bucket 0 is the bias feature every sentence has
+        return zlib.crc32(feature.encode("utf-8")) % (self._buckets - 1) + 1
+    
+    def features(self, text):
+        """Hashed unigram and bigram buckets of a sentence, bias first"""
+        tokens = LEXICON_TOKEN_PATTERN.findall((text or "").lower())
+        grams = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+        return np.array([0] + [self._bucket(gram) for gram in grams], dtype=np.int64)
+    
+    def _seed(self):
+        neutral = self.labels.index("neutral")
+        self._weights[neutral, 0] = CASCADE_NEUTRAL_PRIOR
+        for label, words in EMOTION_LEXICON.items():
+            if label in self.labels:
+                for word in words.split():
+                    self._weights[self.labels.index(label), self._bucket(word)] += LEXICON_WEIGHT
+        for cue, weight in UNCERTAINTY_CUES.items():
+            self._weights[neutral, self._bucket(cue)] -= weight
+        for word in NEUTRAL_REGISTER.split():
+            self._register[self._bucket(word)] = True
+    
+    def probabilities(self, feature_lists):
+        """Label probabilities for each sentence's features, as one (sentences, labels) array"""
+        offsets = np.cumsum([0] + [len(features) for features in feature_lists[:-1]])
+        with self._lock:
+            scores = np.add.reduceat(self._weights[:, np.concatenate(feature_lists)], offsets, axis=1).T
+        scores -= scores.max(axis=1, keepdims=True)
+        exp = np.exp(scores)
+        return exp / exp.sum(axis=1, keepdims=True)
+    
+    def evidence(self, feature_lists):
+        """Whether each sentence has a feature besides the bias that carries weight or marks explanatory text"""
+        offsets = np.cumsum([0] + [len(features) for features in feature_lists[:-1]])
+        buckets = np.concatenate(feature_lists)
+        with self._lock:
+            known = (np.any(self._weights[:, buckets] != 0, axis=0) | self._register[buckets]) & (buckets != 0)
+        return np.add.reduceat(known.astype(np.int32), offsets) > 0
+    
+    def _audited(self, text):
+        # Chosen by content, so the same sentence is always audited or never
+        return zlib.crc32(text.encode("utf-8")) % 10000 < self.audit_rate * 10000
+    
+    def _learn(self, features, probabilities, label):
+        """One softmax-regression step towards the model's label"""
+        target = np.zeros(len(self.labels), dtype=np.float32)
+        target[self.labels.index(label)] = 1.0
+        step = (CASCADE_LEARNING_RATE * (probabilities - target)).astype(np.float32)
+        with self._lock:
+            np.subtract.at(self._weights, (slice(None), features), step[:, None])
+    
+    def __call__(self, inputs, model, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        if not texts:
+            return []
+        features = [self.features(text) for text in texts]
+        probabilities = self.probabilities(features)
+        ranked = np.argsort(-probabilities, axis=1)
+        rows = np.arange(len(texts))
+        best = probabilities[rows, ranked[:, 0]]
+        confident = (best - probabilities[rows, ranked[:, 1]] >= self.margin) & self.evidence(features)
+        outputs = [
+            [{'label': self.labels[j], 'score': float(probabilities[i, j])} for j in ranked[i]]
+            for i in range(len(texts))
+        ]
+        
+        escalate = [i for i in range(len(texts)) if not confident[i] or self._audited(texts[i])]
+        counts = {'escalated': 0, 'audited': 0, 'audit_agreed': 0, 'compared': 0, 'agreed': 0}
+        if escalate:
+            for i, output in zip(escalate, model([texts[i] for i in escalate], **kwargs)):
+                label, _ = _parse_emotion_result([output])
+                agreed = label == outputs[i][0]['label']
+                counts['compared'] += 1
+                counts['agreed'] += agreed
+                if confident[i]:
+                    counts['audited'] += 1
+                    counts['audit_agreed'] += agreed
+                else:
+                    counts['escalated'] += 1
+                outputs[i] = output
+                if self.learn and label in self.labels:
+                    self._learn(features[i], probabilities[i], label)
+        with self._lock:
+            self._stats['sentences'] += len(texts)
+            for key, value in counts.items():
+                self._stats[key] += value
+        current_span().set(escalated=counts['escalated'], audited=counts['audited'])
+        return outputs if not isinstance(inputs, str) else outputs[:1]
+    
+    def stats(self):
+        """Counters plus escalation rate and agreement with the full model"""
+        with self._lock:
+            stats = dict(self._stats)
+        sentences = stats['sentences']
+        stats['escalation_rate'] = stats['escalated'] / sentences if sentences else 0.0
+        stats['model_share'] = (stats['escalated'] + stats['audited']) / sentences if sentences else 0.0
+        stats['agreement'] = stats['agreed'] / stats['compared'] if stats['compared'] else None
+        audit = stats['audit_agreed'] / stats['audited'] if stats['audited'] else None
+        stats['audit_agreement'] = audit
+        # Escalated sentences carry the model's own label; the others agree at the audited rate
+        stats['estimated_agreement'] = (
+            (stats['escalated'] + (sentences - stats['escalated']) * audit) / sentences
+            if sentences and audit is not None else None
+        )
+        return stats
+
+def build_emotion_cascade(model_key):
+    """A new cascade for one emotion model; it counts, and learns from, only that model's labels"""
+    return EmotionCascade()
+
+@st.cache_resource
+def get_emotion_cascades():
+    """Process-wide cascades, so their counters (and learned weights, when they learn) are shared by all sessions"""
+    return ModelRegistry(build_emotion_cascade)
+
+_emotion_cascades = get_emotion_cascades() if np is not None else None
+
+def emotion_cascade(model_key=None):
+    """The cascade in front of `model_key` (the deployment's model when None)"""
+    if _emotion_cascades is None:
+        return None
+    return _emotion_cascades.get(resolve_emotion_model(model_key)[0])
+
+def with_cascade(model, model_key=None):
+    """The classifier to analyze with: the cascade in front of `model` when it is enabled"""
+    cascade = emotion_cascade(model_key) if CASCADE_ENABLED else None
+    if model is None or cascade is None:
+        return model
+    return functools.partial(cascade, model=model)
+
 def adjust_audio_pitch(audio_segment, pitch_shift):
     """Adjust audio pitch using frame rate manipulation"""
     # Note: This method changes pitch but also affects speed slightly
@@ -530,13 +1763,75 @@ def adjust_audio_pitch(audio_segment, pitch_shift):
         audio_segment = audio_segment.set_frame_rate(original_frame_rate)
     return audio_segment
 
-def generate_pdf_report(emotions_data, title="Emotion Analysis Report"):
-    """Generate PDF report from emotion analysis results"""
+@traced("effects", lambda audio, emotion, pydub=None: {'emotion': emotion, 'audio_ms': len(audio)})
+def apply_emotion_effects(audio, emotion, pydub=None):
+    """Apply the speed, volume, pitch and normalization for an emotion to an AudioSegment"""
+    pydub = pydub or _get_pydub()
+    params = EMOTION_PARAMS.get(emotion, EMOTION_PARAMS["neutral"])
+    
+    # Apply speed adjustment
+    if params["speed"] != 1.0:
+        # Speed up or slow down
+        if params["speed"] > 1.0:
+            # Use speedup for faster playback
+            if pydub['speedup'] is not None:
+                audio = pydub['speedup'](audio, playback_speed=params["speed"])
+            else:
+                # Fallback: adjust frame rate
+                original_frame_rate = audio.frame_rate
+                new_sample_rate = int(original_frame_rate * params["speed"])
+                audio = audio._spawn(
+                    audio.raw_data,
+                    overrides={"frame_rate": new_sample_rate}
+                )
+                audio = audio.set_frame_rate(original_frame_rate)
+        else:
+            # Slow down by changing frame rate and then resampling
+            original_frame_rate = audio.frame_rate
+            new_sample_rate = int(original_frame_rate * params["speed"])
+            audio = audio._spawn(
+                audio.raw_data,
+                overrides={"frame_rate": new_sample_rate}
+            )
+            # Resample back to original frame rate to maintain quality
+            audio = audio.set_frame_rate(original_frame_rate)
+    
+    # Apply volume adjustment
+    if params["volume"] != 1.0:
+        volume_change = 20 * np.log10(params["volume"])  # Convert to dB
+        audio = audio + volume_change
+    
+    # Apply pitch adjustment (simplified)
+    if params["pitch_shift"] != 1.0:
+        audio = adjust_audio_pitch(audio, params["pitch_shift"])
+    
+    # Normalize audio
+    if pydub['normalize'] is not None:
+        audio = pydub['normalize'](audio)
+    
+    return audio
+
+@traced("report.pdf", lambda emotions_data, title=None, documents=None: {'rows': len(emotions_data)})
+def generate_pdf_report(emotions_data, title="Emotion Analysis Report", documents=None):
+    """Generate PDF report from emotion analysis results
+    
+    documents, for a report across several files, is a list of
+    (name, items) that adds a per-document summary table.
+    """
     if not REPORTLAB_AVAILABLE:
-        st.error("reportlab library not installed. Cannot generate PDF reports.")
+        notify_user("reportlab library not installed. Cannot generate PDF reports.", error=True)
         return None
     
     try:
+        # reportlab's platypus stack is only imported when a report is built
+        _lazy_import("reportlab.platypus")
+        from reportlab.lib.pagesizes import A4
+        from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+        from reportlab.lib.units import inch
+        from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Table, TableStyle, PageBreak
+        from reportlab.lib import colors
+        from reportlab.lib.enums import TA_CENTER
+        
         # Create PDF buffer
         buffer = BytesIO()
         doc = SimpleDocTemplate(buffer, pagesize=A4, 
@@ -599,6 +1894,30 @@ def generate_pdf_report(emotions_data, title="Emotion Analysis Report"):
             percentage = (count / len(emotions_data)) * 100
             elements.append(Paragraph(f"• {emotion.title()}: {count} ({percentage:.1f}%)", normal_style))
         
+        if documents:
+            elements.append(Spacer(1, 0.3*inch))
+            elements.append(Paragraph("Documents", heading_style))
+            document_rows = [['Document', 'Sentences', 'Main Emotion', 'Confidence']]
+            for name, items in documents:
+                counts = Counter(item['emotion'] for item in items)
+                emotional = [emotion for emotion, _ in counts.most_common() if emotion != "neutral"]
+                document_rows.append([
+                    Paragraph(name, normal_style),
+                    str(len(items)),
+                    (emotional[0] if emotional else "neutral").title(),
+                    f"{sum(item['score'] for item in items) / len(items):.2%}" if items else "-",
+                ])
+            document_table = Table(document_rows, colWidths=[3.1*inch, 0.9*inch, 1.4*inch, 1.1*inch])
+            document_table.setStyle(TableStyle([
+                ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#3498db')),
+                ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+                ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+                ('GRID', (0, 0), (-1, -1), 1, colors.black),
+                ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.lightgrey]),
+                ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ]))
+            elements.append(document_table)
+        
         elements.append(Spacer(1, 0.3*inch))
         elements.append(PageBreak())
         
@@ -644,27 +1963,29 @@ def generate_pdf_report(emotions_data, title="Emotion Analysis Report"):
         # Get PDF bytes
         pdf_bytes = buffer.getvalue()
         buffer.close()
+        current_span().set(bytes=len(pdf_bytes))
         
         return pdf_bytes
         
     except Exception as e:
-        st.error(f"Error generating PDF report: {e}")
+        notify_user(f"Error generating PDF report: {e}", error=True)
         return None
 
+@st.cache_data(ttl=600, show_spinner=False)
 def get_available_voices():
-    """Get available voices from pyttsx3"""
+    """Get available voices from pyttsx3 (cached - initializing the engine is slow)"""
     if not PYTTSX3_AVAILABLE:
         return []
     
     try:
         # Try to initialize engine with driver selection
         try:
-            engine = pyttsx3.init()
+            engine = _lazy_import("pyttsx3").init()
         except Exception as e:
             # Try with specific driver for Windows
             if platform.system() == "Windows":
                 try:
-                    engine = pyttsx3.init('sapi5')
+                    engine = _lazy_import("pyttsx3").init('sapi5')
                 except:
                     return []
             else:
@@ -689,6 +2010,153 @@ def get_available_voices():
     except Exception as e:
         return []
 
+# Parallel gTTS fetching
+# gTTS sends one HTTP request per ~100-character part, one after another and
+# each on a fresh connection, so a long combined text means hundreds of
+# sequential round trips. Long text is split here at sentence and clause
+# boundaries instead, the parts are fetched on a bounded pool of keep-alive
+# sessions and their MP3 frames are joined in order.
+GTTS_CHUNK_CHARS = 100  # gTTS's limit per request
+GTTS_CONCURRENCY = int(os.environ.get("EATTS_GTTS_CONCURRENCY", "6"))
+GTTS_RETRIES = int(os.environ.get("EATTS_GTTS_RETRIES", "3"))
+GTTS_TIMEOUT = float(os.environ.get("EATTS_GTTS_TIMEOUT", "15"))
+CLAUSE_BREAK_PATTERN = re.compile(r'(?<=[,;:\u2013\u2014)])\s+')
+GTTS_AUDIO_PATTERN = re.compile(r'jQ1olc","\[\\"(.*)\\"]')
+
+def split_tts_chunks(text, limit=GTTS_CHUNK_CHARS):
+    """Split text into pieces of at most `limit` characters for the TTS API
+    
+    Breaks at sentence ends first, then at clause punctuation, then at
+    spaces; neighbouring pieces are packed together so the text needs as
+    few requests as possible.
+    """
+    pieces = []
+    for sentence in split_into_sentences(text):
+        for clause in ([sentence] if len(sentence) <= limit else CLAUSE_BREAK_PATTERN.split(sentence)):
+            while len(clause) > limit:
+                cut = clause.rfind(" ", 0, limit + 1)
+                if cut <= 0:
+                    cut = limit
+                pieces.append(clause[:cut].strip())
+                clause = clause[cut:].strip()
+            if clause:
+                pieces.append(clause)
+    
+    chunks = []
+    for piece in pieces:
+        if chunks and len(chunks[-1]) + 1 + len(piece) <= limit:
+            chunks[-1] += " " + piece
+        else:
+            chunks.append(piece)
+    return chunks
+
+def _decode_gtts_response(body):
+    """MP3 bytes from a gTTS batchexecute response body"""
+    for line in body.splitlines():
+        if "jQ1olc" in line:
+            match = GTTS_AUDIO_PATTERN.search(line)
+            if match:
+                return base64.b64decode(match.group(1).encode("ascii"))
+    raise ValueError("TTS response contained no audio")
+
+class GTTSFetcher:
+    """Process-wide pool fetching gTTS parts concurrently over reused sessions"""
+    
+    def __init__(self, concurrency=GTTS_CONCURRENCY, retries=GTTS_RETRIES, timeout=GTTS_TIMEOUT):
+        self.concurrency = max(1, concurrency)
+        self.retries = retries
+        self.timeout = timeout
+        self._pool = ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix="eatts-gtts")
+        self._local = threading.local()
+        self._stats_lock = threading.Lock()
+        self._stats = {'requests': 0, 'retries': 0, 'failures': 0}
+    
+    def _session(self):
+        # One keep-alive session per pool thread; requests.Session isn't thread-safe
+        session = getattr(self._local, 'session', None)
+        if session is None:
+            # Unverified requests warn on every call; gTTS silences the same
+            # warning process-wide, which catch_warnings can't do safely across threads
+            urllib3 = _lazy_import("urllib3")
+            urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
+            session = _lazy_import("requests").Session()
+            self._local.session = session
+        return session
+    
+    def _fetch(self, prepared):
+        """Audio for one prepared request, retried on its own with backoff"""
+        for attempt in range(self.retries + 1):
+            try:
+                # Same transport settings gTTS uses (it disables verification for proxies)
+                response = self._session().send(
+                    prepared, verify=False, proxies=urllib.request.getproxies(), timeout=self.timeout)
+                response.raise_for_status()
+                return _decode_gtts_response(response.text)
+            except Exception as e:
+                if attempt == self.retries:
+                    with self._stats_lock:
+                        self._stats['failures'] += 1
+                    raise RuntimeError(f"gTTS request failed after {attempt + 1} attempts: {e}") from e
+                with self._stats_lock:
+                    self._stats['retries'] += 1
+                time.sleep(0.5 * 2 ** attempt)
+    
+    def synthesize(self, text, lang, slow=False):
+        """MP3 bytes for `text` and the number of requests it took"""
+        audio, requests_made = self.synthesize_many([text], lang, slow)
+        return audio[0], requests_made
+    
+    def synthesize_many(self, texts, lang, slow=False):
+        """MP3 bytes for each text, with the parts of all texts fetched in one pass"""
+        gtts = _get_gtts()
+        prepared = []
+        owners = []
+        for index, text in enumerate(texts):
+            for chunk in split_tts_chunks(text):
+                # gTTS builds the request; its pre-processors may still split a chunk
+                for request in gtts(text=chunk, lang=lang, slow=slow)._prepare_requests():
+                    prepared.append(request)
+                    owners.append(index)
+        with self._stats_lock:
+            self._stats['requests'] += len(prepared)
+        audio = [[] for _ in texts]
+        for owner, part in zip(owners, self._pool.map(self._fetch, prepared)):
+            audio[owner].append(part)
+        return [b"".join(parts) for parts in audio], len(prepared)
+    
+    def stats(self):
+        with self._stats_lock:
+            return dict(self._stats, concurrency=self.concurrency)
+
+@st.cache_resource
+def get_gtts_fetcher():
+    return GTTSFetcher()
+
+_gtts_fetcher = get_gtts_fetcher()
+
+@traced("tts.gtts", lambda text, lang, slow=False: {'chars': len(text), 'lang': lang})
+def synthesize_gtts(text, lang, slow=False):
+    """Synthesize text with gTTS into a temporary MP3 and return its path
+    
+    Text longer than one request goes through the parallel fetcher; gTTS's
+    own sequential download is the fallback.
+    """
+    gtts = _get_gtts()
+    if len(text) > GTTS_CHUNK_CHARS and GTTS_CONCURRENCY > 1 and hasattr(gtts, "_prepare_requests"):
+        try:
+            audio, requests_made = _gtts_fetcher.synthesize(text, lang, slow)
+            current_span().set(requests=requests_made)
+            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
+                tmp_file.write(audio)
+            return tmp_file.name
+        except Exception as e:
+            warnings.warn(f"Parallel gTTS fetch failed, retrying sequentially: {e}")
+    
+    tts = gtts(text=text, lang=lang, slow=slow)
+    with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
+        tts.save(tmp_file.name)
+    return tmp_file.name
+
 def generate_speech_with_voice(text, voice_gender='female', lang='en', use_pyttsx3=True, prefer_gtts=False):
     """Generate speech using pyttsx3 with voice selection or fallback to gTTS"""
     try:
@@ -696,10 +2164,7 @@ def generate_speech_with_voice(text, voice_gender='female', lang='en', use_pytts
         # If prefer_gtts is True (e.g., for translated text), use gTTS directly
         # gTTS supports many languages better than pyttsx3
         if prefer_gtts:
-            tts = gTTS(text=text, lang=tts_lang, slow=False)
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
-                tts.save(tmp_file.name)
-            return tmp_file.name
+            return synthesize_gtts(text, tts_lang)
         
         # Check if ffmpeg is available (needed for audio processing)
         ffmpeg_available, ffmpeg_message = check_ffmpeg()
@@ -712,10 +2177,7 @@ def generate_speech_with_voice(text, voice_gender='female', lang='en', use_pytts
                 except:
                     pass
             # Use gTTS as fallback
-            tts = gTTS(text=text, lang=tts_lang, slow=False)
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
-                tts.save(tmp_file.name)
-            return tmp_file.name
+            return synthesize_gtts(text, tts_lang)
         
         # Try pyttsx3 first if available and requested (only for English)
         # For other languages, use gTTS which has better language support
@@ -723,18 +2185,16 @@ def generate_speech_with_voice(text, voice_gender='female', lang='en', use_pytts
             try:
                 return generate_speech_pyttsx3(text, voice_gender)
             except Exception as e:
-                st.warning(f"pyttsx3 failed: {e}. Falling back to gTTS...")
+                notify_user(f"pyttsx3 failed: {e}. Falling back to gTTS...")
         
         # Use gTTS for all languages (better language support)
-        tts = gTTS(text=text, lang=tts_lang, slow=False)
-        with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
-            tts.save(tmp_file.name)
-        return tmp_file.name
+        return synthesize_gtts(text, tts_lang)
         
     except Exception as e:
-        st.error(f"Error generating speech: {e}")
+        notify_user(f"Error generating speech: {e}", error=True)
         return None
 
+@traced("tts.pyttsx3", lambda text, voice_gender='female': {'chars': len(text)})
 def generate_speech_pyttsx3(text, voice_gender='female'):
     """Generate speech using pyttsx3 with voice gender selection"""
     if not PYTTSX3_AVAILABLE:
@@ -743,14 +2203,14 @@ def generate_speech_pyttsx3(text, voice_gender='female'):
     try:
         # Try to initialize engine with driver selection for headless environments
         try:
-            engine = pyttsx3.init()
+            engine = _lazy_import("pyttsx3").init()
         except Exception as e:
             # Try with specific driver for Windows
             if platform.system() == "Windows":
                 try:
-                    engine = pyttsx3.init('sapi5')
+                    engine = _lazy_import("pyttsx3").init('sapi5')
                 except:
-                    engine = pyttsx3.init('nsss' if platform.system() == "Darwin" else 'espeak')
+                    engine = _lazy_import("pyttsx3").init('nsss' if platform.system() == "Darwin" else 'espeak')
             else:
                 raise e
         
@@ -803,8 +2263,13 @@ def generate_speech_pyttsx3(text, voice_gender='female'):
     except Exception as e:
         raise Exception(f"Error with pyttsx3: {e}")
 
-def generate_emotional_speech(text, emotion, lang='en', slow=False, voice_gender='female', use_pyttsx3=True, prefer_gtts=False):
-    """Generate speech with emotional modulation and voice selection"""
+def generate_emotional_speech(text, emotion, lang='en', slow=False, voice_gender='female', use_pyttsx3=True, prefer_gtts=False,
+                              audio_format=None, timing=None):
+    """Generate speech with emotional modulation and voice selection
+    
+    If a `timing` dict is given, its 'duration_ms' is set from the
+    processed audio (after the speed and pitch changes) when it is known.
+    """
     try:
         # Check if ffmpeg is available
         ffmpeg_available, ffmpeg_message = check_ffmpeg()
@@ -814,16 +2279,16 @@ def generate_emotional_speech(text, emotion, lang='en', slow=False, voice_gender
                 try:
                     audio_path = generate_speech_pyttsx3(text, voice_gender)
                     if audio_path and os.path.exists(audio_path):
-                        # Convert WAV to MP3 if possible, otherwise return WAV
+                        # Convert WAV to the output format if possible, otherwise return WAV
                         pydub = _get_pydub()
-                        if pydub['available']:
+                        if pydub['available'] and (audio_format or AUDIO_FORMAT) != "wav":
                             try:
                                 audio = pydub['AudioSegment'].from_wav(audio_path)
-                                mp3_path = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-                                mp3_path.close()
-                                audio.export(mp3_path.name, format="mp3")
+                                output_path = export_audio(audio, audio_format)
                                 os.unlink(audio_path)
-                                return mp3_path.name
+                                if timing is not None:
+                                    timing['duration_ms'] = audio.frame_count() * 1000 / audio.frame_rate
+                                return output_path
                             except:
                                 return audio_path
                         else:
@@ -833,18 +2298,11 @@ def generate_emotional_speech(text, emotion, lang='en', slow=False, voice_gender
                     pass
             # Use gTTS directly if ffmpeg not available (for non-English languages or when prefer_gtts is True)
             if prefer_gtts or lang != 'en':
-                tts_lang_direct = get_tts_language_code(lang)
-                tts = gTTS(text=text, lang=tts_lang_direct, slow=slow)
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.mp3') as tmp_file:
-                    tts.save(tmp_file.name)
-                return tmp_file.name
+                return synthesize_gtts(text, get_tts_language_code(lang), slow)
             else:
-                st.warning(f"Audio processing unavailable: {ffmpeg_message}")
+                notify_user(f"Audio processing unavailable: {ffmpeg_message}")
                 return None
         
-        # Get emotion parameters
-        params = EMOTION_PARAMS.get(emotion, EMOTION_PARAMS["neutral"])
-        
         # Generate base TTS with voice selection
         # Use gTTS for translated text (prefer_gtts=True) or non-English languages
         audio_file = generate_speech_with_voice(text, voice_gender, lang, use_pyttsx3, prefer_gtts=prefer_gtts)
@@ -854,7 +2312,7 @@ def generate_emotional_speech(text, emotion, lang='en', slow=False, voice_gender
         # Determine file format and load audio
         pydub = _get_pydub()
         if not pydub['available']:
-            st.warning("Audio processing (pydub) is not available. Returning audio file without emotion modulation.")
+            notify_user("Audio processing (pydub) is not available. Returning audio file without emotion modulation.")
             return audio_file
         
         try:
@@ -869,7 +2327,7 @@ def generate_emotional_speech(text, emotion, lang='en', slow=False, voice_gender
         except Exception as e:
             error_msg = str(e)
             if "ffmpeg" in error_msg.lower() or "WinError 2" in error_msg or "cannot find the file" in error_msg.lower():
-                st.error(f"""
+                notify_user(f"""
                 **FFmpeg Error: {error_msg}**
                 
                 FFmpeg is required for audio processing but cannot be found. Please:
@@ -878,9 +2336,9 @@ def generate_emotional_speech(text, emotion, lang='en', slow=False, voice_gender
                 3. Restart this Streamlit app
                 
                 For detailed installation instructions, check SETUP_FFMPEG.md in the project directory.
-                """)
+                """, error=True)
             else:
-                st.error(f"Error loading audio file: {error_msg}")
+                notify_user(f"Error loading audio file: {error_msg}", error=True)
             # Clean up temp file
             try:
                 os.unlink(audio_file)
@@ -888,63 +2346,1793 @@ def generate_emotional_speech(text, emotion, lang='en', slow=False, voice_gender
                 pass
             return None
         
-        # Apply speed adjustment
-        if params["speed"] != 1.0:
-            # Speed up or slow down
-            if params["speed"] > 1.0:
-                # Use speedup for faster playback
-                if pydub['speedup'] is not None:
-                    audio = pydub['speedup'](audio, playback_speed=params["speed"])
-                else:
-                    # Fallback: adjust frame rate
-                    original_frame_rate = audio.frame_rate
-                    new_sample_rate = int(original_frame_rate * params["speed"])
-                    audio = audio._spawn(
-                        audio.raw_data,
-                        overrides={"frame_rate": new_sample_rate}
-                    )
-                    audio = audio.set_frame_rate(original_frame_rate)
+        audio = apply_emotion_effects(audio, emotion, pydub)
+        if timing is not None:
+            timing['duration_ms'] = audio.frame_count() * 1000 / audio.frame_rate
+        
+        # Save processed audio
+        output_path = export_audio(audio, audio_format)
+        
+        # Clean up original temp file
+        try:
+            os.unlink(audio_file)
+        except:
+            pass
+        
+        return output_path
+        
+    except Exception as e:
+        notify_user(f"Error generating speech: {e}", error=True)
+        return None
+
+# Combined rendering with per-sentence prosody
+# Each sentence is synthesized on its own and gets its own emotion's effects
+# on raw PCM; the sentences are crossfaded into one buffer that is encoded
+# once. gTTS sentences are fetched together and decoded as one stream, then
+# split again using the frame count of each sentence's MP3.
+# With progressive playback the sentences are rendered in windows that grow
+# 1, 2, 4, ... sentences; each finished window is published as a preview
+# segment while the next one is already being fetched, so the first audio
+# is ready after one sentence instead of the whole document.
+SENTENCE_PROSODY = os.environ.get("EATTS_SENTENCE_PROSODY", "1") != "0"
+CROSSFADE_MS = float(os.environ.get("EATTS_CROSSFADE_MS", "40"))
+PCM_FRAME_RATE = 24000  # gTTS's native rate
+PROGRESSIVE_PLAYBACK = os.environ.get("EATTS_PROGRESSIVE_PLAYBACK", "1") != "0"
+PROGRESSIVE_MAX_WINDOW = int(os.environ.get("EATTS_PROGRESSIVE_MAX_WINDOW", "32"))
+# Long tracks are assembled in a raw PCM file and encoded from it in blocks,
+# so memory holds a few windows of sentences however long the document is
+PCM_BLOCK_SAMPLES = PCM_FRAME_RATE * 10
+PREFETCH_WINDOWS = 4
+
+# MPEG audio Layer III header tables, indexed by the header's version bits
+MP3_BITRATES_KBPS = {
+    'mpeg1': [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    'mpeg2': [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+}
+MP3_SAMPLE_RATES = {3: [44100, 48000, 32000], 2: [22050, 24000, 16000], 0: [11025, 12000, 8000]}
+
+def mp3_sample_count(data):
+    """Samples per channel in an MP3 stream, counted from its frame headers
+    
+    Returns None when the data isn't a plain MPEG Layer III stream.
+    """
+    scan = _scan_mp3(data)
+    return scan and scan[0]
+
+def mp3_duration_ms(data):
+    """Playing time of an MP3 stream from its frame headers, or None"""
+    scan = _scan_mp3(data)
+    return scan[0] * 1000 / scan[1] if scan and scan[1] else None
+
+def _scan_mp3(data):
+    # (samples per channel, sample rate of the last frame)
+    pos = 0
+    if data[:3] == b"ID3" and len(data) >= 10:
+        pos = 10 + ((data[6] & 0x7f) << 21 | (data[7] & 0x7f) << 14 | (data[8] & 0x7f) << 7 | (data[9] & 0x7f))
+    samples, rate = 0, None
+    while pos + 4 <= len(data):
+        if data[pos:pos + 3] == b"TAG":  # ID3v1 trailer
+            break
+        b1, b2 = data[pos + 1], data[pos + 2]
+        version = (b1 >> 3) & 3  # 3 = MPEG-1, 2 = MPEG-2, 0 = MPEG-2.5
+        bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+        if (data[pos] != 0xFF or (b1 & 0xE0) != 0xE0 or version == 1 or (b1 >> 1) & 3 != 1
+                or bitrate_index in (0, 15) or rate_index == 3):
+            return None
+        mpeg1 = version == 3
+        bitrate = MP3_BITRATES_KBPS['mpeg1' if mpeg1 else 'mpeg2'][bitrate_index] * 1000
+        rate = MP3_SAMPLE_RATES[version][rate_index]
+        length = (144 if mpeg1 else 72) * bitrate // rate + ((b2 >> 1) & 1)
+        # A leading Xing/Info frame (written by LAME) carries no audio
+        if samples or not (b"Xing" in data[pos:pos + 40] or b"Info" in data[pos:pos + 40]):
+            samples += 1152 if mpeg1 else 576
+        pos += length
+    return samples, rate
+
+def _pcm(audio):
+    """Mono 16-bit samples of an AudioSegment at PCM_FRAME_RATE"""
+    audio = audio.set_channels(1).set_sample_width(2).set_frame_rate(PCM_FRAME_RATE)
+    return np.frombuffer(audio.raw_data, dtype=np.int16)
+
+def crossfade_concat(clips, crossfade_ms=CROSSFADE_MS, frame_rate=PCM_FRAME_RATE):
+    """Join int16 clips with linear crossfades into one preallocated buffer
+    
+    Returns the joined samples and the (start, end) sample span of each clip.
+    """
+    fade = int(frame_rate * crossfade_ms / 1000)
+    overlaps = [min(fade, len(a), len(b)) for a, b in zip(clips, clips[1:])]
+    out = np.empty(sum(len(clip) for clip in clips) - sum(overlaps), dtype=np.int16)
+    spans = []
+    pos = 0
+    for i, clip in enumerate(clips):
+        overlap = overlaps[i - 1] if i > 0 else 0
+        if overlap:
+            ramp = np.linspace(0.0, 1.0, overlap, endpoint=False, dtype=np.float32)
+            out[pos:pos + overlap] = (out[pos:pos + overlap] * (1.0 - ramp) + clip[:overlap] * ramp).astype(np.int16)
+        out[pos + overlap:pos + len(clip)] = clip[overlap:]
+        spans.append((pos, pos + len(clip)))
+        pos += len(clip) - (overlaps[i] if i < len(overlaps) else 0)
+    return out, spans
+
+class PcmSpool:
+    """Crossfades int16 clips into a temp file of raw PCM as they arrive
+    
+    Produces the same samples and spans as crossfade_concat, but only the
+    newest clip and the crossfade tail before it are in memory. The
+    finished samples are read back through a memory map, in blocks.
+    """
+    
+    def __init__(self, crossfade_ms=CROSSFADE_MS, frame_rate=PCM_FRAME_RATE):
+        self.fade = int(frame_rate * crossfade_ms / 1000)
+        self.frame_rate = frame_rate
+        self._file = tempfile.NamedTemporaryFile(delete=False, suffix=".pcm")
+        self.path = self._file.name
+        self.written = 0
+        # End of the output so far, held back because the next clip may fade into it
+        self._tail = np.zeros(0, dtype=np.int16)
+    
+    def append(self, clip):
+        """Add a clip; returns its (start, end) sample span in the output"""
+        overlap = min(len(self._tail), len(clip))
+        start = self.written + len(self._tail) - overlap
+        if overlap:
+            ramp = np.linspace(0.0, 1.0, overlap, endpoint=False, dtype=np.float32)
+            mixed = (self._tail[len(self._tail) - overlap:] * (1.0 - ramp) + clip[:overlap] * ramp).astype(np.int16)
+            chunk = np.concatenate([self._tail[:len(self._tail) - overlap], mixed, clip[overlap:]])
+        else:
+            chunk = np.concatenate([self._tail, clip])
+        keep = min(self.fade, len(clip))
+        self._write(chunk[:len(chunk) - keep])
+        self._tail = chunk[len(chunk) - keep:].copy()
+        return start, start + len(clip)
+    
+    def _write(self, samples):
+        if len(samples):
+            self._file.write(samples.astype(np.int16, copy=False).tobytes())
+            self.written += len(samples)
+    
+    def __len__(self):
+        return self.written + len(self._tail)
+    
+    def finish(self):
+        """Flush the held-back tail; no clips can be added afterwards"""
+        if not self._file.closed:
+            self._write(self._tail)
+            self._tail = np.zeros(0, dtype=np.int16)
+            self._file.close()
+    
+    def blocks(self, size=PCM_BLOCK_SAMPLES):
+        """The output samples as successive read-only memory maps of `size` samples
+        
+        Each block is mapped on its own and unmapped once the caller lets go
+        of it, so pages already encoded don't stay resident.
+        """
+        self.finish()
+        for first in range(0, self.written, size):
+            block = np.memmap(self.path, dtype=np.int16, mode='r', offset=first * 2,
+                              shape=(min(size, self.written - first),))
+            yield block
+            del block
+    
+    def close(self):
+        self.finish()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+def _decode_sentence_mp3s(parts, pydub):
+    """One int16 PCM array per sentence MP3, decoding them as a single stream"""
+    AudioSegment = pydub['AudioSegment']
+    counts = [mp3_sample_count(part) if part else 0 for part in parts]
+    if any(count is None for count in counts):
+        # Not plain Layer III frames: decode sentence by sentence
+        return [_pcm(AudioSegment.from_file(BytesIO(part), format="mp3")) if part else np.zeros(0, dtype=np.int16)
+                for part in parts]
+    if not sum(counts):
+        return [np.zeros(0, dtype=np.int16) for _ in parts]
+    with trace_span("audio.decode", format="mp3", sentences=len(parts)):
+        whole = _pcm(AudioSegment.from_file(BytesIO(b"".join(parts)), format="mp3"))
+    # Cut at each sentence's share of the frames; the decoder's few ms of
+    # delay are spread over the cuts
+    bounds = np.round(np.cumsum([0] + counts) / sum(counts) * len(whole)).astype(int)
+    return [whole[start:end] for start, end in zip(bounds, bounds[1:])]
+
+def progressive_windows(count, largest=PROGRESSIVE_MAX_WINDOW):
+    """(first, last) sentence ranges growing 1, 2, 4, ... up to `largest`"""
+    windows = []
+    first, size = 0, 1
+    while first < count:
+        windows.append((first, min(count, first + size)))
+        first += size
+        size = min(size * 2, max(1, largest))
+    return windows
+
+def _export_pcm(samples, AudioSegment, audio_format=None):
+    """Encode int16 samples to a temp file; returns its path"""
+    audio = AudioSegment(data=samples.tobytes(), sample_width=2, frame_rate=PCM_FRAME_RATE, channels=1)
+    return export_audio(audio, audio_format)
+
+def _sentence_pcm(texts, use_gtts, tts_lang, slow, voice_gender, pydub):
+    """Raw int16 PCM for each text, before any emotion effects"""
+    if use_gtts:
+        if hasattr(_get_gtts(), "_prepare_requests"):
+            with trace_span("tts.gtts", chars=sum(len(text) for text in texts), sentences=len(texts)) as span:
+                parts, requests_made = _gtts_fetcher.synthesize_many(texts, tts_lang, slow)
+                span.set(requests=requests_made)
+        else:
+            parts = []
+            for text in texts:
+                path = synthesize_gtts(text, tts_lang, slow)
+                with open(path, 'rb') as f:
+                    parts.append(f.read())
+                os.unlink(path)
+        return _decode_sentence_mp3s(parts, pydub)
+    
+    sentence_pcm = []
+    for text in texts:
+        path = generate_speech_pyttsx3(text, voice_gender)
+        sentence_pcm.append(_pcm(pydub['AudioSegment'].from_wav(path)))
+        os.unlink(path)
+    return sentence_pcm
+
+def render_combined_speech(items, lang='en', slow=False, voice_gender='female', use_pyttsx3=True, prefer_gtts=False,
+                           job=None, progressive=False, audio_format=None):
+    """One track in which every sentence keeps its own emotion
+    
+    items are dicts with 'text_to_speak' and 'emotion'. Returns
+    (audio_path, timestamps) with each sentence's start/end in ms, or
+    (None, None) when pydub/FFmpeg aren't available for rendering.
+    
+    With `progressive` (and a job), every finished window of sentences is
+    published through job.add_partial as a segment dict with 'audio_path',
+    'segment', 'first' and 'last', in playback order.
+    """
+    pydub = _get_pydub()
+    if np is None or not pydub['available'] or not check_ffmpeg()[0]:
+        return None, None
+    AudioSegment = pydub['AudioSegment']
+    texts = [item['text_to_speak'] for item in items]
+    use_gtts = prefer_gtts or not (use_pyttsx3 and PYTTSX3_AVAILABLE and lang == 'en')
+    fetch = functools.partial(_sentence_pcm, use_gtts=use_gtts, tts_lang=get_tts_language_code(lang),
+                              slow=slow, voice_gender=voice_gender, pydub=pydub)
+    progressive = progressive and job is not None
+    # Without progressive playback the windows just bound how much is decoded at once
+    windows = progressive_windows(len(items)) if progressive else [
+        (first, min(len(items), first + PROGRESSIVE_MAX_WINDOW)) for first in range(0, len(items), PROGRESSIVE_MAX_WINDOW)
+    ]
+    
+    spool = PcmSpool()
+    spans = []
+    # Later windows are fetched while earlier ones get their effects; the
+    # fetcher's pool serves requests in order, so the first window still
+    # arrives first. Only PREFETCH_WINDOWS are fetched ahead, so decoded
+    # audio doesn't pile up when the network outpaces the effects.
+    # pyttsx3 drives a single local engine on this thread.
+    prefetch = ThreadPoolExecutor(max_workers=3, thread_name_prefix="eatts-prefetch") \
+        if use_gtts and len(windows) > 1 else None
+    pending = []
+    try:
+        for number, (first, last) in enumerate(windows):
+            if prefetch is not None:
+                for ahead in range(number + len(pending), min(len(windows), number + PREFETCH_WINDOWS)):
+                    pending.append(prefetch.submit(fetch, texts[windows[ahead][0]:windows[ahead][1]]))
+                sentence_pcm = pending.pop(0).result()
             else:
-                # Slow down by changing frame rate and then resampling
-                original_frame_rate = audio.frame_rate
-                new_sample_rate = int(original_frame_rate * params["speed"])
-                audio = audio._spawn(
-                    audio.raw_data,
-                    overrides={"frame_rate": new_sample_rate}
+                sentence_pcm = fetch(texts[first:last])
+            
+            window_clips = []
+            for i, pcm in enumerate(sentence_pcm, start=first):
+                if job is not None:
+                    job.check_cancelled()
+                    job.update(progress=0.1 + 0.8 * i / len(items), message=f"Applying emotion to sentence {i+1}/{len(items)}...")
+                if len(pcm):
+                    segment = AudioSegment(data=pcm.tobytes(), sample_width=2, frame_rate=PCM_FRAME_RATE, channels=1)
+                    pcm = _pcm(apply_emotion_effects(segment, items[i]['emotion'], pydub))
+                spans.append(spool.append(pcm))
+                window_clips.append(pcm)
+            
+            if progressive:
+                samples, _ = crossfade_concat(window_clips)
+                job.add_partial({
+                    'audio_path': _export_pcm(samples, AudioSegment, audio_format),
+                    'segment': number,
+                    'first': first,
+                    'last': last,
+                })
+        
+        if job is not None:
+            job.update(progress=0.9, message="Encoding the full track...")
+        output_path = encode_pcm_blocks(spool.blocks(), audio_format)
+    finally:
+        if prefetch is not None:
+            for future in pending:
+                future.cancel()
+            prefetch.shutdown(wait=True)
+        spool.close()
+    
+    timestamps = [
+        {
+            'index': i,
+            'start_ms': round(start * 1000 / PCM_FRAME_RATE),
+            'end_ms': round(end * 1000 / PCM_FRAME_RATE),
+            'emotion': item['emotion'],
+            'text': item['text_to_speak'],
+        }
+        for i, ((start, end), item) in enumerate(zip(spans, items))
+    ]
+    return output_path, timestamps
+
+# Bundled downloads
+# Individual-sentence results can be downloaded as one ZIP of the clips or
+# as one track with a chapter per sentence. Both are built only when their
+# download button is clicked, and the clip list is paged, so a rerun only
+# touches the clips on screen however long the document is.
+CLIPS_PER_PAGE = int(os.environ.get("EATTS_CLIPS_PER_PAGE", "20"))
+RESULTS_PER_PAGE = int(os.environ.get("EATTS_RESULTS_PER_PAGE", "100"))  # rows of the analysis results table
+MAX_ID3_CHAPTERS = 255  # CTOC stores its entry count in one byte
+
+def build_clip_zip(clips):
+    """ZIP of the (audio_path, item) clips plus an M3U playlist; returns its temp path
+    
+    Clips are already compressed, so they are stored rather than deflated
+    and copied into the archive one file at a time.
+    """
+    output = tempfile.NamedTemporaryFile(delete=False, suffix=".zip")
+    output.close()
+    playlist = ["#EXTM3U"]
+    with trace_span("bundle.zip", sentences=len(clips)) as span, \
+            zipfile.ZipFile(output.name, "w", compression=zipfile.ZIP_STORED) as archive:
+        for number, (audio_path, item) in enumerate(clips, start=1):
+            name = f"{number:04d}_{item['emotion']}{os.path.splitext(audio_path)[1]}"
+            archive.write(audio_path, name)
+            title = " ".join(item.get('text_to_speak', item['sentence']).split())[:120]
+            playlist += [f"#EXTINF:-1,{item['emotion'].title()}: {title}", name]
+        archive.writestr("playlist.m3u", "\n".join(playlist) + "\n")
+        span.set(bytes=os.path.getsize(output.name))
+    return output.name
+
+def _group_chapters(spans, items, limit):
+    """(start_ms, end_ms, title) chapters, merging neighbouring sentences to stay within `limit`"""
+    per_chapter = -(-len(spans) // limit) if limit else 1
+    chapters = []
+    for first in range(0, len(spans), per_chapter):
+        last = min(first + per_chapter, len(spans)) - 1
+        item = items[first]
+        text = " ".join(item.get('text_to_speak', item['sentence']).split())
+        label = f"{first + 1}" if first == last else f"{first + 1}-{last + 1}"
+        # A chapter ends where the next one starts, inside the crossfade
+        end = spans[last + 1][0] if last + 1 < len(spans) else spans[last][1]
+        chapters.append((
+            round(spans[first][0] * 1000 / PCM_FRAME_RATE),
+            round(end * 1000 / PCM_FRAME_RATE),
+            f"{label}. {item['emotion'].title()}: {text[:80]}",
+        ))
+    return chapters
+
+def build_bundle_track(clips, audio_format=None):
+    """All (audio_path, item) clips joined into one track with a chapter per sentence; returns its temp path
+    
+    MP3 gets ID3 chapter frames and Ogg gets CHAPTERxxx comments; WAV has
+    no chapter markers. Needs pydub with FFmpeg to decode the clips.
+    """
+    AudioSegment = _get_pydub()['AudioSegment']
+    spool = PcmSpool()
+    spans = []
+    try:
+        with trace_span("audio.decode", format="bundle", sentences=len(clips)):
+            previous_path, clip = None, None
+            for audio_path, item in clips:
+                # Clips are decoded one at a time into the spool; a repeated
+                # sentence right after itself reuses the decoded samples
+                if audio_path != previous_path:
+                    clip = _pcm(AudioSegment.from_file(audio_path))
+                    previous_path = audio_path
+                samples = clip
+                if item.get('duration_ms') is not None:
+                    # Drop any encoder padding, so clip_timestamps() matches the track
+                    samples = clip[:round(item['duration_ms'] * PCM_FRAME_RATE / 1000)]
+                spans.append(spool.append(samples))
+        items = [item for _, item in clips]
+        audio_format = audio_format or AUDIO_FORMAT
+        
+        if audio_format == "opus":
+            tags = {}
+            for number, (start_ms, _, title) in enumerate(_group_chapters(spans, items, 999), start=1):
+                hours, rest = divmod(start_ms, 3600000)
+                tags[f"CHAPTER{number:03d}"] = f"{hours:02d}:{rest // 60000:02d}:{rest % 60000 / 1000:06.3f}"
+                tags[f"CHAPTER{number:03d}NAME"] = title
+            return encode_pcm_blocks(spool.blocks(), audio_format, tags=tags)
+        
+        output_path = encode_pcm_blocks(spool.blocks(), audio_format)
+    finally:
+        spool.close()
+    if audio_format == "mp3":
+        # Put the chapter tag in front by copying the encoded file, not reading it whole
+        tagged_path = output_path + ".tagged"
+        with open(output_path, 'rb') as source, open(tagged_path, 'wb') as out:
+            source.seek(id3_chapters.tag_length(source.read(10)))
+            out.write(id3_chapters.chapter_tag(_group_chapters(spans, items, MAX_ID3_CHAPTERS)))
+            shutil.copyfileobj(source, out, 1 << 20)
+        os.replace(tagged_path, output_path)
+    return output_path
+
+def _read_file(path):
+    with open(path, 'rb') as f:
+        return f.read()
+
+def _bundle_bytes(build, *args):
+    """Run a bundle builder and return the file's bytes, removing the temp file"""
+    path = build(*args)
+    try:
+        return _read_file(path)
+    finally:
+        os.unlink(path)
+
+# Caption export
+# Sentence timings come from the synthesized audio itself: the crossfade
+# spans of the combined track, or each processed clip's duration for the
+# individual-sentence track. They export as SRT, WebVTT (with the emotion
+# as a cue class for styling) and a JSON timing map.
+
+def clip_timestamps(clips, crossfade_ms=CROSSFADE_MS):
+    """Timestamps of (audio_path, item) clips as joined by build_bundle_track; None if a duration is unknown"""
+    durations = [item.get('duration_ms') for _, item in clips]
+    if not clips or any(duration is None for duration in durations):
+        return None
+    lengths = [round(duration * PCM_FRAME_RATE / 1000) for duration in durations]
+    fade = int(PCM_FRAME_RATE * crossfade_ms / 1000)
+    timestamps = []
+    pos = 0
+    for i, ((_, item), length) in enumerate(zip(clips, lengths)):
+        timestamps.append({
+            'index': i,
+            'start_ms': round(pos * 1000 / PCM_FRAME_RATE),
+            'end_ms': round((pos + length) * 1000 / PCM_FRAME_RATE),
+            'emotion': item['emotion'],
+            'text': item.get('text_to_speak', item['sentence']),
+        })
+        if i + 1 < len(lengths):
+            pos += length - min(fade, length, lengths[i + 1])  # same overlap as crossfade_concat
+    return timestamps
+
+def _caption_time(ms, separator):
+    hours, rest = divmod(int(round(ms)), 3600000)
+    minutes, rest = divmod(rest, 60000)
+    return f"{hours:02d}:{minutes:02d}:{rest // 1000:02d}{separator}{rest % 1000:03d}"
+
+def _caption_cues(timestamps):
+    """(start_ms, end_ms, stamp) per sentence; a cue ends where the next one starts, inside the crossfade"""
+    cues = []
+    for i, stamp in enumerate(timestamps):
+        end = stamp['end_ms']
+        if i + 1 < len(timestamps):
+            end = min(end, timestamps[i + 1]['start_ms'])
+        cues.append((stamp['start_ms'], end, stamp))
+    return cues
+
+def timestamps_to_srt(timestamps):
+    """SubRip subtitles, one cue per sentence"""
+    return "\n".join(
+        f"{number}\n{_caption_time(start, ',')} --> {_caption_time(end, ',')}\n{' '.join(stamp['text'].split())}\n"
+        for number, (start, end, stamp) in enumerate(_caption_cues(timestamps), start=1)
+    )
+
+def timestamps_to_vtt(timestamps):
+    """WebVTT captions, one cue per sentence with its emotion as the cue text's class"""
+    lines = ["WEBVTT", ""]
+    for number, (start, end, stamp) in enumerate(_caption_cues(timestamps), start=1):
+        text = " ".join(stamp['text'].split()).replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+        lines += [str(number), f"{_caption_time(start, '.')} --> {_caption_time(end, '.')}",
+                  f"<c.{stamp['emotion']}>{text}</c>", ""]
+    return "\n".join(lines)
+
+def timestamps_to_json(timestamps):
+    """JSON timing map: each sentence's start/end in ms and its emotion"""
+    return json.dumps({
+        'duration_ms': timestamps[-1]['end_ms'] if timestamps else 0,
+        'sentences': [
+            {'index': stamp['index'], 'start_ms': stamp['start_ms'], 'end_ms': stamp['end_ms'],
+             'emotion': stamp['emotion'], 'text': stamp['text']}
+            for stamp in timestamps
+        ],
+    }, ensure_ascii=False, indent=2)
+
+# Audiobook mode
+# Book-length documents are split into chapters (the document outline,
+# heading-like lines, or every AUDIOBOOK_CHAPTER_SENTENCES sentences) that
+# are analyzed and spoken a few at a time. Each finished chapter is
+# checkpointed under AUDIOBOOK_DIR in a directory named after the text and
+# voice settings, so running the same book again picks up where an
+# interrupted or failed run stopped, and a failure only costs one chapter.
+# The chapter files are joined without re-encoding into one chaptered file.
+AUDIOBOOK_DIR = os.environ.get(
+    "EATTS_AUDIOBOOK_DIR", os.path.join(os.path.expanduser("~"), ".cache", "eatts", "audiobooks"))
+AUDIOBOOK_CHAPTER_SENTENCES = int(os.environ.get("EATTS_AUDIOBOOK_CHAPTER_SENTENCES", "150"))
+AUDIOBOOK_PARALLEL = int(os.environ.get("EATTS_AUDIOBOOK_PARALLEL", "2"))
+HEADING_PATTERN = re.compile(
+    r'^\s*(#{1,3}\s+\S.*|(chapter|part|section|unit|lesson|module)\s+[\w.-]+\b.*)$', re.IGNORECASE)
+HEADING_MAX_CHARS = 100
+
+def _heading_starts(lines, outline):
+    """(line number, title) of each chapter heading in `lines`"""
+    if outline:
+        # Outline titles are matched in order against the start of a line
+        starts = []
+        wanted = [sentence_key(title) for title in outline]
+        for number, line in enumerate(lines):
+            if len(starts) < len(wanted) and wanted[len(starts)] and \
+                    sentence_key(line).startswith(wanted[len(starts)]):
+                starts.append((number, outline[len(starts)].strip()))
+        if starts:
+            return starts
+    return [
+        (number, line.strip().lstrip("#").strip())
+        for number, line in enumerate(lines)
+        if len(line.strip()) <= HEADING_MAX_CHARS and HEADING_PATTERN.match(line)
+    ]
+
+def split_chapters(text, outline=None, target_sentences=AUDIOBOOK_CHAPTER_SENTENCES):
+    """Chapters of a long text as dicts with 'title' and 'sentences'
+    
+    Chapters start at the outline titles when they can be found in the
+    text, otherwise at heading-like lines; chapters longer than
+    `target_sentences` are split further at sentence boundaries.
+    """
+    lines = text.splitlines()
+    starts = _heading_starts(lines, outline)
+    if not starts or starts[0][0] > 0:
+        starts.insert(0, (0, None))
+    chapters = []
+    for (first, title), (last, _) in zip(starts, starts[1:] + [(len(lines), None)]):
+        sentences = split_into_sentences("\n".join(lines[first:last]))
+        parts = [sentences[i:i + target_sentences] for i in range(0, len(sentences), max(1, target_sentences))]
+        for number, part in enumerate(parts, start=1):
+            name = title or f"Part {len(chapters) + 1}"
+            if len(parts) > 1:
+                name = f"{name} ({number}/{len(parts)})"
+            chapters.append({'title': name, 'sentences': part})
+    return chapters
+
+def audiobook_id(chapters, speech, model_key=None):
+    """Checkpoint directory name for a chapter list rendered with `speech` settings and emotion model"""
+    smoothing = [SMOOTHING_WINDOW, HYSTERESIS_MARGIN] if SMOOTHING_WINDOW > 1 or HYSTERESIS_MARGIN > 0 else []
+    content = json.dumps([[chapter['title'], chapter['sentences']] for chapter in chapters]
+                         + [speech, resolve_emotion_model(model_key)[1]['name']] + smoothing, sort_keys=True)
+    return hashlib.sha256(content.encode("utf-8")).hexdigest()[:16]
+
+def _write_json_atomic(path, data):
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    with os.fdopen(fd, 'w', encoding='utf-8') as f:
+        json.dump(data, f, ensure_ascii=False)
+    os.replace(tmp, path)
+
+def load_chapter_checkpoint(book_dir, number):
+    """Metadata of a finished chapter, or None when it still has to be rendered"""
+    try:
+        with open(os.path.join(book_dir, f"chapter_{number:03d}.json"), encoding='utf-8') as f:
+            meta = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return meta if os.path.exists(os.path.join(book_dir, meta.get('audio', ""))) else None
+
+def _audio_duration_ms(path):
+    """Length of an audio file in ms, from its MP3 frames or by decoding it"""
+    if path.endswith(".mp3"):
+        duration = mp3_duration_ms(_read_file(path))
+        if duration is not None:
+            return duration
+    pydub = _get_pydub()
+    if not pydub['available']:
+        return None
+    return len(pydub['AudioSegment'].from_file(path))
+
+def analyze_sentences(sentences, classifier):
+    """Analysis items for `sentences`, smoothed with the deployment defaults
+    
+    Each distinct sentence is classified once, in one batched call.
+    """
+    unique = list(dict.fromkeys(sentences))
+    results, matrix = detect_emotion_matrix(unique, classifier)
+    emotions = dict(zip(unique, results))
+    rows = dict(zip(unique, matrix.astype(np.float64).round(4).tolist())) if matrix is not None else {}
+    items = [
+        {'sentence': sentence, 'emotion': emotions[sentence][0], 'score': emotions[sentence][1],
+         **({'probabilities': rows[sentence]} if rows else {})}
+        for sentence in sentences
+    ]
+    return apply_emotion_smoothing(items)
+
+def speak_items(items, speech):
+    """Speak analysis items as one track; returns (audio_path, timestamps)
+    
+    Falls back to one clip with the dominant emotion (and no timestamps)
+    when the per-sentence track can't be rendered.
+    """
+    items = [{**item, 'text_to_speak': item['sentence']} for item in items]
+    if SENTENCE_PROSODY:
+        audio_path, timestamps = render_combined_speech(items, **speech)
+        if audio_path:
+            return audio_path, timestamps
+    dominant = Counter(item['emotion'] for item in items).most_common(1)[0][0]
+    return generate_emotional_speech(" ".join(item['sentence'] for item in items), dominant, **speech), None
+
+def render_audiobook_chapter(chapter, classifier, speech):
+    """Analyze one chapter and speak it; returns (audio_path, timestamps)"""
+    return speak_items(analyze_sentences(chapter['sentences'], classifier), speech)
+
+def checkpoint_chapter(book_dir, number, chapter, audio_path, timestamps):
+    """Move a rendered chapter into the book directory and record it as finished"""
+    name = f"chapter_{number:03d}{os.path.splitext(audio_path)[1]}"
+    target = os.path.join(book_dir, name)
+    # Copy under a temporary name first; the rename and the JSON written
+    # last make a chapter either fully there or not there at all
+    shutil.move(audio_path, target + ".tmp")
+    os.replace(target + ".tmp", target)
+    duration_ms = timestamps[-1]['end_ms'] if timestamps else _audio_duration_ms(target)
+    meta = {
+        'number': number,
+        'title': chapter['title'],
+        'audio': name,
+        'sentences': len(chapter['sentences']),
+        'duration_ms': duration_ms,
+        'timestamps': timestamps,
+    }
+    _write_json_atomic(os.path.join(book_dir, f"chapter_{number:03d}.json"), meta)
+    return meta
+
+def _ffmetadata_escape(value):
+    return re.sub(r'([=;#\\\n])', r'\\\1', value)
+
+def assemble_audiobook(book_dir, chapters):
+    """Join checkpointed chapter files into one chaptered audiobook
+    
+    chapters are the checkpoint metadata dicts in order. With FFmpeg the
+    files are concatenated by stream copy with a chapter per file; without
+    it the chapters must be MP3 and their frames are joined behind an ID3
+    chapter tag. Either way only one chapter is in memory at a time.
+    Returns (path, markers) with each chapter's start/end in ms.
+    """
+    markers = []
+    position = 0
+    for chapter in chapters:
+        # Stream-copied MP3 chapters keep their encoder padding, so their
+        # length comes from the frames rather than the rendered samples
+        duration = chapter.get('duration_ms')
+        if chapter['audio'].endswith(".mp3"):
+            duration = mp3_duration_ms(_read_file(os.path.join(book_dir, chapter['audio']))) or duration
+        duration = round(duration or 0)
+        markers.append({'title': chapter['title'], 'start_ms': position, 'end_ms': position + duration})
+        position += duration
+    suffixes = {os.path.splitext(chapter['audio'])[1] for chapter in chapters}
+    # Chapters that fell back to another format are re-encoded to MP3
+    mixed = len(suffixes) > 1
+    suffix = ".mp3" if mixed else suffixes.pop()
+    output_path = os.path.join(book_dir, f"audiobook{suffix}")
+    tmp_path = os.path.join(book_dir, f"audiobook.tmp{suffix}")
+    ffmpeg_available, _ = check_ffmpeg()
+    
+    with trace_span("audiobook.assemble", chapters=len(chapters)):
+        if ffmpeg_available:
+            list_path = os.path.join(book_dir, "concat.txt")
+            metadata_path = os.path.join(book_dir, "chapters.ffmetadata")
+            with open(list_path, 'w', encoding='utf-8') as f:
+                for chapter in chapters:
+                    escaped = os.path.join(book_dir, chapter['audio']).replace("'", "'\\''")
+                    f.write(f"file '{escaped}'\n")
+            with open(metadata_path, 'w', encoding='utf-8') as f:
+                f.write(";FFMETADATA1\n")
+                for marker in markers:
+                    f.write(f"[CHAPTER]\nTIMEBASE=1/1000\nSTART={marker['start_ms']}\nEND={marker['end_ms']}\n"
+                            f"title={_ffmetadata_escape(marker['title'])}\n")
+            codec = ["-c:a", "libmp3lame", "-b:a", MP3_BITRATE] if mixed else ["-c", "copy"]
+            subprocess.run(
+                [find_ffmpeg_path() or "ffmpeg", "-y", "-hide_banner", "-loglevel", "error",
+                 "-f", "concat", "-safe", "0", "-i", list_path, "-i", metadata_path,
+                 "-map", "0:a", "-map_metadata", "1", "-map_chapters", "1", *codec, tmp_path],
+                check=True, capture_output=True, timeout=3600
+            )
+        else:
+            if mixed or suffix != ".mp3":
+                raise RuntimeError("Joining non-MP3 chapters needs FFmpeg")
+            # ID3v2.3 chapter counts are one byte
+            tag = [(m['start_ms'], m['end_ms'], m['title']) for m in markers[:MAX_ID3_CHAPTERS]]
+            with open(tmp_path, 'wb') as out:
+                out.write(id3_chapters.chapter_tag(tag))
+                for chapter in chapters:
+                    out.write(id3_chapters.strip_tag(_read_file(os.path.join(book_dir, chapter['audio']))))
+        os.replace(tmp_path, output_path)
+    _write_json_atomic(os.path.join(book_dir, "chapters.json"), markers)
+    return output_path, markers
+
+# Batch processing
+# Several uploaded documents are extracted, analyzed and optionally spoken
+# at the same time. The files of every session's batches share one pool of
+# EATTS_BATCH_WORKERS threads, so one large upload can't crowd out other
+# sessions, and their sentences meet in the shared inference server's
+# micro-batches.
+BATCH_WORKERS = int(os.environ.get("EATTS_BATCH_WORKERS", "4"))
+BATCH_MAX_FILES = int(os.environ.get("EATTS_BATCH_MAX_FILES", "20"))
+
+@st.cache_resource
+def get_batch_pool():
+    """Process-wide pool that runs the files of all batch jobs"""
+    return ThreadPoolExecutor(max_workers=max(1, BATCH_WORKERS), thread_name_prefix="eatts-batch")
+
+_batch_pool = get_batch_pool()
+
+def process_batch_file(job, index, name, data, classifier, strip_furniture, speech):
+    """Extract, analyze and (with `speech` settings) speak one uploaded file"""
+    job.check_cancelled()
+    job.set_item(index, status="Extracting", progress=0.1)
+    upload = BytesIO(data)
+    upload.name = name
+    with job_context(job), trace_span("batch.file", bytes=len(data)):
+        text = extract_text_from_file(upload, strip_furniture)
+        if not text or not text.strip():
+            raise ValueError("no text could be extracted")
+        sentences = split_into_sentences(text)
+        if not sentences:
+            raise ValueError("no sentences found")
+        job.check_cancelled()
+        job.set_item(index, status="Analyzing", progress=0.3, sentences=len(sentences))
+        items = analyze_sentences(sentences, classifier)
+        audio_path = timestamps = None
+        if speech:
+            job.check_cancelled()
+            job.set_item(index, status="Generating speech", progress=0.6)
+            audio_path, timestamps = speak_items(items, speech)
+            if not audio_path:
+                raise RuntimeError("speech generation failed")
+    job.set_item(index, status="Done", progress=1.0)
+    return {'name': name, 'emotions': items, 'audio_path': audio_path, 'timestamps': timestamps}
+
+# Project store
+# Analyses, translations, reports and audio are saved under a project id
+# in a ProjectStore (project_store.py): rows in a SQLite database, files
+# in a content-addressed blob directory next to it. A reload, another tab
+# or a server restart reopens a project instead of recomputing it.
+# Listing and opening read metadata and sentence rows only; audio and
+# reports stay on disk until they are played or downloaded. Every project
+# has an owner: the signed-in user when Streamlit authentication is
+# configured, otherwise the browser that created it, through a random id
+# in a signed cookie. Nothing about it is in the page URL, so a shared
+# link or bookmark lists no projects. The cookie is a convenience boundary
+# between browsers, not access control: anyone using the same browser
+# profile sees its projects.
+PROJECTS_ENABLED = os.environ.get("EATTS_PROJECTS", "1") != "0"
+PROJECT_DIR = os.environ.get(
+    "EATTS_PROJECT_DIR", os.path.join(os.path.expanduser("~"), ".cache", "eatts", "projects"))
+RECENT_PROJECTS = int(os.environ.get("EATTS_RECENT_PROJECTS", "10"))
+PROJECT_OWNER_COOKIE = "eatts_owner"
+PROJECT_OWNER_COOKIE_DAYS = 365
+PROJECT_PAGE_SIZE = 500  # sentence rows read at a time when a whole project is iterated
+
+@st.cache_resource
+def get_project_store():
+    """Process-wide project store"""
+    return ProjectStore(PROJECT_DIR)
+
+_project_store = get_project_store() if PROJECTS_ENABLED else None
+
+def project_title(text, file_name=None):
+    """Name for a new project: the uploaded file, or the text's first sentence"""
+    if file_name:
+        return file_name
+    first = (split_into_sentences(text[:2000]) or ["Untitled"])[0]
+    return first if len(first) <= 60 else first[:57] + "..."
+
+def save_project_audio(store, project_id, audio_result, voice_settings):
+    """Copy a finished speech result into the blob store and record it"""
+    if audio_result['mode'] == "combined":
+        if not audio_result.get('audio_path'):
+            return
+        data = {'mode': "combined", 'audio': store.put_file(audio_result['audio_path']),
+                'timestamps': audio_result.get('timestamps')}
+    else:
+        data = {'mode': "individual", 'clips': [[store.put_file(path), item] for path, item in audio_result['clips']]}
+    store.save_artifact(project_id, "audio", {**data, 'voice_settings': voice_settings})
+
+def load_project_audio(store, project_id):
+    """(audio_result, voice settings) of a saved speech result, (None, None) if there is none"""
+    data = store.artifact(project_id, "audio")
+    if data is None:
+        return None, None
+    if data['mode'] == "combined":
+        audio_result = {'mode': "combined", 'audio_path': store.blob_path(data['audio']), 'timestamps': data['timestamps']}
+    else:
+        audio_result = {'mode': "individual", 'clips': [(store.blob_path(name), item) for name, item in data['clips']]}
+    return audio_result, data.get('voice_settings')
+
+class ProjectSentences:
+    """A saved project's analysis items, read from the store a page at a time
+    
+    Stands in for the list of items an analysis produces: it has a length,
+    and can be indexed, sliced and iterated. Only the probability matrix is
+    kept in memory, so smoothing stays exact across pages; sentence text,
+    translations and scores are read when a view or job asks for them.
+    """
+    
+    def __init__(self, store, project_id, count, matrix=None, translated=False):
+        self.store = store
+        self.project_id = project_id
+        self.count = count
+        self.matrix = matrix
+        self.translated = translated
+        self._labels = None  # smoothed label index and score of every sentence
+        self._scores = None
+        self._field = None  # yield this field of each item instead of the item
+    
+    @classmethod
+    def load(cls, store, project):
+        return cls(store, project['id'], project['sentence_count'],
+                   store.probabilities(project['id']), store.translated(project['id']))
+    
+    def _view(self, **attributes):
+        view = type(self).__new__(type(self))
+        view.__dict__.update(self.__dict__, **attributes)
+        return view
+    
+    def smoothed(self, window, margin):
+        """These items relabelled from their smoothed probability rows, as apply_emotion_smoothing() does"""
+        if self.matrix is None or (window <= 1 and margin <= 0):
+            return self._view(_labels=None, _scores=None)
+        smoothed = smooth_probabilities(self.matrix, window)
+        labels = hysteresis_labels(smoothed, margin)
+        return self._view(_labels=labels, _scores=smoothed[np.arange(len(labels)), labels])
+    
+    def column(self, field):
+        """One field of every item, e.g. 'translated_sentence'"""
+        return self._view(_field=field)
+    
+    def page(self, start, stop):
+        items = self.store.sentences(self.project_id, start, stop)
+        if self._labels is not None:
+            items = [
+                {**item, 'emotion': EMOTION_LABELS[label], 'score': float(score)}
+                for item, label, score in zip(items, self._labels[start:stop], self._scores[start:stop])
+            ]
+        return [item[self._field] for item in items] if self._field else items
+    
+    def __len__(self):
+        return self.count
+    
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            start, stop, step = index.indices(self.count)
+            if step != 1:
+                return list(self)[index]
+            return self.page(start, stop) if start < stop else []
+        position = index + self.count if index < 0 else index
+        if not 0 <= position < self.count:
+            raise IndexError(index)
+        return self.page(position, position + 1)[0]
+    
+    def __iter__(self):
+        for start in range(0, self.count, PROJECT_PAGE_SIZE):
+            yield from self.page(start, min(start + PROJECT_PAGE_SIZE, self.count))
+
+# Background jobs
+# Analysis, translation, synthesis and report work runs on a process-wide
+# executor instead of the script thread, so widget changes and reruns only
+# read job status instead of restarting the work.
+JOB_KINDS = ("analysis", "translation", "synthesis", "report", "audiobook", "batch", "api")
+MAX_CONCURRENT_JOBS = int(os.environ.get("EATTS_MAX_JOBS", "4"))
+MAX_JOBS_PER_SESSION = int(os.environ.get("EATTS_MAX_JOBS_PER_SESSION", "2"))
+MAX_QUEUED_JOBS_PER_SESSION = int(os.environ.get("EATTS_MAX_QUEUED_JOBS_PER_SESSION", "8"))
+JOB_RETENTION_SECONDS = int(os.environ.get("EATTS_JOB_RETENTION_SECONDS", "3600"))
+JOB_POLL_INTERVAL = float(os.environ.get("EATTS_JOB_POLL_INTERVAL", "0.75"))
+# Sentences per classifier call in an analysis job; with worker processes
+# each call is sharded, so every worker still gets a full 16-sentence share
+ANALYSIS_CHUNK_SIZE = 16 * max(1, INFERENCE_WORKERS)
+
+class JobCancelled(Exception):
+    """Raised inside a job function when cancellation was requested"""
+
+class JobLimitError(Exception):
+    """Raised when a session already has too many jobs queued"""
+
+class Job:
+    """State of one background job, shared between the worker and the UI"""
+    
+    def __init__(self, kind, session_id, label=""):
+        self.id = uuid.uuid4().hex[:12]
+        self.kind = kind
+        self.session_id = session_id
+        self.label = label or kind.title()
+        self.status = "queued"  # queued -> running -> done / failed / cancelled
+        self.progress = 0.0
+        self.message = "Waiting for a free worker..."
+        self.partial_results = []
+        self.items = {}
+        self.warnings = []
+        self.result = None
+        self.error = None
+        self.created_at = time.time()
+        self.started_at = None
+        self.finished_at = None
+        self._cancel_event = threading.Event()
+        self._finished = threading.Event()
+        self._lock = threading.Lock()
+    
+    @property
+    def done(self):
+        return self.status in ("done", "failed", "cancelled")
+    
+    @property
+    def cancelled(self):
+        return self._cancel_event.is_set()
+    
+    def cancel(self):
+        """Request cooperative cancellation"""
+        self._cancel_event.set()
+    
+    def wait(self, timeout=None):
+        """Block until the job is done, cancelled or failed; returns whether it is"""
+        return self._finished.wait(timeout)
+    
+    def check_cancelled(self):
+        """Call between units of work; raises JobCancelled if cancel() was requested"""
+        if self._cancel_event.is_set():
+            raise JobCancelled()
+    
+    def update(self, progress=None, message=None):
+        """Report progress (0.0 - 1.0) and/or a status message"""
+        with self._lock:
+            if progress is not None:
+                self.progress = max(0.0, min(1.0, float(progress)))
+            if message is not None:
+                self.message = message
+    
+    def add_partial(self, item):
+        """Publish a partial result the UI can show before the job finishes"""
+        with self._lock:
+            self.partial_results.append(item)
+    
+    def set_item(self, key, **fields):
+        """Record the state of one part of the job (a file of a batch) for the UI"""
+        with self._lock:
+            self.items.setdefault(key, {}).update(fields)
+    
+    def warn(self, message):
+        """Record a warning for the UI (st.* calls don't reach the browser from worker threads)"""
+        with self._lock:
+            # A problem hit by every sentence or chunk is shown once
+            if message not in self.warnings:
+                self.warnings.append(message)
+    
+    def snapshot(self):
+        """Consistent copy of the job state for rendering"""
+        with self._lock:
+            return {
+                'id': self.id,
+                'kind': self.kind,
+                'label': self.label,
+                'status': self.status,
+                'progress': self.progress,
+                'message': self.message,
+                'partial_results': list(self.partial_results),
+                'items': {key: dict(fields) for key, fields in self.items.items()},
+                'warnings': list(self.warnings),
+                'error': self.error,
+            }
+
+# The job whose work the current thread is doing. Code that runs both on
+# the script thread and inside jobs (extraction, the classifier, TTS, the
+# PDF report) reports problems through notify_user, which records them on
+# that job for render_job_status instead of calling st.* with no session.
+_job_context = threading.local()
+
+def current_job():
+    """The job running on this thread, or None on a script thread"""
+    return getattr(_job_context, 'job', None)
+
+@contextmanager
+def job_context(job):
+    """Mark work on a pool thread as part of `job`"""
+    previous = current_job()
+    _job_context.job = job
+    try:
+        yield job
+    finally:
+        _job_context.job = previous
+
+def notify_user(message, error=False):
+    """Show a warning (or an error) in the session, or record it on the running job"""
+    job = current_job()
+    if job is not None:
+        job.warn(message)
+    elif error:
+        st.error(message)
+    else:
+        st.warning(message)
+
+class JobExecutor:
+    """Fixed pool of worker threads with a global and a per-session concurrency cap"""
+    
+    def __init__(self, max_workers=MAX_CONCURRENT_JOBS, max_per_session=MAX_JOBS_PER_SESSION,
+                 max_queued_per_session=MAX_QUEUED_JOBS_PER_SESSION):
+        self.max_workers = max(1, max_workers)
+        self.max_per_session = max(1, max_per_session)
+        self.max_queued_per_session = max(1, max_queued_per_session)
+        self._jobs = {}
+        self._queue = []  # (job, fn, args, kwargs) in submission order
+        self._running_per_session = {}
+        self._cond = threading.Condition()
+        for i in range(self.max_workers):
+            threading.Thread(target=self._worker, name=f"eatts-job-{i}", daemon=True).start()
+    
+    def submit(self, kind, session_id, fn, *args, label="", **kwargs):
+        """Queue fn(job, *args, **kwargs) and return its Job"""
+        if kind not in JOB_KINDS:
+            raise ValueError(f"Unknown job kind: {kind}")
+        with self._cond:
+            self._prune()
+            pending = sum(1 for job in self._jobs.values() if job.session_id == session_id and not job.done)
+            if pending >= self.max_queued_per_session:
+                raise JobLimitError(
+                    f"Too many jobs in progress for this session ({pending}). "
+                    "Wait for one to finish or cancel it."
+                )
+            job = Job(kind, session_id, label)
+            self._jobs[job.id] = job
+            self._queue.append((job, fn, args, kwargs))
+            self._cond.notify()
+        return job
+    
+    def get(self, job_id):
+        if not job_id:
+            return None
+        with self._cond:
+            return self._jobs.get(job_id)
+    
+    def cancel(self, job_id):
+        """Cancel a job; queued jobs are dropped immediately, running ones stop at their next check"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is None or job.done:
+                return False
+            job.cancel()
+            for entry in self._queue:
+                if entry[0] is job:
+                    self._queue.remove(entry)
+                    job.status = "cancelled"
+                    job.message = "Cancelled"
+                    job.finished_at = time.time()
+                    job._finished.set()
+                    break
+            return True
+    
+    def pop(self, job_id):
+        """Stop tracking a finished job, dropping its result with it"""
+        with self._cond:
+            job = self._jobs.get(job_id)
+            if job is not None and job.done:
+                del self._jobs[job_id]
+            return job
+    
+    def session_jobs(self, session_id):
+        with self._cond:
+            return [job for job in self._jobs.values() if job.session_id == session_id]
+    
+    def stats(self):
+        with self._cond:
+            running = sum(self._running_per_session.values())
+            return {
+                'queued': len(self._queue),
+                'running': running,
+                'tracked': len(self._jobs),
+                'max_workers': self.max_workers,
+            }
+    
+    def _next_runnable(self):
+        # First queued job whose session is below its concurrency cap
+        for entry in self._queue:
+            job = entry[0]
+            if self._running_per_session.get(job.session_id, 0) < self.max_per_session:
+                self._queue.remove(entry)
+                self._running_per_session[job.session_id] = self._running_per_session.get(job.session_id, 0) + 1
+                return entry
+        return None
+    
+    def _prune(self):
+        cutoff = time.time() - JOB_RETENTION_SECONDS
+        for job_id in [jid for jid, job in self._jobs.items() if job.done and (job.finished_at or 0) < cutoff]:
+            del self._jobs[job_id]
+    
+    def _worker(self):
+        while True:
+            with self._cond:
+                entry = self._next_runnable()
+                while entry is None:
+                    self._cond.wait()
+                    entry = self._next_runnable()
+            job, fn, args, kwargs = entry
+            try:
+                job.status = "running"
+                job.started_at = time.time()
+                job.update(message="Starting...")
+                job.check_cancelled()
+                with _tracer.trace(job.id, f"job.{job.kind}", label=job.label), job_context(job):
+                    job.result = fn(job, *args, **kwargs)
+                job.update(progress=1.0, message="Done")
+                job.status = "done"
+            except JobCancelled:
+                job.update(message="Cancelled")
+                job.status = "cancelled"
+            except Exception as e:
+                job.error = f"{e}\n{traceback.format_exc()}"
+                job.update(message=f"Failed: {e}")
+                job.status = "failed"
+            finally:
+                job.finished_at = time.time()
+                job._finished.set()
+                with self._cond:
+                    self._running_per_session[job.session_id] -= 1
+                    if self._running_per_session[job.session_id] <= 0:
+                        del self._running_per_session[job.session_id]
+                    self._cond.notify_all()
+
+@st.cache_resource
+def get_job_executor():
+    """Process-wide job executor shared by all sessions"""
+    return JobExecutor()
+
+_job_executor = get_job_executor()
+
+def get_session_id():
+    """Stable id for the current browser session"""
+    if 'session_id' not in st.session_state:
+        st.session_state.session_id = uuid.uuid4().hex
+    return st.session_state.session_id
+
+def translate_sentences(sentences, target_lang_code, source_language, job=None, progress_span=(0.0, 1.0)):
+    """Translate sentences, preferring one full-text request for context (like Google Translate does)
+    
+    Returns (translated_sentences, notes) where notes is a list of (level, message)
+    tuples for the UI to display.
+    """
+    notes = []
+    start, span = progress_span[0], progress_span[1] - progress_span[0]
+    full_text = " ".join(sentences)
+    
+    translated_full, error = translate_text(full_text, target_lang_code, source_language)
+    
+    # Verify translation result immediately
+    if translated_full == full_text or (translated_full.lower().strip() == full_text.lower().strip()):
+        notes.append(("error", f"❌ **Translation failed:** Output is identical to input! Original: '{full_text[:100]}'"))
+        if error:
+            notes.append(("error", f"Error message: {error}"))
+        notes.append(("warning", "⚠️ **Possible issues:** source and target language might be the same, "
+                                 "text might already be in the target language, or the translation API might be unavailable"))
+    
+    def translate_one_by_one(report_errors):
+        translated_sentences = []
+        translated_by_key = {}  # Repeated sentences are translated once
+        for i, sentence in enumerate(sentences):
+            if job is not None:
+                job.check_cancelled()
+            key = sentence_key(sentence)
+            if key in translated_by_key:
+                translated_sentences.append(translated_by_key[key])
+            elif sentence.strip():  # Only translate non-empty sentences
+                translated, err = translate_text(sentence, target_lang_code, source_language)
+                if report_errors and err and err != "":
+                    notes.append(("warning", f"⚠️ Sentence {i+1} translation: {err}"))
+                translated_by_key[key] = translated if translated else sentence
+                translated_sentences.append(translated_by_key[key])
+            else:
+                translated_sentences.append(sentence)
+            if job is not None:
+                job.update(progress=start + (i + 1) / len(sentences) * span)
+        return translated_sentences
+    
+    if error and error != "":
+        # If full translation failed, try sentence by sentence
+        notes.append(("warning", f"⚠️ Full text translation warning: {error}"))
+        if job is not None:
+            job.update(message="Translating sentence by sentence...")
+        return translate_one_by_one(report_errors=True), notes
+    
+    # Full text translation succeeded
+    # Split translated text back into sentences for individual processing
+    translated_sentences = split_into_sentences(translated_full)
+    
+    # If sentence count differs, translate individually to maintain structure
+    if len(translated_sentences) != len(sentences):
+        if job is not None:
+            job.update(message="Adjusting sentence boundaries...")
+        translated_sentences = translate_one_by_one(report_errors=False)
+    elif job is not None:
+        job.update(progress=start + span)
+    return translated_sentences, notes
+
+def run_translation_job(job, sentences, target_lang_code, source_language, progress_span=(0.0, 1.0)):
+    """Job: translate a list of sentences"""
+    job.update(message=f"Translating {len(sentences)} sentences to {target_lang_code}...")
+    translated_sentences, notes = translate_sentences(sentences, target_lang_code, source_language, job, progress_span)
+    return {'translated_sentences': translated_sentences, 'notes': notes}
+
+def run_analysis_job(job, sentences, classifier, enable_translation, source_language, target_lang_code, previous=None):
+    """Job: optional translation followed by per-sentence emotion detection
+    
+    previous is the session's last analysis with the same translation
+    settings: a list of items, or a reopened project's ProjectSentences,
+    which is read here a page at a time. Sentences found there unchanged
+    keep their translation and emotion, so re-analyzing an edited text only
+    processes the edits. Only the items of sentences still in the text are
+    kept while it is read.
+    """
+    wanted = {sentence_key(sentence) for sentence in sentences}
+    previous = {key: item for key, item in ((sentence_key(item['sentence']), item) for item in previous or ())
+                if key in wanted}
+    translated_sentences = None
+    notes = []
+    if enable_translation and TRANSLATOR_AVAILABLE:
+        translations = {key: item['translated_sentence'] for key, item in previous.items() if 'translated_sentence' in item}
+        pending = {}
+        for sentence in sentences:
+            key = sentence_key(sentence)
+            if key not in translations:
+                pending.setdefault(key, sentence)
+        if pending:
+            translation = run_translation_job(job, list(pending.values()), target_lang_code, source_language, progress_span=(0.0, 0.5))
+            translations.update(zip(pending, translation['translated_sentences']))
+            notes = translation['notes']
+        translated_sentences = [translations[sentence_key(sentence)] for sentence in sentences]
+    
+    # Analyze sentences in batches (use original text for emotion detection - works better)
+    # Only the first occurrence of a new sentence reaches the model; repeats
+    # (page furniture, refrains) and unchanged sentences reuse earlier results
+    emotions = []
+    known = {key: (item['emotion'], item['score'], item.get('probabilities')) for key, item in previous.items()}
+    duplicates = 0
+    reused = 0
+    progress_start = 0.5 if translated_sentences is not None else 0.0
+    for start in range(0, len(sentences), ANALYSIS_CHUNK_SIZE):
+        job.check_cancelled()
+        chunk = sentences[start:start + ANALYSIS_CHUNK_SIZE]
+        job.update(message=f"Analyzing sentences {start+1}-{start+len(chunk)} of {len(sentences)}...")
+        keys = [sentence_key(sentence) for sentence in chunk]
+        pending = {}
+        for sentence, key in zip(chunk, keys):
+            if key in previous:
+                reused += 1
+            elif key in known or key in pending:
+                duplicates += 1
+            else:
+                pending[key] = sentence
+        results, matrix = detect_emotion_matrix(list(pending.values()), classifier)
+        # Each sentence keeps its probability row, so smoothing can be redone without the model
+        rows = matrix.astype(np.float64).round(4).tolist() if matrix is not None else [None] * len(results)
+        known.update(zip(pending, [(emotion, score, row) for (emotion, score), row in zip(results, rows)]))
+        for i, (sentence, key) in enumerate(zip(chunk, keys), start):
+            emotion, score, probabilities = known[key]
+            emotion_data = {
+                'sentence': sentence,
+                'emotion': emotion,
+                'score': score
+            }
+            if probabilities is not None:
+                emotion_data['probabilities'] = probabilities
+            # Add translated sentence if available
+            if translated_sentences:
+                emotion_data['translated_sentence'] = translated_sentences[i]
+            emotions.append(emotion_data)
+            job.add_partial(emotion_data)
+        job.update(progress=progress_start + len(emotions) / len(sentences) * (1.0 - progress_start))
+    
+    current_span().set(duplicates=duplicates, reused=reused)
+    if duplicates:
+        notes.append(("info", f"♻️ {duplicates} repeated sentence(s) reused the result of their first occurrence"))
+    return {
+        'sentences': sentences,
+        'translated_sentences': translated_sentences,
+        'translated_text': " ".join(translated_sentences) if translated_sentences else None,
+        'emotions': emotions,
+        'notes': notes,
+        'enable_translation': translated_sentences is not None,
+        'source_language': source_language,
+        'target_lang_code': target_lang_code,
+        'reused': reused,
+    }
+
+def run_synthesis_job(job, mode, items, full_text, emotion, lang, slow, voice_gender, use_pyttsx3, prefer_gtts, reuse=None,
+                      audio_format=None):
+    """Job: generate the combined track or one clip per sentence
+    
+    reuse holds (audio_path, item) clips from an earlier per-sentence run
+    with the same voice settings; sentences whose text and emotion are
+    unchanged keep their clip instead of being synthesized again.
+    """
+    if mode == "combined":
+        job.update(progress=0.1, message="Generating emotional speech...")
+        if items and SENTENCE_PROSODY:
+            try:
+                audio_path, timestamps = render_combined_speech(
+                    items, lang=lang, slow=slow, voice_gender=voice_gender,
+                    use_pyttsx3=use_pyttsx3, prefer_gtts=prefer_gtts, job=job,
+                    progressive=PROGRESSIVE_PLAYBACK, audio_format=audio_format
                 )
-                # Resample back to original frame rate to maintain quality
-                audio = audio.set_frame_rate(original_frame_rate)
-        
-        # Apply volume adjustment
-        if params["volume"] != 1.0:
-            volume_change = 20 * np.log10(params["volume"])  # Convert to dB
-            audio = audio + volume_change
-        
-        # Apply pitch adjustment (simplified)
-        if params["pitch_shift"] != 1.0:
-            audio = adjust_audio_pitch(audio, params["pitch_shift"])
-        
-        # Normalize audio
-        if pydub['normalize'] is not None:
-            audio = pydub['normalize'](audio)
-        
-        # Save processed audio
-        output_path = tempfile.NamedTemporaryFile(delete=False, suffix='.mp3')
-        output_path.close()
-        audio.export(output_path.name, format="mp3")
-        
-        # Clean up original temp file
-        try:
-            os.unlink(audio_file)
-        except:
-            pass
-        
-        return output_path.name
-        
-    except Exception as e:
-        st.error(f"Error generating speech: {e}")
+            except JobCancelled:
+                raise
+            except Exception as e:
+                warnings.warn(f"Per-sentence rendering failed, using one emotion for the whole text: {e}")
+                audio_path = None
+            if audio_path:
+                return {'mode': mode, 'audio_path': audio_path, 'timestamps': timestamps,
+                        'segments': list(job.snapshot()['partial_results'])}
+        # Single clip with the dominant emotion (no FFmpeg, or per-sentence rendering is off)
+        audio_path = generate_emotional_speech(
+            full_text,
+            emotion,
+            lang=lang,
+            slow=slow,
+            voice_gender=voice_gender,
+            use_pyttsx3=use_pyttsx3,
+            prefer_gtts=prefer_gtts,
+            audio_format=audio_format
+        )
+        if not audio_path:
+            job.warn("Speech generation failed. Check the FFmpeg/TTS status in the sidebar and try again.")
+        return {'mode': mode, 'audio_path': audio_path}
+    
+    clips = []
+    synthesized = {}  # (sentence key, emotion) -> audio file, so repeats share one clip
+    durations = {}  # audio file -> duration in ms, when known
+    for audio_path, item in reuse or []:
+        if audio_path and os.path.exists(audio_path):
+            synthesized[(sentence_key(item['text_to_speak']), item['emotion'])] = audio_path
+            durations[audio_path] = item.get('duration_ms')
+    reused = 0
+    for i, item in enumerate(items):
+        job.check_cancelled()
+        job.update(message=f"Generating speech for sentence {i+1}/{len(items)}...")
+        key = (sentence_key(item['text_to_speak']), item['emotion'])
+        if key in synthesized:
+            reused += 1
+        else:
+            timing = {}
+            synthesized[key] = generate_emotional_speech(
+                item['text_to_speak'],
+                item['emotion'],
+                lang=lang,
+                slow=slow,
+                voice_gender=voice_gender,
+                use_pyttsx3=use_pyttsx3,
+                prefer_gtts=prefer_gtts,
+                audio_format=audio_format,
+                timing=timing
+            )
+            durations[synthesized[key]] = timing.get('duration_ms')
+        audio_path = synthesized[key]
+        if audio_path:
+            clip = (audio_path, {**item, 'duration_ms': durations.get(audio_path)})
+            clips.append(clip)
+            job.add_partial(clip)
+        else:
+            job.warn(f"Speech generation failed for sentence {i+1}.")
+        job.update(progress=(i + 1) / len(items))
+    current_span().set(reused=reused)
+    return {'mode': mode, 'clips': clips, 'reused': reused}
+
+def run_report_job(job, emotions_data, title="Emotion Analysis Report"):
+    """Job: build the PDF report"""
+    job.update(progress=0.1, message=f"Building PDF report for {len(emotions_data)} sentences...")
+    pdf_bytes = generate_pdf_report(emotions_data, title)
+    if not pdf_bytes:
+        raise RuntimeError("PDF report generation failed")
+    timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
+    return {'pdf_bytes': pdf_bytes, 'filename': f"emotion_analysis_report_{timestamp}.pdf"}
+
+def run_audiobook_job(job, chapters, classifier, speech, book_dir):
+    """Job: render chapters in parallel into book_dir and join them into one audiobook
+    
+    Chapters already checkpointed in book_dir by an earlier run are kept.
+    """
+    os.makedirs(book_dir, exist_ok=True)
+    total = len(chapters)
+    finished = {}
+    for number in range(total):
+        meta = load_chapter_checkpoint(book_dir, number)
+        if meta is not None:
+            finished[number] = meta
+    restored = len(finished)
+    current_span().set(chapters=total, restored=restored)
+    job.update(progress=restored / (total + 1),
+               message=f"Restored {restored} of {total} chapters, rendering the rest..." if restored
+               else f"Rendering {total} chapters...")
+    
+    def render(number):
+        job.check_cancelled()
+        chapter = chapters[number]
+        with job_context(job), trace_span("audiobook.chapter", sentences=len(chapter['sentences'])):
+            audio_path, timestamps = render_audiobook_chapter(chapter, classifier, speech)
+        if not audio_path:
+            raise RuntimeError(f"Speech generation failed for chapter {number + 1} ({chapter['title']})")
+        return checkpoint_chapter(book_dir, number, chapter, audio_path, timestamps)
+    
+    pool = ThreadPoolExecutor(max_workers=max(1, AUDIOBOOK_PARALLEL), thread_name_prefix="eatts-chapter")
+    futures = {pool.submit(render, number): number for number in range(total) if number not in finished}
+    try:
+        for future in as_completed(futures):
+            number = futures[future]
+            finished[number] = future.result()
+            job.add_partial({'chapter': number, 'title': chapters[number]['title']})
+            job.update(progress=len(finished) / (total + 1),
+                       message=f"Finished chapter {number + 1} of {total}: {chapters[number]['title']}")
+    finally:
+        # After a failure or cancel, chapters already being rendered still
+        # finish and are checkpointed for the next run
+        for future in futures:
+            future.cancel()
+        pool.shutdown(wait=True)
+    
+    job.check_cancelled()
+    job.update(progress=total / (total + 1), message="Joining the chapters...")
+    ordered = [finished[number] for number in range(total)]
+    audio_path, markers = assemble_audiobook(book_dir, ordered)
+    # Book-wide sentence timings, when every chapter has them
+    timestamps = None
+    if all(chapter.get('timestamps') for chapter in ordered):
+        timestamps = [
+            {**stamp, 'start_ms': stamp['start_ms'] + marker['start_ms'], 'end_ms': stamp['end_ms'] + marker['start_ms']}
+            for chapter, marker in zip(ordered, markers) for stamp in chapter['timestamps']
+        ]
+        for index, stamp in enumerate(timestamps):
+            stamp['index'] = index
+    return {'audio_path': audio_path, 'chapters': markers, 'timestamps': timestamps,
+            'restored': restored, 'book_dir': book_dir}
+
+def combined_report(documents, title=None):
+    """PDF bytes of one report across (name, items) documents"""
+    return generate_pdf_report(
+        [{**item, 'document': name} for name, items in documents for item in items],
+        title=title or f"Emotion Analysis Report: {len(documents)} Documents",
+        documents=documents,
+    )
+
+def run_batch_job(job, files, classifier, strip_furniture=False, speech=None):
+    """Job: process uploaded (name, bytes) files on the shared batch pool, then build one report across them
+    
+    A file that fails is reported and skipped; the others carry on.
+    """
+    for index, (name, _) in enumerate(files):
+        job.set_item(index, name=name, status="Waiting", progress=0.0)
+    job.update(progress=0.0, message=f"Processing {len(files)} documents...")
+    futures = {
+        _batch_pool.submit(process_batch_file, job, index, name, data, classifier, strip_furniture, speech): index
+        for index, (name, data) in enumerate(files)
+    }
+    results = [None] * len(files)
+    finished = 0
+    try:
+        for future in as_completed(futures):
+            index = futures[future]
+            finished += 1
+            try:
+                results[index] = future.result()
+            except JobCancelled:
+                raise
+            except Exception as e:
+                job.set_item(index, status="Failed", error=str(e))
+                job.warn(f"{files[index][0]}: {e}")
+            job.update(progress=finished / (len(files) + 1), message=f"Finished {finished} of {len(files)} documents")
+    finally:
+        # Files of a cancelled or failed batch that haven't started give their place back
+        for future in futures:
+            future.cancel()
+    
+    job.check_cancelled()
+    documents = [result for result in results if result is not None]
+    report = None
+    if documents and REPORTLAB_AVAILABLE:
+        job.update(progress=len(files) / (len(files) + 1), message="Building the combined report...")
+        pdf_bytes = combined_report([(document['name'], document['emotions']) for document in documents])
+        if pdf_bytes:
+            report = {'pdf_bytes': pdf_bytes, 'filename': f"batch_report_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf"}
+    return {'documents': documents, 'failed': len(files) - len(documents), 'report': report}
+
+def submit_job(kind, fn, *args, label="", **kwargs):
+    """Submit a job for the current session, showing a warning when the session cap is hit"""
+    try:
+        return get_job_executor().submit(kind, get_session_id(), fn, *args, label=label, **kwargs)
+    except JobLimitError as e:
+        st.warning(f"⏳ {e}")
         return None
 
+def render_job_status(job, show_partial_count=True):
+    """Show progress, warnings and a cancel button for a job; returns its snapshot"""
+    snap = job.snapshot()
+    if snap['status'] in ("queued", "running"):
+        st.progress(snap['progress'], text=f"{snap['label']}: {snap['message']}")
+        if show_partial_count and snap['partial_results']:
+            st.caption(f"{len(snap['partial_results'])} results ready so far")
+        if st.button("✖️ Cancel", key=f"cancel_job_{snap['id']}"):
+            get_job_executor().cancel(snap['id'])
+            st.rerun()
+    elif snap['status'] == "cancelled":
+        st.info(f"⏹️ {snap['label']} cancelled.")
+    elif snap['status'] == "failed":
+        st.error(f"❌ {snap['label']} failed: {snap['message']}")
+        with st.expander("Error details"):
+            st.code(snap['error'] or "")
+    for warning in snap['warnings']:
+        st.warning(warning)
+    return snap
+
+# Plays the progressive segments back to back: when one ends the next one
+# starts, or starts as soon as it appears if it is still rendering. Segment
+# players sit between two marker spans; each script instance tags the
+# players it has hooked, so a remounted iframe hooks them again.
+PLAYLIST_CHAIN_SCRIPT = """
+<script>
+const doc = window.parent.document;
+const token = Math.random().toString(36).slice(2);
+let waitingFor = null;
+function segmentPlayers() {
+    const start = doc.querySelector('.eatts-segments-start');
+    const end = doc.querySelector('.eatts-segments-end');
+    if (!start || !end) return [];
+    return Array.from(doc.querySelectorAll('audio')).filter((player) =>
+        (start.compareDocumentPosition(player) & Node.DOCUMENT_POSITION_FOLLOWING) &&
+        (player.compareDocumentPosition(end) & Node.DOCUMENT_POSITION_FOLLOWING));
+}
+function tick() {
+    const players = segmentPlayers();
+    players.forEach((player) => {
+        if (player.dataset.eattsChained === token) return;
+        player.dataset.eattsChained = token;
+        player.addEventListener('ended', () => {
+            const current = segmentPlayers();
+            const next = current.indexOf(player) + 1;
+            if (next < current.length) current[next].play();
+            else waitingFor = next;
+        });
+    });
+    if (waitingFor !== null && waitingFor < players.length) {
+        players[waitingFor].play();
+        waitingFor = null;
+    }
+}
+setInterval(tick, 300);
+</script>
+"""
+
+def render_progressive_segments(segments, rendering):
+    """Preview players for the combined track's segments, chained to play in order"""
+    sentences = segments[-1]['last']
+    if rendering:
+        status = f"▶️ First {sentences} sentences ready; playback continues into each part as it finishes rendering"
+    else:
+        status = "▶️ Parts as they were rendered; the full track and its download are below"
+    st.markdown(f'<span class="eatts-segments-start"></span>{status}', unsafe_allow_html=True)
+    for idx, segment in enumerate(segments):
+        if os.path.exists(segment['audio_path']):
+            st.audio(segment['audio_path'], format=audio_mime(segment['audio_path']), autoplay=(idx == 0))
+    st.markdown('<span class="eatts-segments-end"></span>', unsafe_allow_html=True)
+    if hasattr(st, "iframe"):
+        st.iframe(PLAYLIST_CHAIN_SCRIPT, height=1)
+    else:  # Streamlit before st.iframe
+        components.html(PLAYLIST_CHAIN_SCRIPT, height=0)
+
+def lazy_download_button(label, build, file_name, mime, key, prepare=True):
+    """Download button whose data is only produced by `build()` when clicked
+    
+    Streamlit versions that don't accept a callable get a button that
+    builds the file on a first click (`prepare`) or build it right away.
+    """
+    try:
+        return st.download_button(label, data=build, file_name=file_name, mime=mime, key=key)
+    except (StreamlitAPIException, RuntimeError):
+        pass
+    if not prepare:
+        return st.download_button(label, data=build(), file_name=file_name, mime=mime, key=key)
+    prepared_key = f"{key}_prepared"
+    if prepared_key not in st.session_state:
+        if st.button(label, key=f"{key}_prepare"):
+            with st.spinner("Preparing download..."):
+                st.session_state[prepared_key] = build()
+            st.rerun()
+        return False
+    return st.download_button(label, data=st.session_state[prepared_key], file_name=file_name, mime=mime, key=key)
+
+def analysis_result_row(item):
+    """Results table / CSV row of one analysis item"""
+    params = EMOTION_PARAMS.get(item['emotion'], EMOTION_PARAMS["neutral"])
+    # Show translated text if available, otherwise show original
+    display_text = item.get('translated_sentence', item['sentence'])
+    return {
+        "Text": display_text[:100] + "..." if len(display_text) > 100 else display_text,
+        "Emotion": item['emotion'].title(),
+        "Confidence": f"{item['score']:.2%}",
+        "Pitch": f"{params['pitch_shift']*100:.0f}%",
+        "Speed": f"{params['speed']:.2f}x",
+        "Tone": params['tone']
+    }
+
+def analysis_results_csv(items):
+    """CSV of every analysis item; built when the download is clicked"""
+    import pandas as pd
+    return pd.DataFrame([analysis_result_row(item) for item in items]).to_csv(index=False)
+
+def render_timing_downloads(timestamps, key, file_stem="emotion_aware_speech"):
+    """SRT, WebVTT and JSON timing downloads for a list of sentence timestamps"""
+    exports = (
+        ("📝 Subtitles (SRT)", timestamps_to_srt, "srt", "application/x-subrip"),
+        ("📝 Captions (WebVTT)", timestamps_to_vtt, "vtt", "text/vtt"),
+        ("🕒 Timing map (JSON)", timestamps_to_json, "json", "application/json"),
+    )
+    for column, (label, build, extension, mime) in zip(st.columns(len(exports)), exports):
+        with column:
+            lazy_download_button(label, functools.partial(build, timestamps), f"{file_stem}.{extension}",
+                                 mime, key=f"{key}_{extension}", prepare=False)
+
+def _owner_signature(owner):
+    return hmac.new(_project_store.signing_key(), owner.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+def project_owner():
+    """Owner id of this session's projects
+    
+    A user signed in through Streamlit authentication owns their projects
+    in every browser. Otherwise the id comes from this browser's signed
+    owner cookie; a browser without a valid one gets a new id (see
+    owner_cookie_script()) and starts with no projects. Without cookie
+    support (Streamlit before st.context.cookies) projects last as long as
+    the session.
+    """
+    user = getattr(st, "user", None)
+    # is_logged_in is only there when an [auth] section is configured
+    if user is not None and user.get("is_logged_in"):
+        identity = f"{user.get('iss') or ''}:{user.get('sub') or user.get('email')}"
+        return "user-" + hashlib.sha256(identity.encode("utf-8")).hexdigest()[:32]
+    owner = st.session_state.get('project_owner')
+    if owner:
+        return owner
+    try:
+        cookie = st.context.cookies.get(PROJECT_OWNER_COOKIE) or ""
+    except AttributeError:
+        cookie = ""
+    if not isinstance(cookie, str):
+        cookie = ""  # AppTest sessions (load_test.py) have no request; their cookies are mocks
+    owner, _, signature = cookie.partition(".")
+    if not (re.fullmatch(r"[0-9a-f]{32}", owner) and hmac.compare_digest(signature, _owner_signature(owner))):
+        owner = uuid.uuid4().hex
+        st.session_state.project_owner_cookie = f"{owner}.{_owner_signature(owner)}"
+    st.session_state.project_owner = owner
+    return owner
+
+def owner_cookie_script(value):
+    """Sets the owner cookie on the app's page (component iframes share its origin)"""
+    return f"""<script>
+    window.parent.document.cookie = "{PROJECT_OWNER_COOKIE}={value}; path=/; max-age={PROJECT_OWNER_COOKIE_DAYS * 86400}; SameSite=Strict"
+        + (window.parent.location.protocol === "https:" ? "; Secure" : "");
+    </script>"""
+
+def autosave_project(save, title=None):
+    """Run `save(store, project_id)` for the session's project, creating it if `title` is given
+    
+    Saving is best effort: a full disk or locked database is logged and
+    the session carries on with its results in memory.
+    """
+    if _project_store is None:
+        return
+    try:
+        if not st.session_state.get('project_id'):
+            if title is None:
+                return
+            st.session_state.project_id = _project_store.create(title, project_owner())
+        save(_project_store, st.session_state.project_id)
+    except (sqlite3.Error, OSError) as e:
+        warnings.warn(f"Project could not be saved: {e}")
+
+# Session state that belongs to the open project's results
+PROJECT_SESSION_KEYS = (
+    'project_id', 'sentences', 'translated_sentences', 'translated_text', 'raw_emotions', 'emotions',
+    'analysis_settings', 'analysis_model', 'analysis_reused', 'analysis_applied', 'analysis_job_id',
+    'audio_result', 'audio_result_job', 'audio_settings', 'synthesis_job_id', 'synthesis_notes',
+    'pdf_report', 'report_job_id', 'report_requested_for',
+)
+
+def open_project(store, project_id, owner):
+    """Load one of `owner`'s saved projects into the session without re-running any analysis, translation or speech"""
+    project = store.project(project_id, owner)
+    if project is None:
+        st.warning("That project no longer exists or belongs to another user or browser.")
+        return
+    for key in PROJECT_SESSION_KEYS:
+        st.session_state.pop(key, None)
+    settings = project['settings']
+    # Sentence rows stay in the store; views and jobs read the pages they use
+    items = ProjectSentences.load(store, project)
+    smoothing = st.session_state.get('emotion_smoothing', (SMOOTHING_WINDOW, HYSTERESIS_MARGIN))
+    st.session_state.project_id = project_id
+    st.session_state.translated_sentences = items.column('translated_sentence') if items.translated else None
+    st.session_state.raw_emotions = items
+    st.session_state.emotions = apply_emotion_smoothing(items, *smoothing)
+    st.session_state.analysis_settings = tuple(settings.get('analysis') or ()) or None
+    st.session_state.analysis_model = settings.get('model')
+    st.session_state.analysis_reused = 0
+    st.session_state.analysis_applied = f"project:{project_id}"
+    # The text box shows the saved document (set before the widget is drawn)
+    st.session_state.input_method = "Paste Text"
+    st.session_state.project_text = store.document(project_id)
+    
+    audio_result, voice_settings = load_project_audio(store, project_id)
+    if audio_result is not None:
+        st.session_state.audio_result = audio_result
+        st.session_state.audio_result_job = f"project:{project_id}"
+        st.session_state.audio_settings = voice_settings
+    report = store.artifact(project_id, "report")
+    if report is not None and tuple(report.get('smoothing') or smoothing) == tuple(smoothing):
+        report_for = (st.session_state.analysis_applied, st.session_state.get('emotion_smoothing'))
+        st.session_state.pdf_report = {'for': report_for, 'filename': report['filename'],
+                                       'pdf_path': store.blob_path(report['blob'])}
+        st.session_state.report_requested_for = report_for
+
+def render_projects():
+    """Sidebar list of recently saved projects with open and new-project buttons"""
+    try:
+        owner = project_owner()
+        recent = _project_store.recent(owner, RECENT_PROJECTS)
+    except (sqlite3.Error, OSError) as e:
+        st.caption(f"Project store unavailable: {e}")
+        return
+    if st.session_state.get('project_owner_cookie'):
+        # Drawn on every run of the session, so a rerun can't drop it before the browser runs it
+        components.html(owner_cookie_script(st.session_state.project_owner_cookie), height=0)
+    current = st.session_state.get('project_id')
+    titles = {project['id']: project['title'] for project in recent}
+    if current:
+        st.caption(f"Saving to: {titles.get(current, current)}")
+    else:
+        st.caption("Your next analysis starts a new project.")
+    if recent:
+        chosen = st.selectbox(
+            "Recent projects",
+            [project['id'] for project in recent],
+            format_func=lambda project_id: next(
+                f"{project['title']} ({project['sentence_count']} sentences, "
+                f"{datetime.fromtimestamp(project['updated']).strftime('%Y-%m-%d %H:%M')})"
+                for project in recent if project['id'] == project_id
+            ),
+            key="project_select"
+        )
+        if st.button("📂 Open", key="open_project", disabled=chosen == current):
+            open_project(_project_store, chosen, owner)
+    if current and st.button("➕ New Project", key="new_project"):
+        for key in PROJECT_SESSION_KEYS:
+            st.session_state.pop(key, None)
+
+def render_stage_timings(limit=5):
+    """Per-stage timing breakdown of this session's recent jobs, with trace and metrics downloads"""
+    if not _tracer.enabled:
+        st.caption("Tracing is disabled (EATTS_TRACING=0).")
+        return
+    jobs = sorted((job for job in _job_executor.session_jobs(get_session_id()) if job.done),
+                  key=lambda job: job.finished_at or 0, reverse=True)[:limit]
+    traces = [trace for trace in (_tracer.get_trace(job.id) for job in jobs) if trace]
+    if not traces:
+        st.caption("Timings appear here once a job finishes.")
+    for trace in traces:
+        st.markdown(f"**{trace['attributes'].get('label') or trace['name']}** - {trace['duration_ms']:.0f} ms")
+        rows = [f"| {name} | {calls} | {ms:.0f} | {share:.0%} |" for name, calls, ms, share in Tracer.breakdown(trace)]
+        if rows:
+            st.markdown("| Stage | Calls | ms | Share |\n|-------|-------|----|-------|\n" + "\n".join(rows))
+    st.download_button(
+        "⬇️ Traces (JSON)",
+        data=_tracer.export_json([trace['trace_id'] for trace in traces]),
+        file_name="eatts_traces.json",
+        mime="application/json",
+        key="download_traces",
+        disabled=not traces,
+    )
+    st.download_button(
+        "⬇️ Metrics (Prometheus)",
+        data=_tracer.prometheus_text(),
+        file_name="eatts_metrics.txt",
+        mime="text/plain",
+        key="download_metrics",
+    )
+
 def main():
     # Title and header
     st.title("🎙️ Emotion-Aware Text-to-Speech Tutor (EA-TTS)")
@@ -983,6 +4171,50 @@ def main():
     with st.sidebar:
         st.header("⚙️ Settings")
         
+        # Model readiness (the model warms up in the background)
+        warmup = start_model_warmup()
+        if warmup.state == "ready":
+            st.success("🟢 Emotion model ready")
+        elif warmup.state == "loading":
+            st.info("🟡 Emotion model warming up in the background...")
+        elif warmup.state == "failed":
+            st.warning(f"🔴 Emotion model failed to load: {warmup.error}")
+        else:
+            st.info("⚪ Emotion model loads on first analysis")
+        
+        with st.expander("⏱️ Startup Timings"):
+            import_report = get_import_report()
+            budget_icon = "✅" if import_report['within_budget'] else "⚠️"
+            st.write(f"{budget_icon} App startup: {import_report['startup_ms']:.0f} ms (budget {import_report['budget_ms']:.0f} ms)")
+            if warmup.seconds is not None:
+                st.write(f"Model warm-up: {warmup.seconds:.1f} s")
+            weights = warmup.weights or {}
+            if weights.get('verified'):
+                sharing = weights.get('sharing_processes')
+                shared_with = f", mapped by ~{sharing:g} processes" if sharing and sharing >= 1.5 else ""
+                st.write(f"✅ Model weights memory-mapped and shared{shared_with}")
+            elif weights.get('verified') is False:
+                st.write("⚠️ Model weights mapped but not shared (see /readyz)")
+            elif weights:
+                st.caption(f"Model weights: private copy ({weights.get('reason', 'shared weights off')})")
+            for module_name, ms in import_report['deferred_ms'].items():
+                st.caption(f"{module_name}: {ms:.0f} ms (loaded on first use)")
+        
+        if _project_store is not None:
+            with st.expander("📁 Projects"):
+                render_projects()
+        
+        with st.expander("🔬 Stage Timings"):
+            render_stage_timings()
+            cascade = emotion_cascade(st.session_state.get('emotion_model'))
+            cascade = cascade.stats() if CASCADE_ENABLED and cascade is not None else None
+            if cascade and cascade['sentences']:
+                audit = cascade['audit_agreement']
+                st.caption(
+                    f"Emotion cascade: {cascade['escalation_rate']:.0%} of {cascade['sentences']} sentences sent to the model"
+                    + (f", {audit:.0%} agreement on audited sentences" if audit is not None else "")
+                )
+        
         # Show ffmpeg status in sidebar
         if ffmpeg_available:
             st.success("✅ FFmpeg installed - Full features")
@@ -1135,6 +4367,25 @@ def main():
             index=0
         )
         
+        # Output format; without FFmpeg files stay in the TTS engine's own format
+        output_format = None
+        if ffmpeg_available:
+            audio_formats = _capability_registry.detect()['audio_formats']
+            try:
+                user_agent = st.context.headers.get("User-Agent", "")
+            except AttributeError:  # Streamlit before st.context
+                user_agent = ""
+            output_format = st.selectbox(
+                "Audio Format",
+                audio_formats,
+                index=audio_formats.index(negotiate_audio_format(audio_formats, user_agent)),
+                format_func=lambda x: AUDIO_FORMATS[x]['label'],
+                help="Opus files are several times smaller than MP3 at the same speech quality",
+                key="audio_format_select"
+            )
+            if not client_plays(output_format, user_agent):
+                st.caption("⚠️ This browser may not play Opus; downloads still work.")
+        
         # Voice selection
         st.markdown("---")
         st.markdown("### 🎤 Voice Settings")
@@ -1168,6 +4419,27 @@ def main():
         
         st.markdown("---")
         st.markdown("### 🎭 Emotion Mapping")
+        
+        # Model choice, when the deployment offers more than one
+        model_choices = emotion_model_choices()
+        if st.session_state.get('emotion_model') not in model_choices:
+            st.session_state.emotion_model = model_choices[0]
+        if len(model_choices) > 1:
+            model_profiles = _lazy_import("model_weights").load_profiles()
+            emotion_model = st.selectbox(
+                "Emotion Model",
+                model_choices,
+                index=model_choices.index(st.session_state.emotion_model),
+                format_func=lambda key: describe_emotion_model(key, model_profiles),
+                help="Profiles come from `python model_weights.py --profile` on this server",
+                key="emotion_model_select"
+            )
+            st.session_state.emotion_model = emotion_model
+            st.caption(resolve_emotion_model(emotion_model)[1]['description'])
+            multilingual = [key for key in model_choices if resolve_emotion_model(key)[1]['languages'] == "multi"]
+            if (multilingual and emotion_model not in multilingual and enable_translation
+                    and source_language not in ("auto", "en")):
+                st.caption(f"💡 The {multilingual[0]} model reads the original language directly.")
         st.markdown("""
         | Emotion | Pitch | Speed | Tone |
         |---------|-------|-------|------|
@@ -1187,7 +4459,8 @@ def main():
         input_method = st.radio(
             "Input Method",
             ["Paste Text", "Upload File"],
-            horizontal=True
+            horizontal=True,
+            key="input_method"
         )
         
         text_input = ""
@@ -1196,6 +4469,7 @@ def main():
             text_input = st.text_area(
                 "Enter your educational text here:",
                 height=300,
+                key="project_text",
                 placeholder="Type or paste your text here...\n\nExample: The discovery of gravity was a momentous occasion in scientific history. Scientists were thrilled! However, the initial reactions were mixed with surprise and curiosity."
             )
         else:
@@ -1218,10 +4492,26 @@ def main():
                 type=file_types,
                 help=f"Supported formats: {', '.join(file_types).upper()}"
             )
+            strip_furniture = st.checkbox(
+                "Remove repeated headers, footers and page numbers (PDF)",
+                value=STRIP_PDF_FURNITURE,
+                key="strip_pdf_furniture",
+                help="Drops lines that repeat at the top or bottom of most pages, so they aren't analyzed and spoken on every page"
+            )
             if uploaded_file is not None:
-                with st.spinner(f"Extracting text from {uploaded_file.name}..."):
-                    text_input = extract_text_from_file(uploaded_file)
-                    
+                # Extract once per upload; job-status reruns must not re-parse the document
+                upload_key = getattr(uploaded_file, 'file_id', None) or f"{uploaded_file.name}:{uploaded_file.size}"
+                upload_key = f"{upload_key}:{int(strip_furniture)}"
+                cache_hit = st.session_state.get('extracted_upload_key') == upload_key
+                with trace_span("extract.upload", bytes=uploaded_file.size, cache_hit=cache_hit):
+                    if not cache_hit:
+                        with st.spinner(f"Extracting text from {uploaded_file.name}..."):
+                            st.session_state.extracted_text = extract_text_from_file(uploaded_file, strip_furniture)
+                            st.session_state.extracted_outline = extract_document_outline(uploaded_file)
+                            st.session_state.extracted_name = uploaded_file.name
+                            st.session_state.extracted_upload_key = upload_key
+                text_input = st.session_state.extracted_text
+                
                 if text_input:
                     st.success(f"✅ Successfully extracted text from {uploaded_file.name}")
                     # Show preview of extracted text
@@ -1242,18 +4532,22 @@ def main():
     
     with col2:
         st.subheader("🎭 Emotion Analysis")
+        executor = get_job_executor()
         
         if st.button("🔍 Analyze Emotions", type="primary", use_container_width=True):
             # Load emotion model on demand to avoid slow startups
             with st.spinner("Loading emotion detection model..."):
                 try:
-                    classifier = load_emotion_model()
+                    classifier = get_inference_server(st.session_state.emotion_model)
                 except Exception as e:
                     classifier = None
                     st.error(f"Failed to load emotion model: {e}")
             if classifier is None:
                 st.error("Emotion model is unavailable right now. Please check your internet connection and try again.")
                 st.stop()
+            classifier = with_cascade(classifier, st.session_state.emotion_model)
+            if warmup.state == "idle":
+                warmup.state = "ready"  # Warm-up disabled; the model is loaded now
             if not text_input or len(text_input.strip()) == 0:
                 st.warning("Please enter some text first!")
             else:
@@ -1268,184 +4562,135 @@ def main():
                 if len(sentences) == 0:
                     st.warning("No sentences found in the text.")
                 else:
-                    # Translate text if translation is enabled
-                    translated_sentences = []
-                    if enable_translation and TRANSLATOR_AVAILABLE:
-                        progress_bar = st.progress(0)
-                        status_text = st.empty()
-                        status_text.text(f"Translating from {language_options.get(source_language if source_language != 'auto' else 'auto', 'Auto-detect')} to {language_options.get(target_lang_code, target_lang_code)}...")
-                        
-                        # Translate entire text first for better context (like Google Translate does)
-                        # This ensures proper context and accurate translation
-                        full_text = " ".join(sentences)
-                        
-                        # Show what's being translated
-                        with st.expander("🔍 Translation Details", expanded=False):
-                            st.write(f"**Original text:** {full_text[:200]}...")
-                            st.write(f"**Source:** {language_options.get(source_language if source_language != 'auto' else 'en', 'Auto-detect')}")
-                            st.write(f"**Target:** {language_options.get(target_lang_code, target_lang_code)}")
-                        
-                        translated_full, error = translate_text(full_text, target_lang_code, source_language)
-                        
-                        # Verify translation result immediately
-                        if translated_full == full_text or (translated_full.lower().strip() == full_text.lower().strip()):
-                            st.error(f"❌ **Translation failed:** Output is identical to input!")
-                            st.error(f"Original: '{full_text[:100]}'")
-                            st.error(f"Translated: '{translated_full[:100]}'")
-                            if error:
-                                st.error(f"Error message: {error}")
-                            st.warning("⚠️ **Possible issues:**")
-                            st.warning("1. Source and target language might be the same")
-                            st.warning("2. Text might already be in the target language")
-                            st.warning("3. Translation API might be unavailable")
-                        
-                        if error and error != "":
-                            # If full translation failed, try sentence by sentence
-                            st.warning(f"⚠️ Full text translation warning: {error}")
-                            status_text.text("Translating sentence by sentence...")
-                            translated_sentences = []
-                            for i, sentence in enumerate(sentences):
-                                if sentence.strip():  # Only translate non-empty sentences
-                                    translated, err = translate_text(sentence, target_lang_code, source_language)
-                                    if err and err != "":
-                                        st.warning(f"⚠️ Sentence {i+1} translation: {err}")
-                                    translated_sentences.append(translated if translated else sentence)
-                                else:
-                                    translated_sentences.append(sentence)
-                                progress_bar.progress((i + 1) / len(sentences) * 0.5)
-                        else:
-                            # Full text translation succeeded
-                            # Split translated text back into sentences for individual processing
-                            translated_sentences = split_into_sentences(translated_full)
-                            
-                            # Ensure we have same number of sentences
-                            # If sentence count differs, translate individually to maintain structure
-                            if len(translated_sentences) != len(sentences):
-                                status_text.text("Adjusting sentence boundaries...")
-                                # Translate each sentence individually but with context
-                                translated_sentences = []
-                                for i, sentence in enumerate(sentences):
-                                    if sentence.strip():
-                                        translated, err = translate_text(sentence, target_lang_code, source_language)
-                                        translated_sentences.append(translated if translated else sentence)
-                                    else:
-                                        translated_sentences.append(sentence)
-                                    progress_bar.progress((i + 1) / len(sentences) * 0.5)
-                            else:
-                                progress_bar.progress(0.5)
-                        
-                        # Store translated text in session state
-                        st.session_state.translated_text = " ".join(translated_sentences)
-                        st.session_state.source_lang_used = source_language
-                        st.session_state.target_lang_used = target_lang_code
-                        
-                        # Show translation preview with verification
-                        if translated_sentences and len(translated_sentences) > 0:
-                            preview_text = " ".join(translated_sentences[:3])  # First 3 sentences
-                            if len(translated_sentences) > 3:
-                                preview_text += "..."
-                            
-                            # Verify translation is different
-                            original_preview = " ".join(sentences[:3])
-                            if original_preview.lower().strip() != preview_text.lower().strip():
-                                st.success(f"✅ Translation successful to {language_options.get(target_lang_code, target_lang_code)}!")
-                                st.info(f"📝 Translated text preview: {preview_text[:200]}...")
-                            else:
-                                st.warning(f"⚠️ Translation appears unchanged. Original: '{original_preview[:50]}' → Translated: '{preview_text[:50]}'")
-                                st.error("Translation may not have worked. Please check your language settings.")
-                    else:
-                        translated_sentences = sentences
-                        st.session_state.translated_text = None
+                    # A new analysis replaces one that is still running for this session
+                    previous_job = executor.get(st.session_state.get('analysis_job_id'))
+                    if previous_job is not None and not previous_job.done:
+                        executor.cancel(previous_job.id)
                     
-                    # Store results in session state
-                    st.session_state.sentences = sentences
-                    st.session_state.translated_sentences = translated_sentences if enable_translation else None
-                    st.session_state.emotions = []
+                    # Unchanged sentences keep the last analysis' results if it used the same settings
+                    analysis_settings = (enable_translation and TRANSLATOR_AVAILABLE, source_language, target_lang_code)
+                    previous = None
+                    if (st.session_state.get('analysis_settings') == analysis_settings
+                            and st.session_state.get('analysis_model') == st.session_state.emotion_model):
+                        # Passed as is: the job pages through a reopened project's rows itself
+                        previous = st.session_state.get('raw_emotions') or st.session_state.get('emotions')
                     
-                    # Analyze each sentence (use original text for emotion detection - works better)
-                    if enable_translation:
-                        status_text.text("Analyzing emotions in original text...")
+                    job = submit_job(
+                        "analysis",
+                        run_analysis_job,
+                        sentences,
+                        classifier,
+                        *analysis_settings,
+                        previous=previous,
+                        label="Emotion analysis"
+                    )
+                    if job is not None:
+                        st.session_state.analysis_job_id = job.id
+                        st.session_state.analysis_job_model = st.session_state.emotion_model
+        
+        analysis_job = executor.get(st.session_state.get('analysis_job_id'))
+        if analysis_job is not None:
+            analysis_snap = render_job_status(analysis_job)
+            if analysis_snap['status'] in ("queued", "running") and analysis_snap['partial_results']:
+                # Show the sentences analyzed so far
+                st.dataframe(
+                    [{"Text": item['sentence'][:80], "Emotion": item['emotion'].title(), "Confidence": f"{item['score']:.2%}"}
+                     for item in analysis_snap['partial_results'][-10:]],
+                    use_container_width=True,
+                    hide_index=True
+                )
+            elif analysis_snap['status'] == "done" and st.session_state.get('analysis_applied') != analysis_job.id:
+                result = analysis_job.result
+                enable_translation = result['enable_translation']
+                source_language = result['source_language']
+                target_lang_code = result['target_lang_code']
+                sentences = result['sentences']
+                translated_sentences = result['translated_sentences'] or sentences
+                
+                # Store results in session state
+                st.session_state.sentences = sentences
+                st.session_state.translated_sentences = result['translated_sentences']
+                st.session_state.translated_text = result['translated_text']
+                st.session_state.raw_emotions = result['emotions']
+                smoothing = st.session_state.get('emotion_smoothing', (SMOOTHING_WINDOW, HYSTERESIS_MARGIN))
+                st.session_state.emotions = apply_emotion_smoothing(result['emotions'], *smoothing)
+                st.session_state.analysis_settings = (enable_translation, source_language, target_lang_code)
+                st.session_state.analysis_model = st.session_state.get('analysis_job_model')
+                st.session_state.analysis_reused = result['reused']
+                st.session_state.analysis_applied = analysis_job.id
+                analysis_text = text_input
+                autosave_project(
+                    lambda store, project_id: store.save_analysis(
+                        project_id, analysis_text, result['emotions'],
+                        {'analysis': list(st.session_state.analysis_settings), 'model': st.session_state.analysis_model}),
+                    title=project_title(text_input, st.session_state.get('extracted_name') if input_method == "Upload File" else None)
+                )
+                if enable_translation:
+                    st.session_state.source_lang_used = source_language
+                    st.session_state.target_lang_used = target_lang_code
+                
+                for level, note in result['notes']:
+                    getattr(st, level)(note)
+                
+                # Show translation info if enabled
+                if enable_translation and translated_sentences:
+                    # Verify translation is different from original
+                    original_text = " ".join(sentences)
+                    translated_text_full = " ".join(translated_sentences)
+                    
+                    # CRITICAL: Verify translation actually happened
+                    is_translated = original_text.lower().strip() != translated_text_full.lower().strip()
+                    
+                    # Show clear success/failure message
+                    st.markdown("---")
+                    if is_translated:
+                        st.success(f"🎉 **TRANSLATION SUCCESSFUL!** Text translated to **{language_options.get(target_lang_code, target_lang_code)}**")
+                        st.balloons()  # Celebrate!
                     else:
-                        progress_bar = st.progress(0)
-                        status_text = st.empty()
+                        st.error(f"❌ **TRANSLATION FAILED!** Text is identical to original.")
+                        st.error(f"**This means translation didn't work!**")
+                        st.warning("**Troubleshooting:**")
+                        st.warning(f"1. Source: {language_options.get(source_language if source_language != 'auto' else 'en', 'Auto-detect')}")
+                        st.warning(f"2. Target: {language_options.get(target_lang_code, target_lang_code)}")
+                        st.warning("3. Make sure source and target are **DIFFERENT** languages")
+                        st.warning("4. Check internet connection")
                     
-                    for i, sentence in enumerate(sentences):
-                        status_text.text(f"Analyzing sentence {i+1}/{len(sentences)}...")
-                        emotion, score = detect_emotion(sentence, classifier)
-                        emotion_data = {
-                            'sentence': sentence,
-                            'emotion': emotion,
-                            'score': score
-                        }
-                        # Add translated sentence if available
-                        if enable_translation and translated_sentences:
-                            emotion_data['translated_sentence'] = translated_sentences[i]
-                        st.session_state.emotions.append(emotion_data)
-                        if enable_translation:
-                            progress_bar.progress(0.5 + ((i + 1) / len(sentences) * 0.5))  # Second half for analysis
-                        else:
-                            progress_bar.progress((i + 1) / len(sentences))
+                    # Show side-by-side comparison - ALWAYS show when translation is enabled
+                    st.markdown("### 📊 Translation Comparison")
+                    st.markdown("**Compare original text with translated text:**")
+                    col_orig, col_trans = st.columns(2)
                     
-                    status_text.text("Analysis complete!")
-                    progress_bar.empty()
+                    with col_orig:
+                        st.markdown(f"**📝 Original ({language_options.get(source_language if source_language != 'auto' else 'en', 'English')}):**")
+                        st.text_area("Original:", original_text, height=300, key="original_text_display", disabled=True, label_visibility="collapsed")
+                        st.caption(f"📊 {len(original_text.split())} words")
                     
-                    # Show translation info if enabled
-                    if enable_translation and TRANSLATOR_AVAILABLE and translated_sentences:
-                        # Verify translation is different from original
-                        original_text = " ".join(sentences)
-                        translated_text_full = " ".join(translated_sentences)
-                        
-                        # CRITICAL: Verify translation actually happened
-                        is_translated = original_text.lower().strip() != translated_text_full.lower().strip()
-                        
-                        # Show clear success/failure message
-                        st.markdown("---")
-                        if is_translated:
-                            st.success(f"🎉 **TRANSLATION SUCCESSFUL!** Text translated to **{language_options.get(target_lang_code, target_lang_code)}**")
-                            st.balloons()  # Celebrate!
-                        else:
-                            st.error(f"❌ **TRANSLATION FAILED!** Text is identical to original.")
-                            st.error(f"**This means translation didn't work!**")
-                            st.warning("**Troubleshooting:**")
-                            st.warning(f"1. Source: {language_options.get(source_language if source_language != 'auto' else 'en', 'Auto-detect')}")
-                            st.warning(f"2. Target: {language_options.get(target_lang_code, target_lang_code)}")
-                            st.warning("3. Make sure source and target are **DIFFERENT** languages")
-                            st.warning("4. Check internet connection")
-                        
-                        # Show side-by-side comparison - ALWAYS show when translation is enabled
-                        st.markdown("### 📊 Translation Comparison")
-                        st.markdown("**Compare original text with translated text:**")
-                        col_orig, col_trans = st.columns(2)
-                        
-                        with col_orig:
-                            st.markdown(f"**📝 Original ({language_options.get(source_language if source_language != 'auto' else 'en', 'English')}):**")
-                            st.text_area("Original:", original_text, height=300, key="original_text_display", disabled=True, label_visibility="collapsed")
-                            st.caption(f"📊 {len(original_text.split())} words")
-                        
-                        with col_trans:
-                            if is_translated:
-                                st.markdown(f"**🌍 Translated ({language_options.get(target_lang_code, target_lang_code)}) ✅:**")
-                                st.success("✅ **This translated text will be used for speech!**")
-                            else:
-                                st.markdown(f"**🌍 Translated ({language_options.get(target_lang_code, target_lang_code)}) ❌:**")
-                                st.error("❌ **Translation failed - text is identical!**")
-                            st.text_area("Translated:", translated_text_full, height=300, key="translated_text_display", disabled=True, label_visibility="collapsed")
-                            st.caption(f"📊 {len(translated_text_full.split())} words")
-                        
-                        # Show what will be spoken
-                        st.markdown("---")
+                    with col_trans:
                         if is_translated:
-                            st.success(f"✅ **When you click 'Generate Speech', it will speak:**")
-                            st.info(f"**'{translated_text_full[:200]}...'**")
-                            st.success(f"**In {language_options.get(target_lang_code, target_lang_code)} language**")
+                            st.markdown(f"**🌍 Translated ({language_options.get(target_lang_code, target_lang_code)}) ✅:**")
+                            st.success("✅ **This translated text will be used for speech!**")
                         else:
-                            st.error(f"❌ **Translation failed! Speech will NOT be in {language_options.get(target_lang_code, target_lang_code)}**")
-                            st.error("Please fix translation settings above.")
-                        
-                        # Store source and target language info
-                        st.session_state.source_lang_display = language_options.get(source_language if source_language != 'auto' else 'en', 'English')
-                        st.session_state.target_lang_display = language_options.get(target_lang_code, target_lang_code)
-                        st.session_state.translation_verified = is_translated
+                            st.markdown(f"**🌍 Translated ({language_options.get(target_lang_code, target_lang_code)}) ❌:**")
+                            st.error("❌ **Translation failed - text is identical!**")
+                        st.text_area("Translated:", translated_text_full, height=300, key="translated_text_display", disabled=True, label_visibility="collapsed")
+                        st.caption(f"📊 {len(translated_text_full.split())} words")
+                    
+                    # Show what will be spoken
+                    st.markdown("---")
+                    if is_translated:
+                        st.success(f"✅ **When you click 'Generate Speech', it will speak:**")
+                        st.info(f"**'{translated_text_full[:200]}...'**")
+                        st.success(f"**In {language_options.get(target_lang_code, target_lang_code)} language**")
+                    else:
+                        st.error(f"❌ **Translation failed! Speech will NOT be in {language_options.get(target_lang_code, target_lang_code)}**")
+                        st.error("Please fix translation settings above.")
+                    
+                    # Store source and target language info
+                    st.session_state.source_lang_display = language_options.get(source_language if source_language != 'auto' else 'en', 'English')
+                    st.session_state.target_lang_display = language_options.get(target_lang_code, target_lang_code)
+                    st.session_state.translation_verified = is_translated
+                else:
+                    st.success(f"✅ Analysis complete! {len(sentences)} sentences analyzed.")
     
     # Display results
     if 'emotions' in st.session_state and len(st.session_state.emotions) > 0:
@@ -1453,77 +4698,117 @@ def main():
         
         # Results header with export options
         st.subheader("📊 Analysis Results")
+        reused = st.session_state.get('analysis_reused', 0)
+        if reused:
+            st.caption(f"♻️ {reused} of {len(st.session_state.emotions)} sentences were unchanged and kept their earlier results")
         
-        # Create results table data first
-        results_data = []
-        for item in st.session_state.emotions:
-            params = EMOTION_PARAMS.get(item['emotion'], EMOTION_PARAMS["neutral"])
-            # Show translated text if available, otherwise show original
-            display_text = item.get('translated_sentence', item['sentence'])
-            results_data.append({
-                "Text": display_text[:100] + "..." if len(display_text) > 100 else display_text,
-                "Emotion": item['emotion'].title(),
-                "Confidence": f"{item['score']:.2%}",
-                "Pitch": f"{params['pitch_shift']*100:.0f}%",
-                "Speed": f"{params['speed']:.2f}x",
-                "Tone": params['tone']
-            })
-            
-            # Show original text in tooltip if translated
-            if 'translated_sentence' in item:
-                item['display_text'] = item['translated_sentence']
-            else:
-                item['display_text'] = item['sentence']
+        # Smoothing works on the stored probability rows, so changing it never re-runs the model
+        raw_matrix = emotion_matrix(st.session_state.get('raw_emotions'))
+        if raw_matrix is not None:
+            with st.expander("🎚️ Emotion Smoothing"):
+                smoothing = (
+                    st.slider("Context window (sentences)", 1, 9, st.session_state.get('emotion_smoothing', (SMOOTHING_WINDOW,))[0], step=2,
+                              help="Average each sentence's emotion probabilities with its neighbours", key="smoothing_window"),
+                    st.slider("Switching margin", 0.0, 0.5, st.session_state.get('emotion_smoothing', (1, HYSTERESIS_MARGIN))[1], step=0.05,
+                              help="Keep the previous sentence's emotion unless another one leads it by this much", key="hysteresis_margin"),
+                )
+                if smoothing != st.session_state.get('emotion_smoothing', (SMOOTHING_WINDOW, HYSTERESIS_MARGIN)):
+                    st.session_state.emotion_smoothing = smoothing
+                    st.session_state.emotions = apply_emotion_smoothing(st.session_state.raw_emotions, *smoothing)
+                raw = emotion_summary(raw_matrix)
+                # Counted from the matrix, so a saved project's rows aren't read for it
+                smoothed_labels = hysteresis_labels(smooth_probabilities(raw_matrix, smoothing[0]), smoothing[1])
+                changes = int((smoothed_labels[1:] != smoothed_labels[:-1]).sum())
+                st.caption(
+                    f"Overall tone: {raw['dominant']}; strongest emotion: {raw['dominant_emotional']} "
+                    f"({raw['mean'][raw['dominant_emotional']]:.0%} average probability); uncertainty {raw['uncertainty']:.0%}. "
+                    f"Emotion changes between sentences: {raw['changes']} raw, {changes} after smoothing."
+                )
+                st.bar_chart({
+                    "Raw": raw['shares'],
+                    "Smoothed": dict(zip(EMOTION_LABELS, (np.bincount(smoothed_labels, minlength=len(EMOTION_LABELS)) / len(smoothed_labels)).tolist())),
+                })
+        
+        # One page of the results table, so a long document (or a reopened
+        # project, whose rows stay in the store) only renders the rows on screen
+        result_pages = max(1, -(-len(st.session_state.emotions) // RESULTS_PER_PAGE))
+        if st.session_state.get('results_page', 1) > result_pages:
+            st.session_state.results_page = result_pages
         
         # Export options
         export_col1, export_col2 = st.columns([1, 1])
         with export_col1:
             if REPORTLAB_AVAILABLE:
-                # Generate or retrieve cached PDF report
-                pdf_cache_key = f"pdf_report_{len(st.session_state.emotions)}"
-                if pdf_cache_key not in st.session_state:
-                    # Generate PDF report (cached per emotion count)
-                    pdf_bytes = generate_pdf_report(st.session_state.emotions)
-                    if pdf_bytes:
-                        timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                        filename = f"emotion_analysis_report_{timestamp}.pdf"
-                        st.session_state[pdf_cache_key] = pdf_bytes
-                        st.session_state[f"{pdf_cache_key}_filename"] = filename
+                # The PDF report is built in the background when it is asked
+                # for, once per analysis result and smoothing setting
+                report_for = (st.session_state.get('analysis_applied'), st.session_state.get('emotion_smoothing'))
+                report = st.session_state.get('pdf_report')
+                report_job = executor.get(st.session_state.get('report_job_id'))
+                if st.session_state.get('report_requested_for') not in (None, report_for):
+                    # A new result or smoothing setting supersedes a report still being built
+                    if report_job is not None and not report_job.done:
+                        executor.cancel(report_job.id)
+                    report_job = None
+                    st.session_state.pop('report_job_id', None)
+                    st.session_state.pop('report_requested_for', None)
+                
+                if report_job is not None and report_job.status == "done" and (report is None or report['for'] != report_for):
+                    report = {'for': report_for, **report_job.result}
+                    st.session_state.pdf_report = report
+                    autosave_project(lambda store, project_id: store.save_artifact(project_id, "report", {
+                        'blob': store.put_bytes(report['pdf_bytes'], ".pdf"),
+                        'filename': report['filename'],
+                        'smoothing': st.session_state.get('emotion_smoothing'),
+                    }))
                 
-                # Download button
-                if pdf_cache_key in st.session_state:
+                # Download button; a report reopened from a project is read when clicked
+                if report is not None and report['for'] == report_for and 'pdf_path' in report:
+                    lazy_download_button("📄 Download PDF Report", functools.partial(_read_file, report['pdf_path']),
+                                         report['filename'], "application/pdf", key="download_project_report", prepare=False)
+                elif report is not None and report['for'] == report_for:
                     st.download_button(
                         label="📄 Download PDF Report",
-                        data=st.session_state[pdf_cache_key],
-                        file_name=st.session_state[f"{pdf_cache_key}_filename"],
+                        data=report['pdf_bytes'],
+                        file_name=report['filename'],
                         mime="application/pdf",
                         use_container_width=True,
                         help="Download a formatted PDF report with analysis results"
                     )
+                else:
+                    if report_job is not None:
+                        render_job_status(report_job, show_partial_count=False)
+                    if (report_job is None or report_job.status in ("failed", "cancelled")) and st.button(
+                            "📄 Build PDF Report", key="build_pdf_report", use_container_width=True,
+                            help="Build a formatted PDF report with analysis results"):
+                        # The job reads the items itself; a reopened project's rows are paged from the store
+                        job = submit_job("report", run_report_job, st.session_state.emotions, label="PDF report")
+                        if job is not None:
+                            st.session_state.report_job_id = job.id
+                            st.session_state.report_requested_for = report_for
+                            st.rerun()
             else:
                 st.info("📄 PDF export requires reportlab library")
         
         with export_col2:
-            # Export as CSV
-            try:
-                import pandas as pd
-                df = pd.DataFrame(results_data)
-                csv = df.to_csv(index=False)
+            # Export as CSV, built from every row when clicked
+            if _module_available("pandas"):
                 timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-                csv_filename = f"emotion_analysis_{timestamp}.csv"
-                st.download_button(
-                    label="📊 Download CSV",
-                    data=csv,
-                    file_name=csv_filename,
+                lazy_download_button(
+                    "📊 Download CSV",
+                    functools.partial(analysis_results_csv, st.session_state.emotions),
+                    file_name=f"emotion_analysis_{timestamp}.csv",
                     mime="text/csv",
-                    use_container_width=True,
-                    help="Download analysis results as CSV file"
+                    key="download_csv"
                 )
-            except ImportError:
+            else:
                 st.info("📊 CSV export requires pandas library")
         
         # Display results table
-        st.dataframe(results_data, use_container_width=True, hide_index=True)
+        page = st.number_input(f"Results page (of {result_pages})", min_value=1, max_value=result_pages,
+                               key="results_page") if result_pages > 1 else 1
+        first = (page - 1) * RESULTS_PER_PAGE
+        st.dataframe([analysis_result_row(item) for item in st.session_state.emotions[first:first + RESULTS_PER_PAGE]],
+                     use_container_width=True, hide_index=True)
         
         # Generate speech button
         st.markdown("---")
@@ -1544,143 +4829,851 @@ def main():
                 enable_translation = st.session_state.get('enable_translation', False)
                 target_lang_code = st.session_state.get('target_lang_code', 'en')
                 language = target_lang_code if enable_translation else st.session_state.get('speech_language', 'en')
+                notes = []
                 
                 if generate_option == "All sentences (combined)":
                     # Use translated text if available, otherwise use original
                     # Check if translation is enabled and translated text exists
-                    has_translated_text = ('translated_text' in st.session_state and 
-                                          st.session_state.translated_text and 
-                                          st.session_state.translated_text.strip())
+                    translated_text = st.session_state.get('translated_text')
+                    if translated_text is None and st.session_state.get('translated_sentences'):
+                        # A reopened project joins its translations only when speech needs them
+                        translated_text = " ".join(st.session_state.translated_sentences)
+                    has_translated_text = bool(translated_text and translated_text.strip())
                     
                     if enable_translation:
                         # Translation is enabled - check if we have translated text
                         if has_translated_text:
-                            full_text = st.session_state.translated_text
-                            st.success(f"🔀 **Generating speech from TRANSLATED text** ({language_options.get(target_lang_code, target_lang_code)})")
-                            st.info(f"✅ Using translated text: **'{full_text[:100]}...'**")
+                            full_text = translated_text
+                            notes.append(("success", f"🔀 **Generating speech from TRANSLATED text** ({language_options.get(target_lang_code, target_lang_code)})"))
+                            notes.append(("info", f"✅ Using translated text: **'{full_text[:100]}...'**"))
                         else:
                             # Translation enabled but no translated text - show helpful error
                             full_text = " ".join([item['sentence'] for item in st.session_state.emotions])
-                            st.error(f"❌ **Translation is enabled but no translated text found!**")
-                            st.warning(f"⚠️ **Please click 'Analyze Emotions' first** to translate the text.")
-                            st.info(f"📝 Using original text for now: **'{full_text[:100]}...'**")
-                            st.error(f"**Speech will be in original language, NOT {language_options.get(target_lang_code, target_lang_code)}!**")
+                            notes.append(("error", f"❌ **Translation is enabled but no translated text found!**"))
+                            notes.append(("warning", f"⚠️ **Please click 'Analyze Emotions' first** to translate the text."))
+                            notes.append(("info", f"📝 Using original text for now: **'{full_text[:100]}...'**"))
+                            notes.append(("error", f"**Speech will be in original language, NOT {language_options.get(target_lang_code, target_lang_code)}!**"))
                     else:
                         # Translation not enabled
                         full_text = " ".join([item['sentence'] for item in st.session_state.emotions])
-                        st.info(f"📝 Using original text (translation not enabled in sidebar)")
+                        notes.append(("info", f"📝 Using original text (translation not enabled in sidebar)"))
                     
                     # Use dominant emotion or neutral
                     dominant_emotion = max(st.session_state.emotions, key=lambda x: x['score'])['emotion']
+                    # Sentences keep their own emotion in the combined track where FFmpeg allows
+                    use_translated = enable_translation and has_translated_text
+                    items = [
+                        {**item, 'text_to_speak': item['translated_sentence'] if use_translated and 'translated_sentence' in item else item['sentence']}
+                        for item in st.session_state.emotions
+                    ]
                     
-                    with st.spinner("Generating emotional speech..."):
-                        # Show what text will be spoken
-                        if enable_translation and 'translated_text' in st.session_state and st.session_state.translated_text:
-                            st.info(f"🔊 **Generating speech in {language_options.get(target_lang_code, target_lang_code)}**")
-                            st.caption(f"📝 Text to speak: {full_text[:200]}...")
-                        
-                        # Use gTTS for translated text (better language support)
-                        # Ensure we use the correct language code for gTTS
-                        tts_lang = target_lang_code if enable_translation else language
-                        prefer_gtts = enable_translation or (language != 'en')  # Use gTTS for non-English
-                        
-                        audio_path = generate_emotional_speech(
-                            full_text,
-                            dominant_emotion,
-                            lang=tts_lang,  # Use target language for TTS
-                            slow=(base_speed == "Slow"),
-                            voice_gender=voice_gender.lower(),
-                            use_pyttsx3=use_pyttsx3 and not enable_translation and language == 'en',  # Only use pyttsx3 for English without translation
-                            prefer_gtts=prefer_gtts
-                        )
+                    # Use gTTS for translated text (better language support)
+                    # Ensure we use the correct language code for gTTS
+                    tts_lang = target_lang_code if enable_translation else language
+                    prefer_gtts = enable_translation or (language != 'en')  # Use gTTS for non-English
                     
-                    if audio_path:
-                        # Determine audio format
-                        audio_format = 'audio/mp3' if audio_path.endswith('.mp3') else 'audio/wav'
-                        file_ext = 'mp3' if audio_path.endswith('.mp3') else 'wav'
-                        st.audio(audio_path, format=audio_format)
-                        with open(audio_path, 'rb') as f:
-                            st.download_button(
-                                label="📥 Download Audio",
-                                data=f.read(),
-                                file_name=f"emotion_aware_speech.{file_ext}",
-                                mime=audio_format
-                            )
+                    job = submit_job(
+                        "synthesis",
+                        run_synthesis_job,
+                        "combined",
+                        items,
+                        full_text,
+                        dominant_emotion,
+                        lang=tts_lang,  # Use target language for TTS
+                        slow=(base_speed == "Slow"),
+                        voice_gender=voice_gender.lower(),
+                        use_pyttsx3=use_pyttsx3 and not enable_translation and language == 'en',  # Only use pyttsx3 for English without translation
+                        prefer_gtts=prefer_gtts,
+                        audio_format=output_format,
+                        label="Speech generation"
+                    )
                 else:
                     # Generate for each sentence
-                    # Get translation settings from session state
-                    enable_translation = st.session_state.get('enable_translation', False)
-                    target_lang_code = st.session_state.get('target_lang_code', 'en')
-                    language = target_lang_code if enable_translation else st.session_state.get('speech_language', 'en')
-                    
                     # Check if we have translated sentences
-                    has_translated_sentences = ('translated_sentences' in st.session_state and 
+                    has_translated_sentences = ('translated_sentences' in st.session_state and
                                                st.session_state.translated_sentences)
                     
                     if enable_translation:
                         if has_translated_sentences:
-                            st.success(f"🔀 **Generating speech from TRANSLATED text** ({language_options.get(target_lang_code, target_lang_code)})")
-                            st.info(f"✅ Using translated sentences")
+                            notes.append(("success", f"🔀 **Generating speech from TRANSLATED text** ({language_options.get(target_lang_code, target_lang_code)})"))
+                            notes.append(("info", f"✅ Using translated sentences"))
                         else:
-                            st.error(f"❌ **Translation is enabled but no translated sentences found!**")
-                            st.warning(f"⚠️ **Please click 'Analyze Emotions' first** to translate the text.")
-                            st.error(f"**Speech will be in original language, NOT {language_options.get(target_lang_code, target_lang_code)}!**")
+                            notes.append(("error", f"❌ **Translation is enabled but no translated sentences found!**"))
+                            notes.append(("warning", f"⚠️ **Please click 'Analyze Emotions' first** to translate the text."))
+                            notes.append(("error", f"**Speech will be in original language, NOT {language_options.get(target_lang_code, target_lang_code)}!**"))
                     else:
-                        st.info(f"📝 Using original sentences (translation not enabled in sidebar)")
+                        notes.append(("info", f"📝 Using original sentences (translation not enabled in sidebar)"))
                     
-                    audio_files = []
-                    for i, item in enumerate(st.session_state.emotions):
+                    items = []
+                    for item in st.session_state.emotions:
                         # Use translated text if available
                         if enable_translation and has_translated_sentences and 'translated_sentence' in item:
                             text_to_speak = item['translated_sentence']
-                            if i == 0:  # Show example for first sentence
-                                st.caption(f"📝 Example: Speaking translated text: '{text_to_speak[:80]}...'")
                         else:
                             text_to_speak = item['sentence']
-                            if i == 0:  # Show example for first sentence
-                                st.caption(f"📝 Example: Speaking original text: '{text_to_speak[:80]}...'")
-                        
-                        with st.spinner(f"Generating speech for sentence {i+1}/{len(st.session_state.emotions)}..."):
-                            # Use gTTS for translated text (better language support)
-                            prefer_gtts = enable_translation
-                            tts_lang = target_lang_code if enable_translation else language
-                            audio_path = generate_emotional_speech(
-                                text_to_speak,
-                                item['emotion'],
-                                lang=tts_lang,  # Use target language
-                                slow=(base_speed == "Slow"),
-                                voice_gender=voice_gender.lower(),
-                                use_pyttsx3=use_pyttsx3 and not enable_translation and tts_lang == 'en',  # Don't use pyttsx3 for translated text
-                                prefer_gtts=prefer_gtts
-                            )
-                            if audio_path:
-                                audio_files.append((audio_path, item))
+                        items.append({**item, 'text_to_speak': text_to_speak})
+                    if items:
+                        notes.append(("caption", f"📝 Example: Speaking text: '{items[0]['text_to_speak'][:80]}...'"))
                     
-                    # Display all audio players
-                    for idx, (audio_path, item) in enumerate(audio_files):
-                        # Show translated text if available
-                        display_text = item.get('translated_sentence', item['sentence'])
-                        st.markdown(f"**{item['emotion'].title()}** - {display_text[:50]}...")
-                        # Show original text if translated
-                        if 'translated_sentence' in item:
-                            st.caption(f"Original: {item['sentence'][:50]}...")
-                        # Determine audio format
-                        audio_format = 'audio/mp3' if audio_path.endswith('.mp3') else 'audio/wav'
-                        file_ext = 'mp3' if audio_path.endswith('.mp3') else 'wav'
-                        st.audio(audio_path, format=audio_format)
-                        
-                        # Download button for each audio
-                        with open(audio_path, 'rb') as f:
-                            st.download_button(
-                                label=f"📥 Download ({item['emotion'].title()})",
-                                data=f.read(),
-                                file_name=f"speech_{item['emotion']}_{idx+1}.{file_ext}",
-                                mime=audio_format,
-                                key=f"download_{idx}"
-                            )
+                    # Use gTTS for translated text (better language support)
+                    tts_lang = target_lang_code if enable_translation else language
+                    voice_settings = {
+                        'lang': tts_lang,  # Use target language
+                        'slow': base_speed == "Slow",
+                        'voice_gender': voice_gender.lower(),
+                        'use_pyttsx3': use_pyttsx3 and not enable_translation and tts_lang == 'en',  # Don't use pyttsx3 for translated text
+                        'prefer_gtts': enable_translation,
+                        'audio_format': output_format,
+                    }
+                    # Clips of sentences that didn't change since the last run are kept
+                    audio_result = st.session_state.get('audio_result')
+                    reuse = None
+                    if (audio_result and audio_result['mode'] == "individual"
+                            and st.session_state.get('audio_settings') == voice_settings):
+                        reuse = list(audio_result['clips'])
+                    job = submit_job(
+                        "synthesis",
+                        run_synthesis_job,
+                        "individual",
+                        items,
+                        None,
+                        None,
+                        reuse=reuse,
+                        label="Speech generation",
+                        **voice_settings
+                    )
+                    st.session_state.audio_settings = voice_settings
+                
+                if job is not None:
+                    # A new request replaces one that is still running
+                    previous_job = executor.get(st.session_state.get('synthesis_job_id'))
+                    if previous_job is not None and not previous_job.done:
+                        executor.cancel(previous_job.id)
+                    st.session_state.synthesis_job_id = job.id
+                    st.session_state.synthesis_notes = notes
+        
+        for level, note in st.session_state.get('synthesis_notes', []):
+            getattr(st, level)(note)
+        
+        synthesis_job = executor.get(st.session_state.get('synthesis_job_id'))
+        if synthesis_job is not None:
+            synthesis_snap = synthesis_job.snapshot()
+            partial_results = synthesis_snap['partial_results']
+            if synthesis_snap['status'] == "done" and st.session_state.get('audio_result_job') != synthesis_job.id:
+                st.session_state.audio_result = synthesis_job.result
+                st.session_state.audio_result_job = synthesis_job.id
+                autosave_project(functools.partial(save_project_audio, audio_result=synthesis_job.result,
+                                                   voice_settings=st.session_state.get('audio_settings')))
+            elif synthesis_snap['status'] != "done":
+                # Clips (individual mode) or segments (combined mode) finished
+                # so far are playable while the rest render
+                if partial_results and isinstance(partial_results[0], dict):
+                    st.session_state.audio_result = {'mode': "combined", 'audio_path': None, 'segments': partial_results}
+                elif partial_results:
+                    st.session_state.audio_result = {'mode': "individual", 'clips': partial_results}
+                else:
+                    st.session_state.audio_result = None
+                st.session_state.audio_result_job = None
+        
+        audio_result = st.session_state.get('audio_result')
+        # Segment players go above the job status so they keep their place
+        # (and keep playing) when the progress bar disappears
+        if audio_result and audio_result.get('segments'):
+            render_progressive_segments(
+                audio_result['segments'],
+                rendering=synthesis_job is not None and not synthesis_job.done
+            )
+        if synthesis_job is not None:
+            render_job_status(synthesis_job, show_partial_count=False)
+        
+        if audio_result and audio_result['mode'] == "combined":
+            audio_path = audio_result['audio_path']
+            if audio_path and os.path.exists(audio_path):
+                # Determine audio format
+                audio_format = audio_mime(audio_path)
+                file_ext = os.path.splitext(audio_path)[1].lstrip(".")
+                timestamps = audio_result.get('timestamps')
+                start_time = 0
+                if timestamps and len(timestamps) > 1:
+                    jump = st.selectbox(
+                        "⏩ Jump to sentence",
+                        range(len(timestamps)),
+                        format_func=lambda i: (f"{i + 1}. [{timestamps[i]['start_ms'] // 60000}:"
+                                               f"{timestamps[i]['start_ms'] // 1000 % 60:02d}] "
+                                               f"{timestamps[i]['emotion'].title()} - {timestamps[i]['text'][:60]}"),
+                        key=f"jump_{st.session_state.get('audio_result_job')}"
+                    )
+                    start_time = timestamps[jump]['start_ms'] // 1000
+                st.audio(audio_path, format=audio_format, start_time=start_time)
+                lazy_download_button(
+                    "📥 Download Audio",
+                    functools.partial(_read_file, audio_path),
+                    file_name=f"emotion_aware_speech.{file_ext}",
+                    mime=audio_format,
+                    key="download_combined",
+                    prepare=False
+                )
+                if timestamps:
+                    render_timing_downloads(timestamps, key=f"timings_{st.session_state.get('audio_result_job')}")
+                    with st.expander("🕒 Sentence timings"):
+                        st.dataframe(
+                            [{"Start": f"{stamp['start_ms'] / 1000:.2f}s", "End": f"{stamp['end_ms'] / 1000:.2f}s",
+                              "Emotion": stamp['emotion'].title(), "Text": stamp['text'][:80]}
+                             for stamp in audio_result['timestamps']],
+                            use_container_width=True,
+                            hide_index=True
+                        )
+        elif audio_result:
+            clips = audio_result['clips']
+            bundle_key = st.session_state.get('audio_result_job')
+            if bundle_key and len(clips) > 1:
+                # Whole-result downloads, built only when clicked
+                zip_col, track_col = st.columns(2)
+                with zip_col:
+                    lazy_download_button(
+                        f"📦 Download all {len(clips)} clips (ZIP)",
+                        functools.partial(_bundle_bytes, build_clip_zip, clips),
+                        file_name="emotion_aware_speech_clips.zip",
+                        mime="application/zip",
+                        key=f"bundle_zip_{bundle_key}"
+                    )
+                if ffmpeg_available:
+                    # Same format the clips were generated in
+                    bundle_format = audio_format_of(clips[0][0]) or AUDIO_FORMAT
+                    with track_col:
+                        lazy_download_button(
+                            "🎧 Download as one track with chapters",
+                            functools.partial(_bundle_bytes, build_bundle_track, clips, bundle_format),
+                            file_name=f"emotion_aware_speech{AUDIO_FORMATS[bundle_format]['suffix']}",
+                            mime=AUDIO_FORMATS[bundle_format]['mime'],
+                            key=f"bundle_track_{bundle_key}"
+                        )
+                    track_timestamps = clip_timestamps(clips)
+                    if track_timestamps:
+                        st.caption("Captions and timings for the single track:")
+                        render_timing_downloads(track_timestamps, key=f"bundle_timings_{bundle_key}")
+            
+            # One page of players, so reruns don't grow with the sentence count
+            pages = max(1, -(-len(clips) // CLIPS_PER_PAGE))
+            if st.session_state.get('clip_page', 1) > pages:
+                st.session_state.clip_page = pages
+            page = st.number_input(f"Page (of {pages})", min_value=1, max_value=pages, key="clip_page") if pages > 1 else 1
+            first = (page - 1) * CLIPS_PER_PAGE
+            for idx, (audio_path, item) in enumerate(clips[first:first + CLIPS_PER_PAGE], start=first):
+                if not os.path.exists(audio_path):
+                    continue
+                # Show translated text if available
+                display_text = item.get('translated_sentence', item['sentence'])
+                st.markdown(f"**{item['emotion'].title()}** - {display_text[:50]}...")
+                # Show original text if translated
+                if 'translated_sentence' in item:
+                    st.caption(f"Original: {item['sentence'][:50]}...")
+                # Determine audio format
+                audio_format = audio_mime(audio_path)
+                file_ext = os.path.splitext(audio_path)[1].lstrip(".")
+                st.audio(audio_path, format=audio_format)
+                
+                # Download button for each audio
+                lazy_download_button(
+                    f"📥 Download ({item['emotion'].title()})",
+                    functools.partial(_read_file, audio_path),
+                    file_name=f"speech_{item['emotion']}_{idx+1}.{file_ext}",
+                    mime=audio_format,
+                    key=f"download_{idx}",
+                    prepare=False
+                )
         
         # Cleanup temporary files (optional - files will be cleaned on app restart)
         # Note: In production, implement proper cleanup mechanism
+    
+    # Audiobook mode: the whole input is analyzed and spoken chapter by
+    # chapter in the background, without running the analysis above first
+    st.markdown("---")
+    with st.expander("📚 Audiobook Mode (book-length documents)"):
+        executor = get_job_executor()
+        st.caption(
+            f"Splits the text into chapters (document outline, headings, or every "
+            f"{AUDIOBOOK_CHAPTER_SENTENCES} sentences), renders {AUDIOBOOK_PARALLEL} at a time and keeps "
+            f"finished chapters on disk, so an interrupted book resumes where it stopped."
+        )
+        if st.button("📚 Render Audiobook", key="render_audiobook"):
+            if not text_input or len(text_input.strip()) == 0:
+                st.warning("Please enter some text first!")
+            else:
+                with st.spinner("Loading emotion detection model..."):
+                    try:
+                        classifier = with_cascade(get_inference_server(st.session_state.emotion_model),
+                                                  st.session_state.emotion_model)
+                    except Exception as e:
+                        classifier = None
+                        st.error(f"Failed to load emotion model: {e}")
+                outline = st.session_state.get('extracted_outline') if input_method == "Upload File" else None
+                chapters = split_chapters(text_input, outline)
+                if classifier is not None and chapters:
+                    speech_lang = st.session_state.get('speech_language', 'en')
+                    speech = {
+                        'lang': speech_lang,
+                        'slow': base_speed == "Slow",
+                        'voice_gender': voice_gender.lower(),
+                        'use_pyttsx3': use_pyttsx3 and speech_lang == 'en',
+                        'prefer_gtts': speech_lang != 'en',
+                        'audio_format': output_format,
+                    }
+                    book_dir = os.path.join(AUDIOBOOK_DIR, audiobook_id(chapters, speech, st.session_state.emotion_model))
+                    # A new book replaces one that is still rendering; its finished chapters stay on disk
+                    previous_job = executor.get(st.session_state.get('audiobook_job_id'))
+                    if previous_job is not None and not previous_job.done:
+                        executor.cancel(previous_job.id)
+                    job = submit_job("audiobook", run_audiobook_job, chapters, classifier, speech, book_dir,
+                                     label=f"Audiobook ({len(chapters)} chapters)")
+                    if job is not None:
+                        st.session_state.audiobook_job_id = job.id
+        
+        audiobook_job = executor.get(st.session_state.get('audiobook_job_id'))
+        if audiobook_job is not None:
+            audiobook_snap = render_job_status(audiobook_job, show_partial_count=False)
+            if audiobook_snap['status'] in ("queued", "running") and audiobook_snap['partial_results']:
+                st.caption(f"{len(audiobook_snap['partial_results'])} chapters finished in this run")
+            book = audiobook_job.result if audiobook_snap['status'] == "done" else None
+            if book and os.path.exists(book['audio_path']):
+                if book['restored']:
+                    st.info(f"♻️ {book['restored']} of {len(book['chapters'])} chapters were restored from an earlier run")
+                audio_format = audio_mime(book['audio_path'])
+                st.audio(book['audio_path'], format=audio_format)
+                lazy_download_button(
+                    "📥 Download Audiobook",
+                    functools.partial(_read_file, book['audio_path']),
+                    file_name=f"audiobook{os.path.splitext(book['audio_path'])[1]}",
+                    mime=audio_format,
+                    key=f"download_audiobook_{audiobook_job.id}",
+                    prepare=False
+                )
+                if book['timestamps']:
+                    render_timing_downloads(book['timestamps'], key=f"audiobook_{audiobook_job.id}", file_stem="audiobook")
+                st.dataframe(
+                    [{"Chapter": marker['title'], "Start": _caption_time(marker['start_ms'], ".")[:8],
+                      "Length": f"{(marker['end_ms'] - marker['start_ms']) / 60000:.1f} min"}
+                     for marker in book['chapters']],
+                    use_container_width=True,
+                    hide_index=True
+                )
+    
+    with st.expander("🗂️ Batch Upload (several documents)"):
+        executor = get_job_executor()
+        st.caption(
+            f"Upload up to {BATCH_MAX_FILES} documents; they are extracted, analyzed and optionally spoken "
+            f"side by side, and summarized in one combined report."
+        )
+        batch_types = ['txt', 'md'] + (['pdf'] if PDFPLUMBER_AVAILABLE or PYPDF2_AVAILABLE else []) + (['docx'] if DOCX_AVAILABLE else [])
+        batch_files = st.file_uploader("Documents", type=batch_types, accept_multiple_files=True, key="batch_files")
+        batch_speech = st.checkbox("Also generate speech for each document", key="batch_speech")
+        if st.button("🗂️ Process All", key="process_batch", disabled=not batch_files):
+            if len(batch_files) > BATCH_MAX_FILES:
+                st.warning(f"Please upload at most {BATCH_MAX_FILES} documents at a time.")
+            else:
+                with st.spinner("Loading emotion detection model..."):
+                    try:
+                        classifier = with_cascade(get_inference_server(st.session_state.emotion_model),
+                                                  st.session_state.emotion_model)
+                    except Exception as e:
+                        classifier = None
+                        st.error(f"Failed to load emotion model: {e}")
+                if classifier is not None:
+                    speech = None
+                    if batch_speech:
+                        speech_lang = st.session_state.get('speech_language', 'en')
+                        speech = {
+                            'lang': speech_lang,
+                            'slow': base_speed == "Slow",
+                            'voice_gender': voice_gender.lower(),
+                            'use_pyttsx3': use_pyttsx3 and speech_lang == 'en',
+                            'prefer_gtts': speech_lang != 'en',
+                            'audio_format': output_format,
+                        }
+                    previous_job = executor.get(st.session_state.get('batch_job_id'))
+                    if previous_job is not None and not previous_job.done:
+                        executor.cancel(previous_job.id)
+                    files = [(uploaded.name, uploaded.getvalue()) for uploaded in batch_files]
+                    job = submit_job("batch", run_batch_job, files, classifier,
+                                     st.session_state.get('strip_pdf_furniture', STRIP_PDF_FURNITURE), speech,
+                                     label=f"Batch ({len(files)} documents)")
+                    if job is not None:
+                        st.session_state.batch_job_id = job.id
+        
+        batch_job = executor.get(st.session_state.get('batch_job_id'))
+        if batch_job is not None:
+            batch_snap = render_job_status(batch_job, show_partial_count=False)
+            if batch_snap['status'] in ("queued", "running"):
+                for _, item in sorted(batch_snap['items'].items()):
+                    st.progress(item.get('progress', 0.0), text=f"{item['name']}: {item['status']}")
+            batch = batch_job.result if batch_snap['status'] == "done" else None
+            if batch:
+                if batch['failed']:
+                    st.warning(f"⚠️ {batch['failed']} document(s) could not be processed")
+                if batch['report']:
+                    st.download_button(
+                        "📄 Download Combined Report",
+                        data=batch['report']['pdf_bytes'],
+                        file_name=batch['report']['filename'],
+                        mime="application/pdf",
+                        key=f"batch_report_{batch_job.id}"
+                    )
+                documents = batch['documents']
+                tabs = st.tabs([f"📄 {document['name']}" for document in documents]) if documents else []
+                for number, (tab, document) in enumerate(zip(tabs, documents)):
+                    counts = Counter(item['emotion'] for item in document['emotions'])
+                    with tab:
+                        st.caption(f"{len(document['emotions'])} sentences, mostly {counts.most_common(1)[0][0]}")
+                        if document['audio_path'] and os.path.exists(document['audio_path']):
+                            st.audio(document['audio_path'], format=audio_mime(document['audio_path']))
+                            lazy_download_button(
+                                "📥 Download Audio",
+                                functools.partial(_read_file, document['audio_path']),
+                                file_name=f"{os.path.splitext(document['name'])[0]}{os.path.splitext(document['audio_path'])[1]}",
+                                mime=audio_mime(document['audio_path']),
+                                key=f"batch_audio_{batch_job.id}_{number}",
+                                prepare=False
+                            )
+                        st.dataframe(
+                            [{"Text": item['sentence'][:100], "Emotion": item['emotion'].title(), "Confidence": f"{item['score']:.2%}"}
+                             for item in document['emotions']],
+                            use_container_width=True,
+                            hide_index=True
+                        )
+    
+    # Keep polling while this session has background jobs in flight, or the
+    # model is still warming up; each rerun is just a cheap status read
+    if (any(not job.done for job in get_job_executor().session_jobs(get_session_id()))
+            or start_model_warmup().state == "loading"):
+        time.sleep(JOB_POLL_INTERVAL)
+        st.rerun()
+
+# Health and readiness endpoint
+# A small stdlib HTTP server on its own port, so orchestrator probes are
+# answered by a plain thread and never wait behind a Streamlit script run:
+#   GET /healthz - liveness, answers immediately without touching torch/ffmpeg
+#   GET /readyz  - readiness: model state, capabilities, cache status (503 until ready)
+# Disabled unless EATTS_HEALTH_PORT is set. Start the app with serve.py to
+# have it listening from process start instead of the first browser session.
+HEALTH_PORT = int(os.environ.get("EATTS_HEALTH_PORT", "0") or 0)
+HEALTH_HOST = os.environ.get("EATTS_HEALTH_HOST", "0.0.0.0")
+
+def readiness_report():
+    """Readiness summary built only from already-computed state"""
+    warmup = _model_warmup
+    capabilities = _capability_registry.snapshot()
+    return {
+        'ready': capabilities is not None and warmup.state in ("ready", "idle"),
+        'model': {
+            'state': warmup.state,
+            'error': warmup.error,
+            'load_seconds': warmup.seconds,
+            'weights': warmup.weights,
+        },
+        'capabilities': capabilities,
+        'caches': {
+            'jobs': _job_executor.stats(),
+            'inference': warmup.server.stats() if warmup.server is not None else None,
+            'cascade': emotion_cascade().stats() if CASCADE_ENABLED and _emotion_cascades is not None else None,
+            'tts': _gtts_fetcher.stats(),
+        },
+        'startup': get_import_report(),
+    }
+
+class _HealthRequestHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        if path in ("/healthz", "/livez"):
+            self._send_json(200, {'status': "ok"})
+        elif path == "/readyz":
+            try:
+                report = readiness_report()
+                self._send_json(200 if report['ready'] else 503, report)
+            except Exception as e:
+                self._send_json(503, {'ready': False, 'error': str(e)})
+        elif path == "/metrics":
+            self._send(200, _tracer.prometheus_text().encode('utf-8'), "text/plain; version=0.0.4")
+        elif path == "/traces":
+            self._send(200, _tracer.export_json().encode('utf-8'), "application/json")
+        else:
+            self._send_json(404, {'error': "not found"})
+    
+    def _send_json(self, status, payload):
+        self._send(status, json.dumps(payload, default=str).encode('utf-8'), "application/json")
+    
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass  # Probes are frequent; don't flood the server log
+
+@st.cache_resource
+def start_health_server(port=HEALTH_PORT, host=HEALTH_HOST):
+    """Start the health endpoint once per process (None when disabled or the port is taken)"""
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _HealthRequestHandler)
+    except OSError as e:
+        warnings.warn(f"Health endpoint could not listen on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, name="eatts-health", daemon=True).start()
+    return server
+
+start_health_server()
+
+# HTTP API
+# The analysis, translation, speech and report pipeline for programmatic
+# clients (an LMS, scripts), on its own port next to the UI. It runs in the
+# same process, so it shares the UI's model, inference server, cascade,
+# TTS fetcher and batch pool. All endpoints take a JSON POST body that is
+# either one document or {"documents": [...]}; a document has 'text', or a
+# 'filename' and base64 'content' (PDF, Word, text) to extract it from.
+#   POST /analyze    - per-sentence emotions and a summary per document
+#   POST /translate  - translated text and sentences per document ('target')
+#   POST /synthesize - one audio track, streamed as it is read from disk
+#   POST /report     - PDF report (a combined one for several documents)
+# Connections are kept alive between requests. Each request runs as an "api"
+# job on the shared job executor, so it counts against EATTS_MAX_JOBS like
+# the UI's jobs. At most EATTS_API_CONCURRENCY requests are in the executor
+# at once; others wait up to EATTS_API_QUEUE_SECONDS for a slot, then get
+# 503. Disabled unless EATTS_API_PORT is set.
+API_PORT = int(os.environ.get("EATTS_API_PORT", "0") or 0)
+API_HOST = os.environ.get("EATTS_API_HOST", "127.0.0.1")
+API_TOKEN = os.environ.get("EATTS_API_TOKEN", "")
+API_CONCURRENCY = int(os.environ.get("EATTS_API_CONCURRENCY", "4"))
+API_QUEUE_SECONDS = float(os.environ.get("EATTS_API_QUEUE_SECONDS", "10"))
+API_MAX_BODY_MB = float(os.environ.get("EATTS_API_MAX_BODY_MB", "20"))
+API_IDLE_SECONDS = 30  # idle keep-alive connections are closed after this
+API_STREAM_CHUNK = 64 * 1024
+API_VOICE_GENDERS = ("female", "male")  # the pyttsx3 voices generate_speech_pyttsx3 picks from
+
+class ApiError(Exception):
+    """Raised while handling an API request to answer it with `status`"""
+    
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def api_classifier(model=None):
+    """The classifier API requests analyze with: a model sessions may pick, behind the cascade"""
+    model_key = resolve_emotion_model(model)[0]
+    if model_key not in emotion_model_choices():
+        raise ApiError(400, f"'model' must be one of: {', '.join(emotion_model_choices())}")
+    server = get_inference_server(model_key)
+    if server is None:
+        raise ApiError(503, "emotion model could not be loaded")
+    return with_cascade(server, model_key)
+
+def api_document_name(document, number):
+    return str(isinstance(document, dict) and (document.get('name') or document.get('filename')) or f"document_{number}")
+
+def api_document_text(document, number):
+    """(name, text) of one request document, extracting uploaded file content"""
+    if not isinstance(document, dict):
+        raise ApiError(400, f"document {number} must be an object")
+    name = api_document_name(document, number)
+    text = document.get('text')
+    if text is None and document.get('content') is not None:
+        try:
+            data = base64.b64decode(document['content'], validate=True)
+        except (TypeError, ValueError):
+            raise ApiError(400, f"{name}: 'content' is not valid base64")
+        upload = BytesIO(data)
+        upload.name = str(document.get('filename') or name)
+        text = extract_text_from_file(upload, bool(document.get('strip_furniture')))
+    if not isinstance(text, str) or not text.strip():
+        raise ApiError(422, f"{name}: no text could be extracted")
+    return name, text
+
+def api_documents(body):
+    """Request documents, numbered from 1; one for a single-document body"""
+    documents = body['documents'] if 'documents' in body else [body]
+    if not isinstance(documents, list) or not documents:
+        raise ApiError(400, "'documents' must be a non-empty list")
+    if len(documents) > BATCH_MAX_FILES:
+        raise ApiError(413, f"at most {BATCH_MAX_FILES} documents per request")
+    return list(enumerate(documents, start=1))
+
+def api_sentences(text):
+    sentences = split_into_sentences(text)
+    if not sentences:
+        raise ApiError(422, "no sentences found")
+    return sentences
+
+def api_each(body, fn):
+    """JSON result of fn(name, text) for a single document, or per document of a batch
+    
+    Like a batch job's files, batch documents run on the shared batch
+    pool; one that can't be processed gets an 'error' entry instead of
+    failing the request.
+    """
+    if 'documents' not in body:
+        name, text = api_document_text(body, 1)
+        return {'name': name, **fn(name, text)}
+    job = current_job()
+    
+    def one(numbered):
+        number, document = numbered
+        with job_context(job):
+            try:
+                name, text = api_document_text(document, number)
+                return {'name': name, **fn(name, text)}
+            except ApiError as e:
+                return {'name': api_document_name(document, number), 'error': str(e)}
+    return {'documents': list(_batch_pool.map(one, api_documents(body)))}
+
+def api_texts(body):
+    """(name, text) of every request document, extracted on the shared batch pool"""
+    job = current_job()
+    
+    def one(numbered):
+        with job_context(job):
+            return api_document_text(numbered[1], numbered[0])
+    return list(_batch_pool.map(one, api_documents(body)))
+
+def api_json(payload):
+    # Scores can be numpy scalars; .item() makes them plain numbers
+    return "application/json", json.dumps(
+        payload, default=lambda value: value.item() if hasattr(value, "item") else str(value)).encode('utf-8')
+
+def api_analyze(body):
+    """POST /analyze - options: 'model'"""
+    classifier = api_classifier(body.get('model'))
+    
+    def analyze(name, text):
+        items = analyze_sentences(api_sentences(text), classifier)
+        matrix = emotion_matrix(items)
+        return {'sentences': items, 'summary': emotion_summary(matrix) if matrix is not None else None}
+    return api_json(api_each(body, analyze))
+
+def api_translate(body):
+    """POST /translate - options: 'target' (required), 'source' (default auto)"""
+    target = body.get('target')
+    if target not in SUPPORTED_LANGUAGES:
+        raise ApiError(400, f"'target' must be one of: {', '.join(SUPPORTED_LANGUAGES)}")
+    source = body.get('source') or 'auto'
+    
+    def translate(name, text):
+        translated, notes = translate_sentences(api_sentences(text), target, source)
+        return {'text': " ".join(translated), 'sentences': translated, 'warnings': [message for _, message in notes]}
+    return api_json(api_each(body, translate))
+
+def api_synthesize(body):
+    """POST /synthesize - options: 'lang', 'slow', 'voice_gender', 'format', 'emotion', 'model'
+    
+    The documents are read as one track in which every sentence keeps its
+    own emotion, or all in the given 'emotion'. Returns the audio file's path.
+    """
+    lang = body.get('lang') or 'en'
+    if lang not in SUPPORTED_LANGUAGES:
+        raise ApiError(400, f"'lang' must be one of: {', '.join(SUPPORTED_LANGUAGES)}")
+    audio_format = body.get('format') or AUDIO_FORMAT
+    if audio_format not in _capability_registry.detect()['audio_formats']:
+        raise ApiError(400, f"'format' must be one of: {', '.join(_capability_registry.detect()['audio_formats'])}")
+    emotion = body.get('emotion')
+    if emotion is not None and emotion not in EMOTION_PARAMS:
+        raise ApiError(400, f"'emotion' must be one of: {', '.join(EMOTION_PARAMS)}")
+    voice_gender = str(body.get('voice_gender') or 'female').lower()
+    if voice_gender not in API_VOICE_GENDERS:
+        raise ApiError(400, f"'voice_gender' must be one of: {', '.join(API_VOICE_GENDERS)}")
+    speech = {
+        'lang': lang,
+        'slow': bool(body.get('slow')),
+        'voice_gender': voice_gender,
+        # Like the UI: pyttsx3 voices English when it is installed, gTTS everything else
+        'use_pyttsx3': PYTTSX3_AVAILABLE and lang == 'en',
+        'prefer_gtts': lang != 'en',
+        'audio_format': audio_format,
+    }
+    texts = [text for _, text in api_texts(body)]
+    if emotion is not None:
+        audio_path = generate_emotional_speech(" ".join(texts), emotion, **speech)
+    else:
+        classifier = api_classifier(body.get('model'))
+        audio_path, _ = speak_items(
+            analyze_sentences([sentence for text in texts for sentence in api_sentences(text)], classifier), speech)
+    if not audio_path:
+        raise ApiError(500, "speech generation failed")
+    return audio_mime(audio_path), audio_path
+
+def api_report(body):
+    """POST /report - options: 'title', 'model'"""
+    if not REPORTLAB_AVAILABLE:
+        raise ApiError(503, "reportlab is not installed")
+    classifier = api_classifier(body.get('model'))
+    documents = [(name, analyze_sentences(api_sentences(text), classifier)) for name, text in api_texts(body)]
+    title = body.get('title')
+    if len(documents) == 1:
+        pdf_bytes = generate_pdf_report(documents[0][1], title or f"Emotion Analysis Report: {documents[0][0]}")
+    else:
+        pdf_bytes = combined_report(documents, title)
+    if not pdf_bytes:
+        raise ApiError(500, "report generation failed")
+    return "application/pdf", pdf_bytes
+
+def run_api_job(job, path, body):
+    """Job: answer one API request with (content type, payload), or the ApiError to answer with"""
+    try:
+        with trace_span("api" + path.replace("/", ".")):
+            return API_ENDPOINTS[path](body)
+    except ApiError as e:
+        return e
+    except Exception as e:
+        return ApiError(500, str(e))
+
+API_ENDPOINTS = {
+    "/analyze": api_analyze,
+    "/translate": api_translate,
+    "/synthesize": api_synthesize,
+    "/report": api_report,
+}
+
+class _ApiRequestHandler(BaseHTTPRequestHandler):
+    # HTTP/1.1 keeps connections open between requests; every response
+    # carries a Content-Length or is chunked, so clients can reuse them
+    protocol_version = "HTTP/1.1"
+    timeout = API_IDLE_SECONDS
+    
+    def do_GET(self):
+        path = self.path.split('?', 1)[0]
+        self._send_error(405 if path in API_ENDPOINTS else 404, "use POST" if path in API_ENDPOINTS else "not found")
+    
+    def do_POST(self):
+        path = self.path.split('?', 1)[0]
+        try:
+            if path not in API_ENDPOINTS:
+                raise ApiError(404, "not found")
+            if API_TOKEN and not hmac.compare_digest(self.headers.get("Authorization", ""), f"Bearer {API_TOKEN}"):
+                raise ApiError(401, "missing or wrong bearer token")
+            body = self._read_json()
+            if not self.server.slots.acquire(timeout=API_QUEUE_SECONDS):
+                raise ApiError(503, "too many requests in progress, retry later")
+            try:
+                # Each request is its own job session, so only EATTS_MAX_JOBS
+                # and the request slots limit how many run at once
+                job = _job_executor.submit("api", f"api-{uuid.uuid4().hex}", run_api_job, path, body, label=path)
+                job.wait()
+                _job_executor.pop(job.id)
+            finally:
+                self.server.slots.release()
+            if job.status != "done":
+                raise ApiError(500, job.message)
+            if isinstance(job.result, ApiError):
+                raise job.result
+            content_type, payload = job.result
+        except ApiError as e:
+            self._send_error(e.status, str(e))
+            return
+        except Exception as e:
+            self._send_error(500, str(e))
+            return
+        if isinstance(payload, bytes):
+            self._send(200, payload, content_type)
+        else:
+            self._stream_file(payload, content_type)
+    
+    def _read_json(self):
+        """The request's JSON object; the connection is closed when the body is left unread"""
+        length = self.headers.get("Content-Length")
+        if length is None or not length.isdigit():
+            self.close_connection = True
+            raise ApiError(411, "a Content-Length header is required")
+        if int(length) > API_MAX_BODY_MB * 1024 * 1024:
+            self.close_connection = True
+            raise ApiError(413, f"request bodies are limited to {API_MAX_BODY_MB:g} MB")
+        try:
+            body = json.loads(self.rfile.read(int(length)) or b"{}")
+        except ValueError as e:
+            raise ApiError(400, f"invalid JSON: {e}")
+        if not isinstance(body, dict):
+            raise ApiError(400, "the request body must be a JSON object")
+        return body
+    
+    def _send_error(self, status, message):
+        if status in (401, 404, 405):
+            self.close_connection = True  # the body, if any, was not read
+        content_type, body = api_json({'error': message})
+        self._send(status, body, content_type)
+    
+    def _send(self, status, body, content_type):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", "no-store")
+        if status == 503:
+            self.send_header("Retry-After", "1")
+        if self.close_connection:
+            self.send_header("Connection", "close")
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def _stream_file(self, path, content_type):
+        """Send a generated file in chunks as it is read, then delete it"""
+        try:
+            self.send_response(200)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Disposition", f'attachment; filename="speech{os.path.splitext(path)[1]}"')
+            self.send_header("Transfer-Encoding", "chunked")
+            self.send_header("Cache-Control", "no-store")
+            self.end_headers()
+            with open(path, 'rb') as f:
+                for chunk in iter(lambda: f.read(API_STREAM_CHUNK), b""):
+                    self.wfile.write(b"%x\r\n%s\r\n" % (len(chunk), chunk))
+            self.wfile.write(b"0\r\n\r\n")
+        except OSError:
+            self.close_connection = True  # client went away mid-stream
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+@st.cache_resource
+def start_api_server(port=API_PORT, host=API_HOST):
+    """Start the HTTP API once per process (None when disabled or the port is taken)"""
+    if not port:
+        return None
+    try:
+        server = ThreadingHTTPServer((host, port), _ApiRequestHandler)
+    except OSError as e:
+        warnings.warn(f"HTTP API could not listen on {host}:{port}: {e}")
+        return None
+    server.daemon_threads = True
+    # Request slots live with the server, so script reruns don't reset them
+    server.slots = threading.BoundedSemaphore(max(1, API_CONCURRENCY))
+    threading.Thread(target=server.serve_forever, name="eatts-api", daemon=True).start()
+    return server
+
+start_api_server()
+
+# Record the cold-start cost once per process and flag it when it blows the budget
+if STARTUP_TIMING_KEY not in _import_timings:
+    _import_timings[STARTUP_TIMING_KEY] = time.perf_counter() - _APP_IMPORT_STARTED
+    if _import_timings[STARTUP_TIMING_KEY] * 1000 > IMPORT_BUDGET_MS:
+        warnings.warn(
+            f"App startup took {_import_timings[STARTUP_TIMING_KEY] * 1000:.0f} ms "
+            f"(budget {IMPORT_BUDGET_MS:.0f} ms)"
+        )
+
+def run():
+    """Render one script run of the app"""
+    configure_page()
+    try:
+        start_model_warmup()
+        main()
+    except Exception as e:
+        # Ensure app doesn't crash completely - show error to user
+        st.error(f"An error occurred: {str(e)}")
+        st.info("Please refresh the page or check the logs for more details.")
+        import traceback
+        st.code(traceback.format_exc())
 
 if __name__ == "__main__":
     import sys
@@ -1694,12 +5687,5 @@ if __name__ == "__main__":
         print("\nRunning with 'python app.py' will cause errors.")
         print("="*60 + "\n")
         sys.exit(1)
-    try:
-        main()
-    except Exception as e:
-        # Ensure app doesn't crash completely - show error to user
-        st.error(f"An error occurred: {str(e)}")
-        st.info("Please refresh the page or check the logs for more details.")
-        import traceback
-        st.code(traceback.format_exc())
+    run()
 
@@ -0,0 +1,596 @@
+#!/usr/bin/env python3
+"""
+Benchmark Suite
+Times every pipeline stage of the app offline and compares the results
+against a stored baseline, so regressions show up before deployment.
+
+Network backends are replaced by local stand-ins: the translator returns
+a tagged copy of its input and the emotion model is a stub with a fixed
+per-call and per-sentence cost (pass --model to use the real one).
+
+Usage:
+    python benchmark.py                       # run everything, write benchmark_results.json
+    python benchmark.py --quick               # small fixtures, fewer repetitions
+    python benchmark.py --only pdf,docx       # cases whose name contains any of these
+    python benchmark.py --save-baseline       # store this run as the baseline
+    python benchmark.py --baseline benchmark_baseline.json --tolerance 0.2
+"""
+
+import argparse
+import base64
+import gc
+import json
+import logging
+import os
+import platform
+import sys
+import threading
+import time
+import types
+from datetime import datetime
+from io import BytesIO
+
+DEFAULT_OUTPUT = "benchmark_results.json"
+DEFAULT_BASELINE = "benchmark_baseline.json"
+
+SAMPLE_SENTENCES = [
+    "The discovery of gravity was a momentous occasion in scientific history.",
+    "Scientists were thrilled!",
+    "However, the initial reactions were mixed with surprise and curiosity.",
+    "Some researchers felt anxious about the implications.",
+    "The loss was devastating.",
+    "Everyone felt the weight of disappointment.",
+    "Congratulations, you've won the grand prize!",
+    "Photosynthesis converts light energy into chemical energy.",
+]
+
+# Explanatory sentences, as most of a lecture or textbook reads; the
+# cascade should answer nearly all of them without the model
+COURSE_SENTENCES = [
+    "Photosynthesis converts light energy into chemical energy.",
+    "The table lists the results of each trial.",
+    "The mitochondria produce most of the cell's supply of ATP.",
+    "Multiply both sides of the equation by the same number.",
+    "The treaty was signed in 1648 and ended thirty years of war.",
+    "Read chapter four before the next class.",
+    "Light travels faster than sound.",
+    "Each group should choose one experiment and record the results.",
+    "A prime number has exactly two divisors.",
+    "The river carries sediment from the mountains to the sea.",
+    "This section explains how the immune system recognizes a virus.",
+    "Scientists were thrilled!",
+]
+
+STUB_LABELS = ["neutral", "joy", "surprise", "fear", "sadness", "anger", "love"]
+
+# Local stand-ins for network backends
+
+class StubGoogleTranslator:
+    """Offline replacement for deep_translator.GoogleTranslator"""
+
+    latency_s = 0.0
+
+    def __init__(self, source='auto', target='en'):
+        self.source = source
+        self.target = target
+
+    def translate(self, text):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return f"[{self.target}] {text}"
+
+
+class StubClassifier:
+    """Emotion pipeline stand-in with a fixed per-call and per-sentence cost
+
+    Mirrors the transformers pipeline output shapes: a string returns
+    [{'label', 'score'}], a list returns one dict per input.
+    """
+
+    def __init__(self, call_overhead_ms=8.0, per_text_ms=2.0):
+        self.call_overhead_s = call_overhead_ms / 1000
+        self.per_text_s = per_text_ms / 1000
+
+    def _label(self, text):
+        return {'label': STUB_LABELS[len(text) % len(STUB_LABELS)], 'score': 0.9}
+
+    def __call__(self, inputs, **kwargs):
+        texts = [inputs] if isinstance(inputs, str) else list(inputs)
+        _busy_wait(self.call_overhead_s + self.per_text_s * len(texts))
+        outputs = [self._label(text) for text in texts]
+        return outputs if not isinstance(inputs, str) else outputs[:1]
+
+
+def _busy_wait(seconds):
+    """Spin instead of sleeping so the stub costs CPU like a real model"""
+    end = time.perf_counter() + seconds
+    while time.perf_counter() < end:
+        pass
+
+
+class StubTTSSession:
+    """Offline stand-in for the requests.Session the gTTS fetcher sends parts over
+
+    Answers every request after `latency_s` with a gTTS-shaped response
+    carrying a few bytes of fake audio.
+    """
+
+    latency_s = 0.0
+    body = ')]}\'\n\n[["wrb.fr","jQ1olc","[\\"%s\\"]",null]]' % base64.b64encode(b"\xff\xf3" * 64).decode()
+
+    def send(self, prepared, **kwargs):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        return types.SimpleNamespace(text=self.body, raise_for_status=lambda: None)
+
+
+def install_stub_backends(network_latency_ms):
+    """Put the offline translator in place before app is imported"""
+    StubGoogleTranslator.latency_s = network_latency_ms / 1000
+    stub = types.ModuleType("deep_translator")
+    stub.GoogleTranslator = StubGoogleTranslator
+    sys.modules["deep_translator"] = stub
+
+
+def import_app():
+    """Import app.py in bare mode without starting its background services"""
+    os.environ["EATTS_HEALTH_PORT"] = "0"
+    os.environ["EATTS_MODEL_WARMUP"] = "0"
+    # Streamlit warns about the missing ScriptRunContext on every cached call
+    import streamlit.logger
+    streamlit.logger.set_log_level(logging.ERROR)
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import app
+    return app
+
+# Measurement
+
+class RssSampler:
+    """Track the peak resident set size while a block runs"""
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def current_rss():
+        """Resident set size in bytes, or None if it cannot be read"""
+        try:
+            with open("/proc/self/statm") as f:
+                return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError, AttributeError):
+            pass
+        try:
+            import psutil
+            return psutil.Process().memory_info().rss
+        except Exception:
+            return None
+
+    def _sample(self):
+        rss = self.current_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+
+
+def percentile(values, pct):
+    """Linear-interpolated percentile of a non-empty list"""
+    ordered = sorted(values)
+    if len(ordered) == 1:
+        return ordered[0]
+    rank = (len(ordered) - 1) * pct / 100
+    low = int(rank)
+    high = min(low + 1, len(ordered) - 1)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def measure(name, fn, items, repeat, params=None):
+    """Run fn() `repeat` times after one warm-up call and summarize the timings
+
+    `items` is the amount of work one call does (sentences, pages, rows,
+    seconds of audio) and is used for throughput.
+    """
+    fn()
+    gc.collect()
+    latencies = []
+    with RssSampler() as sampler:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            fn()
+            latencies.append(time.perf_counter() - started)
+    total = sum(latencies)
+    return {
+        'name': name,
+        'params': params or {},
+        'repeat': repeat,
+        'items_per_call': items,
+        'throughput_per_s': items * repeat / total if total > 0 else None,
+        'p50_ms': percentile(latencies, 50) * 1000,
+        'p95_ms': percentile(latencies, 95) * 1000,
+        'peak_rss_mb': sampler.peak / (1024 * 1024) if sampler.peak is not None else None,
+    }
+
+# Fixtures
+
+def make_text(sentence_count, sentences=SAMPLE_SENTENCES):
+    return " ".join(sentences[i % len(sentences)] for i in range(sentence_count))
+
+
+def make_pdf_fixture(pages, lines_per_page=40):
+    """Build a text PDF with the given number of pages using reportlab"""
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfgen import canvas
+
+    buffer = BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4)
+    _, height = A4
+    for page in range(pages):
+        y = height - 60
+        for line in range(lines_per_page):
+            pdf.drawString(60, y, SAMPLE_SENTENCES[(page + line) % len(SAMPLE_SENTENCES)])
+            y -= 18
+        pdf.showPage()
+    pdf.save()
+    return buffer.getvalue()
+
+
+def make_docx_fixture(pages, paragraphs_per_page=40):
+    """Build a DOCX with a page break after every `paragraphs_per_page` paragraphs"""
+    import docx
+
+    document = docx.Document()
+    for page in range(pages):
+        for line in range(paragraphs_per_page):
+            document.add_paragraph(SAMPLE_SENTENCES[(page + line) % len(SAMPLE_SENTENCES)])
+        document.add_page_break()
+    buffer = BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def make_emotion_rows(count):
+    return [
+        {'sentence': SAMPLE_SENTENCES[i % len(SAMPLE_SENTENCES)],
+         'emotion': STUB_LABELS[i % len(STUB_LABELS)],
+         'score': 0.5 + (i % 50) / 100}
+        for i in range(count)
+    ]
+
+
+def make_tone(seconds, frame_rate=24000):
+    """Mono 16-bit sine tone as a pydub AudioSegment"""
+    import numpy as np
+    from pydub import AudioSegment
+
+    t = np.arange(int(seconds * frame_rate)) / frame_rate
+    samples = (np.sin(2 * np.pi * 220 * t) * 8000).astype(np.int16)
+    return AudioSegment(samples.tobytes(), frame_rate=frame_rate, sample_width=2, channels=1)
+
+# Cases
+
+def bench_split(app, sizes, repeat):
+    results = []
+    for count in sizes['sentences']:
+        text = make_text(count)
+        results.append(measure(
+            f"split_into_sentences[{count}]",
+            lambda: app.split_into_sentences(text),
+            count, repeat * 5, {'sentences': count},
+        ))
+    return results
+
+
+def bench_emotion(app, sizes, repeat, classifier):
+    results = []
+    count = sizes['emotion_sentences']
+    sentences = app.split_into_sentences(make_text(count))
+    results.append(measure(
+        f"detect_emotion.per_sentence[{count}]",
+        lambda: [app.detect_emotion(s, classifier) for s in sentences],
+        count, repeat, {'sentences': count},
+    ))
+    results.append(measure(
+        f"detect_emotions.batched[{count}]",
+        lambda: app.detect_emotions(sentences, classifier),
+        count, repeat, {'sentences': count},
+    ))
+    # Lexicon first tier; the model only sees the sentences it escalates.
+    # Course text is mostly explanation, which the first tier answers itself.
+    course = app.split_into_sentences(make_text(count, COURSE_SENTENCES))
+    results.append(measure(
+        f"detect_emotions.batched.course[{count}]",
+        lambda: app.detect_emotions(course, classifier),
+        count, repeat, {'sentences': count},
+    ))
+    for name, texts in (("cascade", sentences), ("cascade.course", course)):
+        cascade = app.EmotionCascade()
+        result = measure(
+            f"detect_emotions.{name}[{count}]",
+            lambda: app.detect_emotions(texts, lambda batch, **kwargs: cascade(batch, model=classifier, **kwargs)),
+            count, repeat, {'sentences': count},
+        )
+        stats = cascade.stats()
+        result['params'].update(escalation_rate=stats['escalation_rate'], model_share=stats['model_share'],
+                                audit_agreement=stats['audit_agreement'])
+        results.append(result)
+    # Smoothing, hysteresis and the document summary reuse one pass's probability matrix
+    _, matrix = app.detect_emotion_matrix(sentences, classifier)
+    results.append(measure(
+        f"emotion_matrix.smoothing[{count}]",
+        lambda: (app.hysteresis_labels(app.smooth_probabilities(matrix, 5), 0.1), app.emotion_summary(matrix)),
+        count, repeat * 5, {'sentences': count, 'window': 5, 'margin': 0.1},
+    ))
+    return results
+
+
+def bench_translate(app, sizes, repeat):
+    count = sizes['translate_sentences']
+    sentences = app.split_into_sentences(make_text(count))
+    return [measure(
+        f"translate_text[{count}]",
+        lambda: [app.translate_text(s, target_lang='es', source_lang='en') for s in sentences],
+        count, repeat, {'sentences': count, 'network_latency_ms': StubGoogleTranslator.latency_s * 1000},
+    )]
+
+
+def bench_tts_fetch(app, sizes, repeat):
+    if not app.GTTS_AVAILABLE:
+        print("⚠️  gTTS not available - skipping TTS fetch benchmarks")
+        return []
+    count = sizes['tts_sentences']
+    text = make_text(count)
+    # Each part is a round trip, so use a realistic latency even when none was given
+    StubTTSSession.latency_s = max(StubGoogleTranslator.latency_s, 0.02)
+    results = []
+    for concurrency in sorted({1, app.GTTS_CONCURRENCY}):
+        fetcher = app.GTTSFetcher(concurrency=concurrency)
+        fetcher._session = StubTTSSession
+        results.append(measure(
+            f"gtts_fetch.x{concurrency}[{count}]",
+            lambda: fetcher.synthesize(text, 'en'),
+            count, _scaled_repeat(repeat, count),
+            {'sentences': count, 'concurrency': concurrency, 'network_latency_ms': StubTTSSession.latency_s * 1000},
+        ))
+    return results
+
+
+def bench_effects(app, sizes, repeat):
+    if not app._get_pydub()['available']:
+        print("⚠️  pydub not available - skipping effects benchmarks")
+        return []
+    results = []
+    for seconds in sizes['audio_seconds']:
+        audio = make_tone(seconds)
+        for emotion in ("neutral", "joy", "sadness"):
+            results.append(measure(
+                f"apply_emotion_effects.{emotion}[{seconds}s]",
+                lambda: app.apply_emotion_effects(audio, emotion),
+                seconds, repeat, {'audio_seconds': seconds, 'emotion': emotion},
+            ))
+    return results
+
+
+def bench_pdf_extraction(app, sizes, repeat):
+    if not (app.PDFPLUMBER_AVAILABLE or app.PYPDF2_AVAILABLE) or not app.REPORTLAB_AVAILABLE:
+        print("⚠️  PDF libraries not available - skipping PDF extraction benchmarks")
+        return []
+    results = []
+    for pages in sizes['pages']:
+        data = make_pdf_fixture(pages)
+        results.append(measure(
+            f"extract_text_from_pdf[{pages}p]",
+            lambda: app.extract_text_from_pdf(data, "fixture.pdf"),
+            pages, _scaled_repeat(repeat, pages), {'pages': pages, 'bytes': len(data)},
+        ))
+    return results
+
+
+def bench_docx_extraction(app, sizes, repeat):
+    if not app.DOCX_AVAILABLE:
+        print("⚠️  python-docx not available - skipping DOCX extraction benchmarks")
+        return []
+    results = []
+    for pages in sizes['pages']:
+        data = make_docx_fixture(pages)
+        results.append(measure(
+            f"extract_text_from_docx[{pages}p]",
+            lambda: app.extract_text_from_docx(data, "fixture.docx"),
+            pages, _scaled_repeat(repeat, pages), {'pages': pages, 'bytes': len(data)},
+        ))
+    return results
+
+
+def bench_report(app, sizes, repeat):
+    if not app.REPORTLAB_AVAILABLE:
+        print("⚠️  reportlab not available - skipping report benchmarks")
+        return []
+    results = []
+    for rows in sizes['report_rows']:
+        data = make_emotion_rows(rows)
+        results.append(measure(
+            f"generate_pdf_report[{rows}rows]",
+            lambda: app.generate_pdf_report(data),
+            rows, _scaled_repeat(repeat, rows // 10), {'rows': rows},
+        ))
+    return results
+
+
+def _scaled_repeat(repeat, size):
+    """Fewer repetitions for the big fixtures so a full run stays in minutes"""
+    if size >= 1000:
+        return max(1, repeat // 5)
+    if size >= 100:
+        return max(2, repeat // 2)
+    return repeat
+
+# Baseline comparison
+
+def compare(results, baseline, tolerance, rss_tolerance):
+    """Return (case name, message) for every regression beyond the tolerances"""
+    previous = {case['name']: case for case in baseline.get('cases', [])}
+    regressions = []
+    for case in results['cases']:
+        old = previous.get(case['name'])
+        if old is None:
+            print(f"🆕 {case['name']}: no baseline")
+            continue
+        problems = []
+        if old.get('p95_ms') and case['p95_ms'] > old['p95_ms'] * (1 + tolerance):
+            problems.append(f"p95 {old['p95_ms']:.2f} -> {case['p95_ms']:.2f} ms")
+        if old.get('throughput_per_s') and case['throughput_per_s'] is not None \
+                and case['throughput_per_s'] < old['throughput_per_s'] * (1 - tolerance):
+            problems.append(f"throughput {old['throughput_per_s']:.1f} -> {case['throughput_per_s']:.1f}/s")
+        if old.get('peak_rss_mb') and case['peak_rss_mb'] is not None \
+                and case['peak_rss_mb'] > old['peak_rss_mb'] * (1 + rss_tolerance):
+            problems.append(f"peak RSS {old['peak_rss_mb']:.0f} -> {case['peak_rss_mb']:.0f} MB")
+        if problems:
+            print(f"❌ {case['name']}: " + "; ".join(problems))
+            regressions.extend((case['name'], problem) for problem in problems)
+        else:
+            print(f"✅ {case['name']}")
+    return regressions
+
+
+def environment_info():
+    return {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+    }
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the EA-TTS pipeline stages offline")
+    parser.add_argument("--quick", action="store_true", help="small fixtures and fewer repetitions")
+    parser.add_argument("--only", default="", help="comma-separated substrings of case names to run")
+    parser.add_argument("--repeat", type=int, default=10, help="timed repetitions per case (default 10)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help=f"results file (default {DEFAULT_OUTPUT})")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help=f"baseline file (default {DEFAULT_BASELINE})")
+    parser.add_argument("--save-baseline", action="store_true", help="write this run to the baseline file")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="allowed p95 latency / throughput change before failing (default 0.2 = 20%%)")
+    parser.add_argument("--rss-tolerance", type=float, default=0.25,
+                        help="allowed peak RSS growth before failing (default 0.25 = 25%%)")
+    parser.add_argument("--network-latency-ms", type=float, default=0.0,
+                        help="simulated round trip for the stub translator")
+    parser.add_argument("--model-call-ms", type=float, default=8.0, help="stub model cost per call")
+    parser.add_argument("--model-text-ms", type=float, default=2.0, help="stub model cost per sentence")
+    parser.add_argument("--model", action="store_true", help="use the real emotion model instead of the stub")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print("=" * 60)
+    print("EA-TTS Benchmark Suite")
+    print("=" * 60)
+    print()
+
+    install_stub_backends(args.network_latency_ms)
+    app = import_app()
+
+    if args.model:
+        classifier = app.load_emotion_model()
+        if classifier is None:
+            print("❌ Emotion model could not be loaded")
+            return 1
+    else:
+        classifier = StubClassifier(args.model_call_ms, args.model_text_ms)
+
+    if args.quick:
+        sizes = {'sentences': [100, 1000], 'emotion_sentences': 64, 'translate_sentences': 32, 'tts_sentences': 32,
+                 'audio_seconds': [2], 'pages': [10, 100], 'report_rows': [10, 100]}
+        repeat = max(1, args.repeat // 3)
+    else:
+        sizes = {'sentences': [100, 1000, 10000], 'emotion_sentences': 256, 'translate_sentences': 128, 'tts_sentences': 128,
+                 'audio_seconds': [5, 30], 'pages': [10, 100, 1000], 'report_rows': [10, 100, 1000]}
+        repeat = args.repeat
+
+    suites = [
+        ("split", lambda: bench_split(app, sizes, repeat)),
+        ("emotion", lambda: bench_emotion(app, sizes, repeat, classifier)),
+        ("translate", lambda: bench_translate(app, sizes, repeat)),
+        ("tts", lambda: bench_tts_fetch(app, sizes, repeat)),
+        ("effects", lambda: bench_effects(app, sizes, repeat)),
+        ("pdf", lambda: bench_pdf_extraction(app, sizes, repeat)),
+        ("docx", lambda: bench_docx_extraction(app, sizes, repeat)),
+        ("report", lambda: bench_report(app, sizes, repeat)),
+    ]
+    only = [name.strip() for name in args.only.split(",") if name.strip()]
+
+    cases = []
+    for suite, run_suite in suites:
+        if only and not any(name in suite for name in only):
+            continue
+        print(f"⏱️  {suite}...")
+        for case in run_suite():
+            rss = f"{case['peak_rss_mb']:.0f} MB" if case['peak_rss_mb'] is not None else "n/a"
+            print(f"   {case['name']:<42} p50 {case['p50_ms']:9.2f} ms  p95 {case['p95_ms']:9.2f} ms  "
+                  f"{case['throughput_per_s']:10.1f}/s  RSS {rss}")
+            cases.append(case)
+
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment_info(),
+        'settings': {
+            'quick': args.quick,
+            'repeat': repeat,
+            'classifier': 'model' if args.model else 'stub',
+            'model_call_ms': args.model_call_ms,
+            'model_text_ms': args.model_text_ms,
+            'network_latency_ms': args.network_latency_ms,
+        },
+        'cases': cases,
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print()
+    print(f"📄 Results written to {args.output}")
+
+    if args.save_baseline:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump(results, f, indent=2)
+        print(f"📌 Baseline saved to {args.baseline}")
+        return 0
+
+    if not os.path.exists(args.baseline):
+        print(f"ℹ️  No baseline at {args.baseline} - run with --save-baseline to create one")
+        return 0
+
+    with open(args.baseline, 'r', encoding='utf-8') as f:
+        baseline = json.load(f)
+    print()
+    print(f"📊 Comparing against {args.baseline} ({baseline.get('created', 'unknown date')})")
+    if baseline.get('environment') != results['environment']:
+        print("⚠️  Baseline was recorded on a different machine or Python - timings may not be comparable")
+    if baseline.get('settings') != results['settings']:
+        print("⚠️  Baseline used different benchmark settings")
+    regressions = compare(results, baseline, args.tolerance, args.rss_tolerance)
+
+    print()
+    print("=" * 60)
+    if regressions:
+        print(f"❌ {len(regressions)} regression(s) beyond tolerance")
+        return 1
+    print("✅ No regressions against the baseline")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,54 @@
+"""
+ID3 Chapters
+Writes the ID3v2.3 tag that gives an MP3 a table of contents: a CTOC
+frame listing one CHAP frame per chapter, each with its start and end
+time and a TIT2 title. Podcast players and audiobook apps show these as
+chapters and seek to them.
+
+app.py puts the tag in front of the bundled per-sentence track and the
+audiobook export, replacing any tag the encoder wrote, and strips the
+tags of the chapter files it joins behind it.
+"""
+
+import struct
+
+
+def _frame(frame_id, payload):
+    return frame_id.encode("ascii") + struct.pack(">IH", len(payload), 0) + payload
+
+
+def _text(text):
+    # Encoding 1 is UTF-16 with a BOM, the only Unicode encoding ID3v2.3 has
+    return b"\x01" + text.encode("utf-16") + b"\x00\x00"
+
+
+def chapter_tag(chapters):
+    """ID3v2.3 tag with a table of contents and one CHAP frame per (start_ms, end_ms, title)"""
+    element_ids = [f"ch{i}".encode("ascii") for i in range(len(chapters))]
+    frames = [_frame(
+        "CTOC",
+        b"toc\x00" + bytes([0x03, len(chapters)]) + b"".join(element_id + b"\x00" for element_id in element_ids)
+    )]
+    for element_id, (start_ms, end_ms, title) in zip(element_ids, chapters):
+        frames.append(_frame(
+            "CHAP",
+            element_id + b"\x00" + struct.pack(">IIII", int(start_ms), int(end_ms), 0xFFFFFFFF, 0xFFFFFFFF)
+            + _frame("TIT2", _text(title))
+        ))
+    body = b"".join(frames)
+    size = len(body)
+    syncsafe = bytes([(size >> 21) & 0x7f, (size >> 14) & 0x7f, (size >> 7) & 0x7f, size & 0x7f])
+    return b"ID3\x03\x00\x00" + syncsafe + body
+
+
+def tag_length(header):
+    """Bytes taken by the ID3v2 tag that `header` (at least 10 bytes) starts with, or 0"""
+    if header[:3] != b"ID3" or len(header) < 10:
+        return 0
+    size = (header[6] & 0x7f) << 21 | (header[7] & 0x7f) << 14 | (header[8] & 0x7f) << 7 | (header[9] & 0x7f)
+    return 10 + size + (10 if header[5] & 0x10 else 0)
+
+
+def strip_tag(data):
+    """MP3 data without its leading ID3v2 tag"""
+    return data[tag_length(data):]
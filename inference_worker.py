@@ -0,0 +1,364 @@
+#!/usr/bin/env python3
+"""
+Inference Worker Pool
+Runs the emotion model in N separate processes, each pinned to its own
+set of CPU cores with its own torch thread count, and shards a
+document's sentences across them. Results come back in input order, so
+the pool is a drop-in replacement for the transformers pipeline.
+
+app.py uses it when EATTS_INFERENCE_WORKERS is above 0. Workers are
+started as `python inference_worker.py --worker ...` and connect back over
+an authenticated local socket. multiprocessing's spawn would re-import
+the parent's __main__, which under `streamlit run` is app.py itself, so
+this module must not import streamlit or app.
+
+Tuning (finds the best process/thread split for this host):
+    python inference_worker.py --tune
+    python inference_worker.py --tune --sentences 1024 --max-workers 8
+"""
+
+import argparse
+import os
+import re
+import secrets
+import subprocess
+import sys
+import threading
+import time
+from multiprocessing.connection import Client, Listener
+
+import model_weights
+
+DEFAULT_MODEL = "j-hartmann/emotion-english-distilroberta-base"
+WORKER_START_TIMEOUT = float(os.environ.get("EATTS_INFERENCE_WORKER_START_TIMEOUT", "300"))
+AUTHKEY_ENV = "EATTS_INFERENCE_AUTHKEY"
+
+def available_cores():
+    """CPU ids this process may run on"""
+    if hasattr(os, "sched_getaffinity"):
+        return sorted(os.sched_getaffinity(0))
+    return list(range(os.cpu_count() or 1))
+
+
+def partition_cores(workers, threads, cores=None):
+    """Disjoint core sets, one per worker, or None per worker when they don't fit
+
+    Pinning only helps when every worker gets cores of its own; on
+    oversubscribed hosts the OS scheduler does better unpinned.
+    """
+    cores = available_cores() if cores is None else list(cores)
+    if workers * threads > len(cores) or not hasattr(os, "sched_setaffinity"):
+        return [None] * workers
+    return [cores[i * threads:(i + 1) * threads] for i in range(workers)]
+
+
+def split_shards(count, shards):
+    """Contiguous (start, end) ranges splitting `count` items over at most `shards` parts"""
+    shards = max(1, min(shards, count))
+    size, extra = divmod(count, shards)
+    ranges = []
+    start = 0
+    for i in range(shards):
+        end = start + size + (1 if i < extra else 0)
+        ranges.append((start, end))
+        start = end
+    return ranges
+
+# Worker process
+
+def _load_pipeline(model_name):
+    # Workers map the same weights file, so N workers cost one copy of the weights
+    return model_weights.load_pipeline(model_name, top_k=None, device=-1)
+
+
+def format_address(address):
+    return f"{address[0]}:{address[1]}" if isinstance(address, tuple) else address
+
+
+def parse_address(text):
+    match = re.fullmatch(r"([\d.]+):(\d+)", text)
+    return (match.group(1), int(match.group(2))) if match else text
+
+
+def worker_main(address, model_name, cores, threads):
+    """Entry point of one worker process: connect, load the model, then classify on request"""
+    conn = Client(parse_address(address), authkey=bytes.fromhex(os.environ.pop(AUTHKEY_ENV)))
+    try:
+        if cores:
+            os.sched_setaffinity(0, cores)
+        import torch
+        torch.set_num_threads(threads)
+        try:
+            torch.set_num_interop_threads(1)
+        except RuntimeError:
+            pass  # Already set by an earlier parallel call
+        started = time.perf_counter()
+        classifier = _load_pipeline(model_name)
+        conn.send(("ready", {
+            'pid': os.getpid(),
+            'cores': cores,
+            'threads': torch.get_num_threads(),
+            'load_seconds': time.perf_counter() - started,
+            'weights': model_weights.sharing_report(),
+        }))
+    except Exception as e:
+        conn.send(("error", f"{type(e).__name__}: {e}"))
+        return
+
+    while True:
+        try:
+            message = conn.recv()
+        except (EOFError, OSError):
+            return
+        if message[0] == "stop":
+            conn.close()
+            return
+        _, texts, kwargs = message
+        try:
+            conn.send(("ok", classifier(texts, **kwargs)))
+        except Exception as e:
+            conn.send(("error", f"{type(e).__name__}: {e}"))
+
+# Parent side
+
+class InferenceWorkerPool:
+    """Shards classification calls across pinned worker processes
+
+    Callable like the pipeline: pool(texts, **kwargs) returns one output
+    per text, in order. Calls are serialized; each one keeps every worker
+    busy with its own contiguous shard.
+    """
+
+    def __init__(self, model_name=DEFAULT_MODEL, workers=2, threads=None, start_timeout=WORKER_START_TIMEOUT):
+        self.model_name = model_name
+        self.workers = max(1, workers)
+        self.threads = max(1, threads or len(available_cores()) // self.workers)
+        self.start_timeout = start_timeout
+        self.core_sets = partition_cores(self.workers, self.threads)
+        self.info = [None] * self.workers
+        self._authkey = secrets.token_bytes(32)
+        self._listener = Listener(authkey=self._authkey)
+        self._processes = [None] * self.workers
+        self._conns = [None] * self.workers
+        self._lock = threading.Lock()
+        try:
+            for i in range(self.workers):
+                self._start(i)
+            for i in range(self.workers):
+                self._await_ready(i)
+        except Exception:
+            self.close()
+            raise
+
+    def _start(self, index):
+        cores = self.core_sets[index]
+        command = [
+            sys.executable, os.path.abspath(__file__), "--worker",
+            "--connect", format_address(self._listener.address),
+            "--model", self.model_name,
+            "--threads", str(self.threads),
+            "--cores", ",".join(str(core) for core in cores) if cores else "",
+        ]
+        env = dict(os.environ)
+        env[AUTHKEY_ENV] = self._authkey.hex()
+        # Thread pools read these when torch is first imported
+        for var in ("OMP_NUM_THREADS", "MKL_NUM_THREADS", "OPENBLAS_NUM_THREADS"):
+            env[var] = str(self.threads)
+        env.setdefault("TOKENIZERS_PARALLELISM", "false")
+        process = subprocess.Popen(command, env=env)
+        self._processes[index] = process
+        self._conns[index] = self._accept(process)
+
+    def _accept(self, process):
+        """Wait for a started worker to connect back (accept() itself has no timeout)"""
+        result = {}
+
+        def accept():
+            try:
+                result['conn'] = self._listener.accept()
+            except Exception as e:
+                result['error'] = e
+
+        thread = threading.Thread(target=accept, daemon=True)
+        thread.start()
+        deadline = time.monotonic() + self.start_timeout
+        while thread.is_alive():
+            thread.join(0.2)
+            if thread.is_alive() and process.poll() is not None:
+                raise RuntimeError(f"inference worker exited with code {process.returncode} before connecting")
+            if thread.is_alive() and time.monotonic() > deadline:
+                raise RuntimeError(f"inference worker did not connect within {self.start_timeout:.0f} s")
+        if 'error' in result:
+            raise RuntimeError(f"inference worker could not connect: {result['error']}")
+        return result['conn']
+
+    def _await_ready(self, index):
+        conn = self._conns[index]
+        if not conn.poll(self.start_timeout):
+            raise RuntimeError(f"inference worker {index} did not start within {self.start_timeout:.0f} s")
+        status, payload = conn.recv()
+        if status != "ready":
+            raise RuntimeError(f"inference worker {index} failed to load the model: {payload}")
+        self.info[index] = payload
+
+    def _ensure_alive(self):
+        """Replace workers that died (e.g. killed by the OOM killer)"""
+        for i, process in enumerate(self._processes):
+            if process is None or process.poll() is not None:
+                if self._conns[i] is not None:
+                    self._conns[i].close()
+                self._start(i)
+                self._await_ready(i)
+
+    def __call__(self, inputs, **kwargs):
+        single = isinstance(inputs, str)
+        texts = [inputs] if single else list(inputs)
+        if not texts:
+            return []
+        with self._lock:
+            self._ensure_alive()
+            shards = split_shards(len(texts), self.workers)
+            for i, (start, end) in enumerate(shards):
+                self._conns[i].send(("classify", texts[start:end], kwargs))
+            outputs = []
+            error = None
+            # Collect every reply even after a failure so the pipes stay in step
+            for i in range(len(shards)):
+                try:
+                    status, payload = self._conns[i].recv()
+                except (EOFError, OSError) as e:
+                    status, payload = "error", f"worker {i} exited: {e}"
+                if status == "ok":
+                    outputs.extend(payload)
+                elif error is None:
+                    error = payload
+            if error is not None:
+                raise RuntimeError(f"inference worker error: {error}")
+        return outputs[0] if single else outputs
+
+    def stats(self):
+        return {
+            'workers': self.workers,
+            'threads_per_worker': self.threads,
+            'pinned': self.core_sets[0] is not None,
+            'alive': sum(1 for process in self._processes if process is not None and process.poll() is None),
+            'load_seconds': max((info['load_seconds'] for info in self.info if info), default=None),
+            'shared_weights': all(info.get('weights', {}).get('verified', False) for info in self.info if info),
+        }
+
+    def close(self):
+        for conn in self._conns:
+            if conn is None:
+                continue
+            try:
+                conn.send(("stop",))
+            except (OSError, ValueError):
+                pass
+            conn.close()
+        for process in self._processes:
+            if process is None:
+                continue
+            try:
+                process.wait(timeout=5)
+            except subprocess.TimeoutExpired:
+                process.kill()
+        self._conns = [None] * self.workers
+        self._processes = [None] * self.workers
+        self._listener.close()
+
+# Tuning
+
+TUNING_SENTENCES = [
+    "The discovery of gravity was a momentous occasion in scientific history.",
+    "Scientists were thrilled with the breakthrough!",
+    "However, the initial reactions were mixed with surprise and curiosity.",
+    "Some researchers felt anxious about the implications of this new understanding.",
+    "The loss was devastating and everyone felt the weight of disappointment.",
+    "Photosynthesis converts light energy into chemical energy stored in glucose.",
+]
+
+
+def candidate_splits(cores, max_workers=None):
+    """(workers, threads) pairs that use every core once"""
+    limit = min(cores, max_workers or cores)
+    return [(workers, cores // workers) for workers in range(1, limit + 1) if cores % workers == 0]
+
+
+def tune(model_name, sentences=512, batch=None, max_workers=None, rounds=3):
+    """Time each process/thread split on a synthetic document; returns rows sorted by throughput"""
+    cores = len(available_cores())
+    texts = [TUNING_SENTENCES[i % len(TUNING_SENTENCES)] for i in range(sentences)]
+    rows = []
+    for workers, threads in candidate_splits(cores, max_workers):
+        print(f"⏱️  {workers} worker(s) x {threads} thread(s)...", flush=True)
+        try:
+            pool = InferenceWorkerPool(model_name, workers, threads)
+        except Exception as e:
+            print(f"   ❌ {e}")
+            continue
+        try:
+            chunk = batch or max(16, sentences // 4)
+            pool(texts[:chunk], truncation=True)  # warm-up
+            timings = []
+            for _ in range(rounds):
+                started = time.perf_counter()
+                for start in range(0, len(texts), chunk):
+                    pool(texts[start:start + chunk], truncation=True)
+                timings.append(time.perf_counter() - started)
+            best = min(timings)
+            rows.append({
+                'workers': workers,
+                'threads': threads,
+                'pinned': pool.core_sets[0] is not None,
+                'sentences_per_s': len(texts) / best,
+                'seconds': best,
+            })
+            print(f"   {len(texts) / best:.1f} sentences/s")
+        finally:
+            pool.close()
+    return sorted(rows, key=lambda row: -row['sentences_per_s'])
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="EA-TTS inference worker pool")
+    parser.add_argument("--tune", action="store_true", help="benchmark process/thread splits for this host")
+    parser.add_argument("--worker", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--connect", help=argparse.SUPPRESS)
+    parser.add_argument("--threads", type=int, default=1, help=argparse.SUPPRESS)
+    parser.add_argument("--cores", default="", help=argparse.SUPPRESS)
+    parser.add_argument("--model", default=os.environ.get("EATTS_EMOTION_MODEL", DEFAULT_MODEL),
+                        help="model name or local path")
+    parser.add_argument("--sentences", type=int, default=512, help="sentences in the tuning document")
+    parser.add_argument("--batch", type=int, default=None, help="sentences per pool call (default: a quarter of the document)")
+    parser.add_argument("--max-workers", type=int, default=None, help="largest worker count to try")
+    args = parser.parse_args(argv)
+
+    if args.worker:
+        cores = [int(core) for core in args.cores.split(",") if core]
+        worker_main(args.connect, args.model, cores or None, args.threads)
+        return 0
+
+    if not args.tune:
+        parser.print_help()
+        return 0
+
+    print("=" * 60)
+    print(f"Inference worker tuning ({len(available_cores())} cores, model {args.model})")
+    print("=" * 60)
+    rows = tune(args.model, args.sentences, args.batch, args.max_workers)
+    if not rows:
+        print("❌ No configuration could load the model")
+        return 1
+    print()
+    print(f"{'workers':>8} {'threads':>8} {'pinned':>7} {'sentences/s':>12}")
+    for row in rows:
+        print(f"{row['workers']:>8} {row['threads']:>8} {str(row['pinned']):>7} {row['sentences_per_s']:>12.1f}")
+    best = rows[0]
+    print()
+    print("✅ Recommended settings:")
+    print(f"   EATTS_INFERENCE_WORKERS={best['workers']}")
+    print(f"   EATTS_INFERENCE_THREADS={best['threads']}")
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
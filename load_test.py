@@ -0,0 +1,398 @@
+#!/usr/bin/env python3
+"""
+Load Test Harness
+Drives app.py headlessly through Streamlit's AppTest with many concurrent
+simulated sessions, each pasting a document, clicking "Analyze Emotions"
+and then "Generate Speech", to find the concurrency at which the shared
+classifier, the job executor and temp-disk usage saturate.
+
+All sessions run in this process and load the app the way serve.py does
+(`import app; app.run()`), so they share its process-wide caches (emotion
+model, inference server, job executor) exactly like browser sessions on
+one server. Translation, gTTS and the emotion model are replaced by local
+stand-ins with configurable latency.
+
+AppTest swaps a process-global runtime for every script run, so script
+runs are serialized behind a lock. The work they submit (analysis,
+translation, speech jobs and model inference) still runs concurrently on
+the app's background executor, which is where sessions contend.
+
+Usage:
+    python load_test.py                          # 1, 2, 4, 8 and 16 concurrent sessions
+    python load_test.py --sessions 4,8,32 --iterations 3
+    python load_test.py --corpus docs/           # .txt/.md files as the document corpus
+    python load_test.py --env EATTS_MAX_JOBS=8   # try a different deployment setting
+"""
+
+import argparse
+import json
+import logging
+import os
+import random
+import shutil
+import sys
+import tempfile
+import threading
+import time
+import types
+from datetime import datetime
+
+from benchmark import (
+    SAMPLE_SENTENCES,
+    RssSampler,
+    StubClassifier,
+    environment_info,
+    install_stub_backends,
+    percentile,
+)
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "app.py")
+SESSION_SCRIPT = "import app\napp.run()\n"
+DEFAULT_OUTPUT = "load_test_results.json"
+
+# AppTest.run() is not safe to call from several threads at once
+APPTEST_LOCK = threading.Lock()
+
+ANALYZE_BUTTON = "🔍 Analyze Emotions"
+GENERATE_BUTTON = "🎤 Generate Speech"
+
+# An MPEG-1 Layer III frame (128 kbps, 44.1 kHz) with an empty payload
+# decodes as 26 ms of silence, so the stub output is a playable MP3
+MP3_FRAME = b"\xff\xfb\x90\x64" + b"\x00" * 413
+MP3_FRAME_SECONDS = 1152 / 44100
+SPOKEN_CHARS_PER_SECOND = 15
+
+class StubGTTS:
+    """Offline replacement for gtts.gTTS writing silent MP3 of a realistic length"""
+
+    latency_s = 0.0
+
+    def __init__(self, text, lang='en', slow=False, **kwargs):
+        self.text = text
+        self.lang = lang
+        self.slow = slow
+
+    def save(self, path):
+        if self.latency_s:
+            time.sleep(self.latency_s)
+        seconds = max(1.0, len(self.text) / SPOKEN_CHARS_PER_SECOND) * (1.5 if self.slow else 1.0)
+        with open(path, 'wb') as f:
+            f.write(MP3_FRAME * int(seconds / MP3_FRAME_SECONDS))
+
+
+def install_load_test_backends(args):
+    """Stub translation, gTTS and the emotion model before the app first runs"""
+    install_stub_backends(args.translate_latency_ms)
+
+    StubGTTS.latency_s = args.tts_latency_ms / 1000
+    gtts = types.ModuleType("gtts")
+    gtts.gTTS = StubGTTS
+    sys.modules["gtts"] = gtts
+
+    transformers = types.ModuleType("transformers")
+    transformers.pipeline = lambda *a, **k: StubClassifier(args.model_call_ms, args.model_text_ms)
+    sys.modules["transformers"] = transformers
+
+
+def load_corpus(path, seed=0):
+    """Documents to paste: .txt/.md files from `path`, or a generated corpus of mixed lengths"""
+    if path:
+        documents = []
+        for name in sorted(os.listdir(path)):
+            if name.lower().endswith(('.txt', '.md')):
+                with open(os.path.join(path, name), 'r', encoding='utf-8', errors='replace') as f:
+                    text = f.read().strip()
+                if text:
+                    documents.append(text)
+        if not documents:
+            raise SystemExit(f"No .txt or .md documents found in {path}")
+        return documents
+
+    sentences = list(SAMPLE_SENTENCES)
+    example = os.path.join(os.path.dirname(APP_PATH), "example_text.txt")
+    if os.path.exists(example):
+        with open(example, 'r', encoding='utf-8') as f:
+            sentences += [s.strip() + "." for s in f.read().split(".") if s.strip()]
+    rng = random.Random(seed)
+    # Short notes up to a long chapter, like a tutor's mix of material
+    return [" ".join(rng.choice(sentences) for _ in range(count)) for count in (5, 12, 25, 40, 80, 150)]
+
+
+def dir_size(path):
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass
+    return total
+
+# One simulated session
+
+class SimulatedSession:
+    """One browser session clicking through analyze -> generate `iterations` times"""
+
+    def __init__(self, index, documents, args):
+        self.index = index
+        self.documents = documents
+        self.args = args
+        self.analyze_latencies = []
+        self.synthesis_latencies = []
+        self.workflows = 0
+        self.errors = []
+        self.app = None
+
+    def run(self):
+        from streamlit.testing.v1 import AppTest
+
+        try:
+            self.app = AppTest.from_string(SESSION_SCRIPT, default_timeout=self.args.timeout)
+            self._run()
+            self._check("startup")
+            if self.args.translate:
+                self._run(self.app.sidebar.checkbox(key="translation_checkbox").check())
+                self._check("enable translation")
+        except Exception as e:
+            self.errors.append(f"startup: {e}")
+            return
+
+        for iteration in range(self.args.iterations):
+            document = self.documents[(self.index + iteration) % len(self.documents)]
+            try:
+                self.app.text_area[0].input(document)
+                started = time.perf_counter()
+                self._run(self._button(ANALYZE_BUTTON).click())
+                self._wait_for("analysis", lambda state: state.get('analysis_job_id') is not None
+                               and state.get('analysis_applied') == state['analysis_job_id'])
+                self.analyze_latencies.append(time.perf_counter() - started)
+
+                started = time.perf_counter()
+                self._run(self._button(GENERATE_BUTTON).click())
+                self._wait_for("synthesis", lambda state: state.get('synthesis_job_id') is not None
+                               and state.get('audio_result_job') == state['synthesis_job_id'])
+                self.synthesis_latencies.append(time.perf_counter() - started)
+                self.workflows += 1
+            except Exception as e:
+                self.errors.append(f"iteration {iteration}: {e}")
+
+    def _run(self, widget=None):
+        """Rerun the script, after a widget interaction if one is given"""
+        with APPTEST_LOCK:
+            (widget or self.app).run()
+
+    def _button(self, label):
+        for button in self.app.button:
+            if button.label == label:
+                return button
+        raise RuntimeError(f"button {label!r} not on the page")
+
+    def _state(self):
+        state = self.app.session_state
+        return {key: state[key] for key in ('analysis_job_id', 'analysis_applied', 'synthesis_job_id', 'audio_result_job')
+                if key in state}
+
+    def _wait_for(self, stage, condition):
+        deadline = time.monotonic() + self.args.timeout
+        while True:
+            self._check(stage)
+            if condition(self._state()):
+                return
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"{stage} did not finish within {self.args.timeout:.0f} s")
+            time.sleep(self.args.poll)
+            self._run()
+
+    def _check(self, stage):
+        if self.app.exception:
+            raise RuntimeError(f"{stage}: {self.app.exception[0].value}")
+        errors = [element.value for element in self.app.error]
+        if errors:
+            raise RuntimeError(f"{stage}: {errors[0]}")
+
+# Concurrency levels
+
+def run_level(concurrency, documents, args, tmp_dir):
+    """Run `concurrency` sessions at once and summarize them"""
+    import app
+
+    server = app.get_inference_server()
+    inference_before = server.stats() if server is not None else None
+    sessions = [SimulatedSession(i, documents, args) for i in range(concurrency)]
+    rss_before = RssSampler.current_rss()
+    disk_before = dir_size(tmp_dir)
+    threads = [threading.Thread(target=session.run, name=f"load-session-{i}") for i, session in enumerate(sessions)]
+    started = time.perf_counter()
+    with RssSampler(interval=0.05) as sampler:
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    elapsed = time.perf_counter() - started
+    rss_after = RssSampler.current_rss()
+
+    analyze = [t for session in sessions for t in session.analyze_latencies]
+    synthesis = [t for session in sessions for t in session.synthesis_latencies]
+    workflows = sum(session.workflows for session in sessions)
+    attempted = concurrency * args.iterations
+    errors = [f"session {session.index}: {error}" for session in sessions for error in session.errors]
+    inference = None
+    if server is not None:
+        stats = server.stats()
+        requests = stats['requests'] - inference_before['requests']
+        batches = stats['batches'] - inference_before['batches']
+        inference = {
+            'sentences': requests,
+            'batches': batches,
+            'avg_batch': requests / batches if batches else 0.0,
+            'errors': stats['errors'] - inference_before['errors'],
+        }
+
+    def latency_summary(values):
+        if not values:
+            return None
+        return {p: percentile(values, int(p[1:])) * 1000 for p in ('p50', 'p95', 'p99')}
+
+    result = {
+        'concurrency': concurrency,
+        'elapsed_s': elapsed,
+        'workflows': workflows,
+        'throughput_per_min': workflows / elapsed * 60 if elapsed > 0 else 0.0,
+        'analyze_ms': latency_summary(analyze),
+        'synthesis_ms': latency_summary(synthesis),
+        'error_rate': 1 - workflows / attempted if attempted else 0.0,
+        'errors': errors[:20],
+        'peak_rss_mb': sampler.peak / (1024 * 1024) if sampler.peak is not None else None,
+        'rss_growth_per_session_mb': (rss_after - rss_before) / concurrency / (1024 * 1024)
+        if rss_before is not None and rss_after is not None else None,
+        'temp_disk_mb': (dir_size(tmp_dir) - disk_before) / (1024 * 1024),
+        'inference': inference,
+        'jobs': app.get_job_executor().stats(),
+    }
+    # Sessions end here; let their AppTest state be collected before the next level
+    del sessions
+    return result
+
+
+def find_saturation(levels, min_gain=0.1):
+    """First concurrency where doubling sessions adds less than `min_gain` throughput or errors appear"""
+    for previous, level in zip(levels, levels[1:]):
+        if level['error_rate'] > 0:
+            return level['concurrency'], f"errors at {level['concurrency']} sessions"
+        if previous['throughput_per_min'] > 0:
+            gain = level['throughput_per_min'] / previous['throughput_per_min'] - 1
+            if gain < min_gain:
+                return previous['concurrency'], (
+                    f"throughput grew {gain:.0%} from {previous['concurrency']} to {level['concurrency']} sessions"
+                )
+    return None, "no saturation within the tested range"
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Concurrent-session load test for the EA-TTS app")
+    parser.add_argument("--sessions", default="1,2,4,8,16", help="comma-separated concurrency levels")
+    parser.add_argument("--iterations", type=int, default=2, help="analyze + generate rounds per session")
+    parser.add_argument("--corpus", default="", help="directory of .txt/.md documents (default: generated)")
+    parser.add_argument("--no-translate", dest="translate", action="store_false",
+                        help="skip translation (English speech then needs FFmpeg or pyttsx3)")
+    parser.add_argument("--translate-latency-ms", type=float, default=150.0, help="stub translator round trip")
+    parser.add_argument("--tts-latency-ms", type=float, default=300.0, help="stub gTTS round trip")
+    parser.add_argument("--model-call-ms", type=float, default=8.0, help="stub model cost per call")
+    parser.add_argument("--model-text-ms", type=float, default=2.0, help="stub model cost per sentence")
+    parser.add_argument("--timeout", type=float, default=120.0, help="seconds before a stage counts as failed")
+    parser.add_argument("--poll", type=float, default=0.1, help="seconds between status reruns per session")
+    parser.add_argument("--env", action="append", default=[], metavar="NAME=VALUE",
+                        help="app setting to apply before the first run (repeatable)")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help=f"results file (default {DEFAULT_OUTPUT})")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    print("=" * 60)
+    print("EA-TTS Load Test")
+    print("=" * 60)
+    print()
+
+    for setting in args.env:
+        name, _, value = setting.partition("=")
+        os.environ[name] = value
+    os.environ["EATTS_HEALTH_PORT"] = "0"
+    os.environ.setdefault("EATTS_JOB_POLL_INTERVAL", str(args.poll))
+
+    import streamlit.logger
+    streamlit.logger.set_log_level(logging.ERROR)
+    install_load_test_backends(args)
+
+    # Generated audio goes to a private temp dir so its growth can be measured
+    tmp_dir = tempfile.mkdtemp(prefix="eatts-load-")
+    tempfile.tempdir = tmp_dir
+    sys.path.insert(0, os.path.dirname(APP_PATH))
+
+    documents = load_corpus(args.corpus)
+    print(f"📚 Corpus: {len(documents)} documents, "
+          f"{sum(len(d) for d in documents) / len(documents):.0f} characters on average")
+    print(f"🔀 Translation: {'on' if args.translate else 'off'}")
+    print()
+
+    levels = []
+    try:
+        # One unmeasured session loads the app, the stub model and the lazy imports
+        print("🔥 Warming up...")
+        warmup = SimulatedSession(0, documents, args)
+        warmup.run()
+        if warmup.errors:
+            print(f"❌ Warm-up session failed: {warmup.errors[0]}")
+            return 1
+        # Streamlit re-applies its configured log level while parsing config for the first run
+        streamlit.logger.set_log_level(logging.ERROR)
+
+        for concurrency in [int(n) for n in args.sessions.split(",") if n.strip()]:
+            print(f"👥 {concurrency} concurrent session(s)...")
+            level = run_level(concurrency, documents, args, tmp_dir)
+            levels.append(level)
+            analyze = level['analyze_ms'] or {}
+            synthesis = level['synthesis_ms'] or {}
+            print(f"   {level['throughput_per_min']:.1f} workflows/min  "
+                  f"analyze p50/p95 {analyze.get('p50', 0):.0f}/{analyze.get('p95', 0):.0f} ms  "
+                  f"speech p50/p95 {synthesis.get('p50', 0):.0f}/{synthesis.get('p95', 0):.0f} ms")
+            rss_growth = level['rss_growth_per_session_mb']
+            print(f"   errors {level['error_rate']:.0%}  "
+                  f"RSS +{rss_growth if rss_growth is not None else 0:.1f} MB/session  "
+                  f"temp disk +{level['temp_disk_mb']:.1f} MB  "
+                  f"avg batch {(level['inference'] or {}).get('avg_batch', 0):.1f}")
+            for error in level['errors'][:3]:
+                print(f"   ❌ {error}")
+    finally:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+
+    saturation, reason = find_saturation(levels)
+    results = {
+        'created': datetime.now().isoformat(timespec='seconds'),
+        'environment': environment_info(),
+        'settings': {
+            'iterations': args.iterations,
+            'translate': args.translate,
+            'translate_latency_ms': args.translate_latency_ms,
+            'tts_latency_ms': args.tts_latency_ms,
+            'model_call_ms': args.model_call_ms,
+            'model_text_ms': args.model_text_ms,
+            'env': {name: value for name, value in os.environ.items() if name.startswith("EATTS_")},
+        },
+        'levels': levels,
+        'saturation': {'concurrency': saturation, 'reason': reason},
+    }
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+
+    print()
+    print("=" * 60)
+    if saturation is not None:
+        print(f"📈 Saturates at about {saturation} concurrent sessions ({reason})")
+    else:
+        print(f"📈 {reason.capitalize()}")
+    print(f"📄 Results written to {args.output}")
+    return 1 if any(level['error_rate'] > 0 for level in levels) else 0
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,505 @@
+#!/usr/bin/env python3
+"""
+Shared Model Weights
+Loads the emotion model with its parameters backed directly by a
+memory-mapped safetensors file instead of private copies. The kernel
+serves those pages from the page cache, so every Streamlit server process
+and inference worker on the host maps the same physical memory and each
+process only pays for its activations.
+
+app.py and inference_worker.py use it when EATTS_SHARED_WEIGHTS is on
+(the default). Checkpoints published only as pytorch_model.bin are
+converted once to EATTS_WEIGHTS_DIR; the write is atomic, so concurrent
+processes converting at the same time are safe.
+
+The mapping is private copy-on-write: nothing writes to the weights
+during inference, but if something did, it would get a private copy of
+that page instead of crashing or corrupting the file. `sharing_report`
+reads /proc/self/smaps to confirm the weights are still clean file pages.
+
+It also holds the registry of supported emotion models. Each entry maps
+the model's labels onto the emotions app.py voices, and `--profile`
+measures latency, memory and agreement with the default model on this
+host. The results go to EATTS_MODEL_PROFILES, where the app's model
+selector reads them.
+
+Usage:
+    python model_weights.py --convert [MODEL]   # prepare the safetensors file
+    python model_weights.py --check [MODEL]     # load it and report sharing
+    python model_weights.py --profile [MODEL ...]   # profile registry models on this host
+"""
+
+import argparse
+import json
+import mmap
+import os
+import platform
+import re
+import struct
+import subprocess
+import sys
+import tempfile
+import time
+import warnings
+
+DEFAULT_MODEL = "j-hartmann/emotion-english-distilroberta-base"
+PROFILES_PATH = os.environ.get(
+    "EATTS_MODEL_PROFILES", os.path.join(os.path.expanduser("~"), ".cache", "eatts", "model_profiles.json"))
+
+# Supported emotion models. `labels` maps a model's own labels onto the
+# emotions app.py has voice settings for (EMOTION_PARAMS); labels not
+# listed keep their name, and any without voice settings (base's
+# "disgust") are voiced as neutral. `neutral` says whether the model has a
+# neutral class (None when unknown): one without it gives every sentence,
+# however plain, one of its emotions.
+EMOTION_MODELS = {
+    "small": {
+        'name': "bhadresh-savani/distilbert-base-uncased-emotion",
+        'description': "DistilBERT, six emotions and no neutral class, so plain sentences get an emotion too; "
+                       "fastest, English only",
+        'languages': "en",
+        # Its "love" is voiced with joy's settings, the label base gives such sentences
+        'labels': {"love": "joy"},
+        'neutral': False,
+    },
+    "base": {
+        'name': DEFAULT_MODEL,
+        'description': "DistilRoBERTa, seven emotions including neutral; English",
+        'languages': "en",
+        'labels': {},
+        'neutral': True,
+    },
+    "multilingual": {
+        'name': "MilaNLProc/xlm-emo-t",
+        'description': "XLM-RoBERTa, four emotions and no neutral class in many languages; for non-English or "
+                       "translated input",
+        'languages': "multi",
+        'labels': {},
+        'neutral': False,
+    },
+}
+DEFAULT_MODEL_KEY = "base"
+
+# Profiling document: explanatory sentences with a few emotional ones,
+# like course material
+PROFILE_SENTENCES = [
+    "Photosynthesis converts light energy into chemical energy.",
+    "The mitochondria produce most of the cell's supply of ATP.",
+    "In this lesson we will look at how rivers shape valleys over time.",
+    "Multiply both sides of the equation by the same number.",
+    "The treaty was signed in 1648 and ended thirty years of war.",
+    "Each group should choose one experiment and record the results.",
+    "Scientists were thrilled with the breakthrough!",
+    "The loss was devastating for the whole community.",
+    "Some researchers felt anxious about the implications.",
+    "Everyone was surprised when the results came in.",
+    "The students were furious about the unfair grading.",
+    "She loved the way the poem described the sea.",
+    "Congratulations, you have passed the final exam!",
+    "The experiment failed, and the team was deeply disappointed.",
+    "Read chapter four before the next class.",
+    "Light travels faster than sound.",
+]
+SHARED_WEIGHTS = os.environ.get("EATTS_SHARED_WEIGHTS", "1") != "0"
+WEIGHTS_DIR = os.environ.get(
+    "EATTS_WEIGHTS_DIR", os.path.join(os.path.expanduser("~"), ".cache", "eatts", "weights"))
+
+# safetensors dtype tags -> torch dtype names
+DTYPES = {
+    "F64": "float64", "F32": "float32", "F16": "float16", "BF16": "bfloat16",
+    "I64": "int64", "I32": "int32", "I16": "int16", "I8": "int8",
+    "U8": "uint8", "BOOL": "bool",
+}
+
+# Models loaded by this process, for sharing_report() without arguments
+_loaded = []
+
+
+# Weights file
+
+def read_header(path):
+    """Tensor table of a safetensors file and the offset where its data starts"""
+    with open(path, "rb") as f:
+        (length,) = struct.unpack("<Q", f.read(8))
+        header = json.loads(f.read(length))
+    header.pop("__metadata__", None)
+    return header, 8 + length
+
+
+def resolve_model(model):
+    """(key, spec) for a registry key, a registry model's name, or any other model name or path"""
+    model = model or DEFAULT_MODEL_KEY
+    if model in EMOTION_MODELS:
+        return model, EMOTION_MODELS[model]
+    for key, spec in EMOTION_MODELS.items():
+        if spec['name'] == model:
+            return key, spec
+    return model, {'name': model, 'description': "Custom model", 'languages': "", 'labels': {}, 'neutral': None}
+
+
+def map_label(spec, label):
+    """A model's label as the app's emotion name"""
+    label = (label or "neutral").lower()
+    return spec['labels'].get(label, label)
+
+
+def _local_dir(model_name):
+    return os.path.join(WEIGHTS_DIR, model_name.strip("/").replace("/", "--"))
+
+
+def resolve_weights_file(model_name):
+    """Path of a safetensors file for `model_name`, converting a .bin checkpoint if needed"""
+    if os.path.isdir(model_name):
+        candidate = os.path.join(model_name, "model.safetensors")
+        if os.path.exists(candidate):
+            return candidate
+        return convert_checkpoint(os.path.join(model_name, "pytorch_model.bin"), _local_dir(model_name))
+
+    from huggingface_hub import hf_hub_download
+    try:
+        return hf_hub_download(model_name, "model.safetensors")
+    except Exception:
+        converted = os.path.join(_local_dir(model_name), "model.safetensors")
+        if os.path.exists(converted):
+            return converted
+        return convert_checkpoint(hf_hub_download(model_name, "pytorch_model.bin"), _local_dir(model_name))
+
+
+def convert_checkpoint(bin_path, out_dir):
+    """Write a pytorch_model.bin checkpoint as out_dir/model.safetensors"""
+    import torch
+    from safetensors.torch import save_file
+
+    state = torch.load(bin_path, map_location="cpu", weights_only=True)
+    # safetensors refuses aliased tensors; tied weights are re-tied on load
+    seen = set()
+    tensors = {}
+    for name, tensor in state.items():
+        if tensor.data_ptr() in seen:
+            continue
+        seen.add(tensor.data_ptr())
+        tensors[name] = tensor.contiguous()
+
+    os.makedirs(out_dir, exist_ok=True)
+    target = os.path.join(out_dir, "model.safetensors")
+    fd, tmp = tempfile.mkstemp(dir=out_dir, suffix=".tmp")
+    os.close(fd)
+    try:
+        save_file(tensors, tmp, metadata={"format": "pt"})
+        os.replace(tmp, target)
+    finally:
+        if os.path.exists(tmp):
+            os.remove(tmp)
+    return target
+
+
+def map_state_dict(path):
+    """State dict whose tensors are views into a copy-on-write mapping of `path`"""
+    import torch
+
+    header, data_start = read_header(path)
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    state = {}
+    for name, info in header.items():
+        dtype = getattr(torch, DTYPES[info["dtype"]])
+        begin, end = info["data_offsets"]
+        count = (end - begin) // dtype.itemsize
+        if count == 0:
+            state[name] = torch.empty(info["shape"], dtype=dtype)
+            continue
+        tensor = torch.frombuffer(mapped, dtype=dtype, count=count, offset=data_start + begin)
+        state[name] = tensor.view(info["shape"])
+    return state, mapped
+
+
+# Model loading
+
+def _no_init_weights():
+    # Skips random initialisation, whose pages would be thrown away anyway
+    try:
+        from transformers.initialization import no_init_weights
+    except ImportError:
+        try:
+            from transformers.modeling_utils import no_init_weights
+        except ImportError:
+            import contextlib
+            return contextlib.nullcontext()
+    return no_init_weights()
+
+
+def load_shared_model(model_name):
+    """Sequence-classification model whose parameters live in the mapped weights file"""
+    from transformers import AutoConfig, AutoModelForSequenceClassification
+
+    model_name = resolve_model(model_name)[1]['name']
+    path = resolve_weights_file(model_name)
+    state, mapped = map_state_dict(path)
+    config = AutoConfig.from_pretrained(model_name)
+    with _no_init_weights():
+        model = AutoModelForSequenceClassification.from_config(config)
+
+    result = model.load_state_dict(state, strict=False, assign=True)
+    tied = set(getattr(model, "_tied_weights_keys", None) or ())
+    missing = [key for key in result.missing_keys if key not in tied]
+    if missing:
+        raise ValueError(f"{path} is missing weights: {', '.join(missing[:5])}")
+    if result.missing_keys:
+        model.tie_weights()
+    model.eval()
+
+    model._eatts_weights = {'path': os.path.realpath(path), 'mmap': mapped}
+    _loaded.append(model)
+    return model
+
+
+def load_pipeline(model_name, **kwargs):
+    """text-classification pipeline over the shared weights, falling back to a normal load"""
+    from transformers import pipeline
+
+    model_name = resolve_model(model_name)[1]['name']
+    if SHARED_WEIGHTS:
+        try:
+            from transformers import AutoTokenizer
+            model = load_shared_model(model_name)
+            tokenizer = AutoTokenizer.from_pretrained(model_name)
+            return pipeline("text-classification", model=model, tokenizer=tokenizer, **kwargs)
+        except Exception as e:
+            warnings.warn(f"Shared weights unavailable for {model_name}, loading a private copy: {e}")
+    return pipeline("text-classification", model=model_name, **kwargs)
+
+
+# Sharing check
+
+def _smaps(path):
+    """Summed /proc/self/smaps counters (kB) for every mapping of `path`"""
+    totals = {'ranges': []}
+    current = None
+    with open("/proc/self/smaps") as f:
+        for line in f:
+            fields = line.split()
+            if "-" in fields[0] and not fields[0].endswith(":"):
+                current = len(fields) >= 6 and fields[5] == path
+                if current:
+                    start, end = (int(part, 16) for part in fields[0].split("-"))
+                    totals['ranges'].append((start, end))
+            elif current and fields[0].endswith(":") and len(fields) == 3 and fields[2] == "kB":
+                key = fields[0][:-1]
+                totals[key] = totals.get(key, 0) + int(fields[1])
+    return totals
+
+
+def sharing_report(model=None):
+    """Whether the loaded weights are shared page-cache memory, from /proc/self/smaps
+
+    `zero_copy` means every parameter points into the mapping; clean file
+    pages are shareable by construction. `Shared_Clean` grows once other
+    processes map the same file, and Pss/Rss estimates how many do.
+    """
+    models = [model] if model is not None else list(_loaded)
+    if not models or not getattr(models[0], "_eatts_weights", None):
+        return {'enabled': False, 'reason': "model loaded without shared weights"}
+    weights = models[0]._eatts_weights
+    report = {'enabled': True, 'path': weights['path']}
+    if not os.path.exists("/proc/self/smaps"):
+        report['verified'] = None
+        report['reason'] = "/proc/self/smaps not available on this platform"
+        return report
+
+    counters = _smaps(weights['path'])
+    ranges = counters.pop('ranges')
+    parameters = list(models[0].parameters())
+    inside = sum(
+        1 for p in parameters
+        if p.numel() == 0 or any(start <= p.data_ptr() < end for start, end in ranges))
+    rss = counters.get('Rss', 0)
+    pss = counters.get('Pss', 0)
+    report.update({
+        'zero_copy': inside == len(parameters),
+        'parameters': len(parameters),
+        'parameters_mapped': inside,
+        'mapped_mb': round(sum(end - start for start, end in ranges) / 1e6, 1),
+        'rss_mb': round(rss / 1024, 1),
+        'pss_mb': round(pss / 1024, 1),
+        'shared_clean_mb': round(counters.get('Shared_Clean', 0) / 1024, 1),
+        'private_dirty_mb': round(counters.get('Private_Dirty', 0) / 1024, 1),
+        'sharing_processes': round(rss / pss, 1) if pss else None,
+    })
+    report['verified'] = report['zero_copy'] and counters.get('Private_Dirty', 0) == 0
+    return report
+
+
+def process_memory():
+    """Resident (Rss) and proportional (Pss) size of this process in MB"""
+    try:
+        with open("/proc/self/smaps_rollup") as f:
+            values = {line.split()[0][:-1]: int(line.split()[1]) for line in f if line.strip().endswith("kB")}
+        return {'rss_mb': round(values['Rss'] / 1024, 1), 'pss_mb': round(values['Pss'] / 1024, 1)}
+    except (OSError, KeyError, IndexError, ValueError):
+        return {}
+
+
+# Model profiles
+
+def load_profiles(path=PROFILES_PATH):
+    """Measured profiles by model key ({} when this host hasn't been profiled)"""
+    try:
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def _top_label(output):
+    while isinstance(output, list):
+        output = output[0] if output else {}
+    return output.get('label') if isinstance(output, dict) else None
+
+
+def profile_in_process(model, sentences, rounds=3):
+    """Load one model here and time it; returns its profile and mapped labels"""
+    _, spec = resolve_model(model)
+    before = process_memory()
+    started = time.perf_counter()
+    classifier = load_pipeline(model, top_k=1, device=-1)
+    load_seconds = time.perf_counter() - started
+    classifier(sentences[:1], truncation=True)  # warm-up
+
+    single = []
+    for text in sentences:
+        started = time.perf_counter()
+        classifier([text], truncation=True)
+        single.append(time.perf_counter() - started)
+    batched = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        outputs = classifier(sentences, batch_size=32, truncation=True)
+        batched.append(time.perf_counter() - started)
+    after = process_memory()
+    single.sort()
+    return {
+        'load_seconds': round(load_seconds, 2),
+        'latency_ms': round(single[len(single) // 2] * 1000, 2),
+        'sentences_per_s': round(len(sentences) / min(batched), 1),
+        'rss_mb': round(after['rss_mb'] - before['rss_mb'], 1) if before and after else None,
+        'labels': [map_label(spec, _top_label(output)) for output in outputs],
+    }
+
+
+def read_corpus(path, limit=200):
+    """Sentences from a .txt/.md file or a directory of them"""
+    names = [path] if os.path.isfile(path) else [
+        os.path.join(path, name) for name in sorted(os.listdir(path)) if name.lower().endswith((".txt", ".md"))]
+    sentences = []
+    for name in names:
+        with open(name, encoding="utf-8", errors="replace") as f:
+            sentences += [s.strip() for s in re.split(r"(?<=[.!?])\s+", f.read()) if len(s.strip()) > 3]
+    return sentences[:limit]
+
+
+def profile_models(models, sentences, reference=DEFAULT_MODEL_KEY, path=PROFILES_PATH, timeout=1800):
+    """Profile each model in a fresh process and save the results to `path`
+
+    A fresh process per model keeps the memory figures independent of the
+    models loaded before it. Agreement is the share of sentences that get
+    the same (mapped) label as the reference model.
+    """
+    keys = list(dict.fromkeys(list(models) + [reference]))
+    fd, sentences_file = tempfile.mkstemp(suffix=".json")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(sentences, f)
+    results = {}
+    try:
+        for key in keys:
+            print(f"⏱️  {key} ({resolve_model(key)[1]['name']})...", flush=True)
+            process = subprocess.run(
+                [sys.executable, os.path.abspath(__file__), "--profile-one", key, "--sentences-file", sentences_file],
+                capture_output=True, text=True, timeout=timeout)
+            if process.returncode != 0:
+                print(f"   ❌ {(process.stderr.strip().splitlines() or ['failed'])[-1]}")
+                continue
+            results[key] = json.loads(process.stdout.strip().splitlines()[-1])
+            print(f"   {results[key]['latency_ms']:.1f} ms/sentence, {results[key]['sentences_per_s']:.1f} sentences/s batched")
+    finally:
+        os.remove(sentences_file)
+
+    reference_labels = results.get(reference, {}).get('labels')
+    profiles = load_profiles(path)
+    measured_at = time.strftime("%Y-%m-%dT%H:%M:%S")
+    for key, result in results.items():
+        labels = result.pop('labels')
+        result['agreement'] = (
+            round(sum(a == b for a, b in zip(labels, reference_labels)) / len(labels), 3)
+            if reference_labels and labels else None)
+        spec = resolve_model(key)[1]
+        result.update(name=spec['name'], neutral=spec['neutral'], reference=reference, sentences=len(sentences),
+                      host=platform.node(), measured_at=measured_at)
+        profiles[key] = result
+
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(profiles, f, indent=2)
+    os.replace(tmp, path)
+    return {key: profiles[key] for key in results}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Prepare, check and profile emotion models")
+    parser.add_argument("models", nargs="*", metavar="MODEL",
+                        help="registry key (small, base, multilingual), model name or local path")
+    action = parser.add_mutually_exclusive_group(required=True)
+    action.add_argument("--convert", action="store_true", help="Resolve or convert the safetensors weights file")
+    action.add_argument("--check", action="store_true", help="Load the model and report page sharing")
+    action.add_argument("--profile", action="store_true",
+                        help="Measure latency, memory and agreement of each model (default: all registry models)")
+    action.add_argument("--profile-one", help=argparse.SUPPRESS)
+    parser.add_argument("--corpus", help="profile on sentences from this .txt/.md file or directory")
+    parser.add_argument("--sentences-file", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    args.model = args.models[0] if args.models else os.environ.get("EATTS_EMOTION_MODEL", DEFAULT_MODEL_KEY)
+
+    if args.profile_one:
+        with open(args.sentences_file, encoding="utf-8") as f:
+            sentences = json.load(f)
+        print(json.dumps(profile_in_process(args.profile_one, sentences)))
+        return 0
+
+    if args.profile:
+        sentences = read_corpus(args.corpus) if args.corpus else PROFILE_SENTENCES
+        results = profile_models(args.models or list(EMOTION_MODELS), sentences)
+        if not results:
+            print("❌ No model could be profiled")
+            return 1
+        print()
+        print(f"{'model':>14} {'ms/sentence':>12} {'sentences/s':>12} {'RSS MB':>8} {'agreement':>10} {'neutral':>8}")
+        for key, profile in results.items():
+            agreement = f"{profile['agreement']:.0%}" if profile['agreement'] is not None else "-"
+            rss = f"{profile['rss_mb']:.0f}" if profile['rss_mb'] is not None else "-"
+            neutral = {True: "yes", False: "no"}.get(profile.get('neutral'), "-")
+            print(f"{key:>14} {profile['latency_ms']:>12.1f} {profile['sentences_per_s']:>12.1f} {rss:>8} {agreement:>10} {neutral:>8}")
+        print(f"✅ Saved to {PROFILES_PATH}")
+        return 0
+
+    if args.convert:
+        print(f"📦 Resolving weights for {args.model}...")
+        print(f"✅ {resolve_weights_file(resolve_model(args.model)[1]['name'])}")
+        return 0
+
+    print(f"🔍 Loading {args.model} from mapped weights...")
+    load_shared_model(args.model)
+    report = sharing_report()
+    for key, value in report.items():
+        print(f"   {key}: {value}")
+    memory = process_memory()
+    if memory:
+        print(f"   process: {memory['rss_mb']} MB RSS, {memory['pss_mb']} MB PSS")
+    if report.get('verified'):
+        print("✅ Weights are clean shared file pages")
+        return 0
+    print("❌ Weights are not shared")
+    return 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""
+Project Store
+Saved projects of the Streamlit app: analysis results, translations and
+settings as rows in a SQLite database, and generated audio and reports
+as content-addressed files in a blob directory next to it.
+
+app.py keeps one store per process under EATTS_PROJECT_DIR and reads a
+project's sentence rows a page at a time. Databases written by older
+versions are migrated when the store first connects. The store knows
+nothing about sessions or Streamlit; `owner` is whatever id app.py
+assigns a browser or signed-in user.
+"""
+
+import functools
+import hashlib
+import json
+import os
+import shutil
+import sqlite3
+import sys
+import threading
+import time
+import uuid
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+
+PROJECT_SCHEMA = """
+CREATE TABLE IF NOT EXISTS projects (
+    id TEXT PRIMARY KEY,
+    owner TEXT NOT NULL DEFAULT '',
+    title TEXT NOT NULL,
+    created REAL NOT NULL,
+    updated REAL NOT NULL,
+    sentence_count INTEGER NOT NULL DEFAULT 0,
+    settings TEXT NOT NULL DEFAULT '{}'
+);
+CREATE INDEX IF NOT EXISTS projects_updated ON projects (updated);
+CREATE TABLE IF NOT EXISTS documents (
+    project_id TEXT PRIMARY KEY REFERENCES projects (id) ON DELETE CASCADE,
+    text TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS sentences (
+    project_id TEXT NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+    position INTEGER NOT NULL,
+    sentence TEXT NOT NULL,
+    translated TEXT,
+    emotion TEXT NOT NULL,
+    score REAL NOT NULL,
+    probabilities TEXT,
+    PRIMARY KEY (project_id, position)
+);
+CREATE TABLE IF NOT EXISTS artifacts (
+    project_id TEXT NOT NULL REFERENCES projects (id) ON DELETE CASCADE,
+    kind TEXT NOT NULL,
+    data TEXT NOT NULL,
+    updated REAL NOT NULL,
+    PRIMARY KEY (project_id, kind)
+);
+"""
+
+
+class ProjectStore:
+    """Saved projects: SQLite rows plus a directory of content-addressed files
+
+    One connection, opened on first use, serves every session behind a
+    lock. WAL mode lets other server processes read while one writes.
+    """
+
+    def __init__(self, root):
+        self.root = root
+        self.blob_dir = os.path.join(root, "blobs")
+        self._lock = threading.Lock()
+        self._db = None
+        self._signing_key = None
+
+    def signing_key(self):
+        """Random key that signs owner cookies, created next to the database on first use"""
+        with self._lock:
+            if self._signing_key is None:
+                path = os.path.join(self.root, "owner.key")
+                if not os.path.exists(path):
+                    os.makedirs(self.root, exist_ok=True)
+                    tmp = f"{path}.{uuid.uuid4().hex}.tmp"
+                    with open(os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL, 0o600), 'wb') as f:
+                        f.write(os.urandom(32))
+                    try:
+                        os.link(tmp, path)  # fails if another process created it first
+                    except FileExistsError:
+                        pass
+                    finally:
+                        os.unlink(tmp)
+                with open(path, 'rb') as f:
+                    self._signing_key = f.read()
+            return self._signing_key
+
+    def _connection(self):
+        if self._db is None:
+            os.makedirs(self.blob_dir, exist_ok=True)
+            db = sqlite3.connect(os.path.join(self.root, "projects.sqlite3"), timeout=30, check_same_thread=False)
+            db.row_factory = sqlite3.Row
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA foreign_keys=ON")
+            db.executescript(PROJECT_SCHEMA)
+            # Databases from before projects had owners; their projects get
+            # none, so no browser lists them
+            if "owner" not in [row['name'] for row in db.execute("PRAGMA table_info(projects)")]:
+                db.execute("ALTER TABLE projects ADD COLUMN owner TEXT NOT NULL DEFAULT ''")
+            db.execute("CREATE INDEX IF NOT EXISTS projects_owner ON projects (owner, updated)")
+            self._db = db
+        return self._db
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._connection().execute(sql, params).fetchall()
+
+    def create(self, title, owner):
+        """New empty project of `owner`; returns its id"""
+        project_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        with self._lock, self._connection() as db:
+            db.execute("INSERT INTO projects (id, owner, title, created, updated) VALUES (?, ?, ?, ?, ?)",
+                       (project_id, owner, title, now, now))
+        return project_id
+
+    def save_analysis(self, project_id, text, items, settings):
+        """Replace the project's document, sentence results and settings"""
+        rows = [
+            (project_id, position, item['sentence'], item.get('translated_sentence'), item['emotion'], float(item['score']),
+             json.dumps(item['probabilities']) if 'probabilities' in item else None)
+            for position, item in enumerate(items)
+        ]
+        with self._lock, self._connection() as db:
+            db.execute("UPDATE projects SET updated = ?, sentence_count = ?, settings = ? WHERE id = ?",
+                       (time.time(), len(items), json.dumps(settings), project_id))
+            db.execute("INSERT OR REPLACE INTO documents (project_id, text) VALUES (?, ?)", (project_id, text))
+            db.execute("DELETE FROM sentences WHERE project_id = ?", (project_id,))
+            db.executemany("INSERT INTO sentences VALUES (?, ?, ?, ?, ?, ?, ?)", rows)
+
+    def save_artifact(self, project_id, kind, data):
+        """Record a report, audio result or other output (JSON `data`) for the project"""
+        now = time.time()
+        with self._lock, self._connection() as db:
+            db.execute("INSERT OR REPLACE INTO artifacts VALUES (?, ?, ?, ?)",
+                       (project_id, kind, json.dumps(data, default=str), now))
+            db.execute("UPDATE projects SET updated = ? WHERE id = ?", (now, project_id))
+
+    def recent(self, owner, limit=10):
+        """Most recently saved projects of `owner`, metadata only"""
+        return [dict(row) for row in self._query(
+            "SELECT id, title, updated, sentence_count FROM projects WHERE owner = ? ORDER BY updated DESC LIMIT ?",
+            (owner, limit))]
+
+    def project(self, project_id, owner):
+        """A project's metadata and settings, or None if `owner` has no such project"""
+        rows = self._query("SELECT * FROM projects WHERE id = ? AND owner = ?", (project_id, owner))
+        if not rows:
+            return None
+        project = dict(rows[0])
+        project['settings'] = json.loads(project['settings'])
+        return project
+
+    def document(self, project_id):
+        rows = self._query("SELECT text FROM documents WHERE project_id = ?", (project_id,))
+        return rows[0]['text'] if rows else ""
+
+    def sentences(self, project_id, start=0, stop=None):
+        """The project's analysis items from position `start` up to `stop`, in the shape run_analysis_job() returns them"""
+        items = []
+        for row in self._query(
+                "SELECT * FROM sentences WHERE project_id = ? AND position >= ? AND position < ? ORDER BY position",
+                (project_id, start, sys.maxsize if stop is None else stop)):
+            item = {'sentence': row['sentence'], 'emotion': row['emotion'], 'score': row['score']}
+            if row['probabilities'] is not None:
+                item['probabilities'] = json.loads(row['probabilities'])
+            if row['translated'] is not None:
+                item['translated_sentence'] = row['translated']
+            items.append(item)
+        return items
+
+    def probabilities(self, project_id):
+        """The project's probability rows as one float32 matrix, or None if any sentence has none"""
+        rows = self._query("SELECT probabilities FROM sentences WHERE project_id = ? ORDER BY position", (project_id,))
+        if np is None or not rows or any(row['probabilities'] is None for row in rows):
+            return None
+        matrix = np.empty((len(rows), len(json.loads(rows[0]['probabilities']))), dtype=np.float32)
+        for position, row in enumerate(rows):
+            matrix[position] = json.loads(row['probabilities'])
+        return matrix
+
+    def translated(self, project_id):
+        """Whether every sentence of the project has a translation"""
+        rows = self._query("SELECT COUNT(*) AS total, COUNT(translated) AS translated FROM sentences WHERE project_id = ?",
+                           (project_id,))
+        return rows[0]['total'] > 0 and rows[0]['translated'] == rows[0]['total']
+
+    def artifact(self, project_id, kind):
+        rows = self._query("SELECT data FROM artifacts WHERE project_id = ? AND kind = ?", (project_id, kind))
+        return json.loads(rows[0]['data']) if rows else None
+
+    def blob_path(self, name):
+        return os.path.join(self.blob_dir, name[:2], name)
+
+    def _store_blob(self, name, write):
+        target = self.blob_path(name)
+        if not os.path.exists(target):
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            tmp = f"{target}.{uuid.uuid4().hex}.tmp"
+            write(tmp)
+            os.replace(tmp, target)
+        return name
+
+    def put_file(self, path):
+        """Copy a file into the blob directory; returns its blob name"""
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b""):
+                digest.update(chunk)
+        return self._store_blob(digest.hexdigest() + os.path.splitext(path)[1].lower(),
+                                functools.partial(shutil.copyfile, path))
+
+    def put_bytes(self, data, suffix):
+        def write(tmp):
+            with open(tmp, 'wb') as f:
+                f.write(data)
+        return self._store_blob(hashlib.sha256(data).hexdigest() + suffix, write)
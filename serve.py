@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Production Launcher
+Starts the health/readiness endpoint, the HTTP API (when EATTS_API_PORT is
+set), capability detection and the model warm-up when the process starts,
+then runs the Streamlit UI in the same process so every browser session and
+API client shares the app's caches.
+
+With `streamlit run app.py` those only start with the first browser
+session, which is too late for an orchestrator's readiness probe.
+
+Usage:
+    EATTS_HEALTH_PORT=8502 python serve.py [streamlit options...]
+    e.g. python serve.py --server.port 8501
+    EATTS_API_PORT=8503 python serve.py   # also serve the HTTP API
+"""
+
+import os
+import sys
+
+import streamlit.runtime
+
+if streamlit.runtime.exists():
+    # Script run for a browser session: `app` is imported once per process,
+    # so its caches and background services are shared by all sessions
+    import app
+    app.run()
+else:
+    def main():
+        os.environ.setdefault("EATTS_HEALTH_PORT", "8502")
+
+        import app
+        app.start_health_server()
+        app.start_api_server()
+        app.start_model_warmup()
+
+        sys.argv = ["streamlit", "run", os.path.abspath(__file__)] + sys.argv[1:]
+        from streamlit.web import cli
+        return cli.main()
+
+    if __name__ == "__main__":
+        sys.exit(main())
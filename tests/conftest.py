@@ -0,0 +1,15 @@
+"""
+Test setup: the repository root is importable, and importing app.py
+starts none of its background services (health endpoint, model warm-up,
+HTTP API, project store).
+"""
+
+import os
+import sys
+
+os.environ["EATTS_HEALTH_PORT"] = "0"
+os.environ["EATTS_MODEL_WARMUP"] = "0"
+os.environ["EATTS_API_PORT"] = "0"
+os.environ["EATTS_PROJECTS"] = "0"
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,74 @@
+import json
+
+import app
+
+
+def clip(emotion, text, duration_ms):
+    return ("clip.mp3", {'sentence': text, 'emotion': emotion, 'duration_ms': duration_ms})
+
+
+CLIPS = [clip("joy", "Hello there!", 1000), clip("sadness", "It rained\nall day.", 2500), clip("fear", "Run <now> & hide.", 500)]
+
+
+def test_clips_overlap_by_the_crossfade():
+    stamps = app.clip_timestamps(CLIPS, crossfade_ms=40)
+    assert [(stamp['start_ms'], stamp['end_ms']) for stamp in stamps] == [(0, 1000), (960, 3460), (3420, 3920)]
+    assert [stamp['emotion'] for stamp in stamps] == ["joy", "sadness", "fear"]
+    assert [stamp['index'] for stamp in stamps] == [0, 1, 2]
+
+
+def test_crossfade_is_limited_by_short_clips():
+    stamps = app.clip_timestamps([clip("joy", "A.", 1000), clip("joy", "B.", 10), clip("joy", "C.", 1000)],
+                                 crossfade_ms=40)
+    assert [(stamp['start_ms'], stamp['end_ms']) for stamp in stamps] == [(0, 1000), (990, 1000), (990, 1990)]
+
+
+def test_no_crossfade():
+    stamps = app.clip_timestamps(CLIPS, crossfade_ms=0)
+    assert [(stamp['start_ms'], stamp['end_ms']) for stamp in stamps] == [(0, 1000), (1000, 3500), (3500, 4000)]
+
+
+def test_spoken_text_is_preferred():
+    _, item = clip("joy", "Hello.", 100)
+    stamps = app.clip_timestamps([("a.mp3", {**item, 'text_to_speak': "Hola."})])
+    assert stamps[0]['text'] == "Hola."
+
+
+def test_unknown_duration():
+    assert app.clip_timestamps([clip("joy", "A.", 100), clip("joy", "B.", None)]) is None
+    assert app.clip_timestamps([]) is None
+
+
+def test_srt():
+    srt = app.timestamps_to_srt(app.clip_timestamps(CLIPS, crossfade_ms=40))
+    # A cue ends where the next one starts, so players never show two at once
+    assert srt == (
+        "1\n00:00:00,000 --> 00:00:00,960\nHello there!\n"
+        "\n2\n00:00:00,960 --> 00:00:03,420\nIt rained all day.\n"
+        "\n3\n00:00:03,420 --> 00:00:03,920\nRun <now> & hide.\n"
+    )
+
+
+def test_vtt():
+    vtt = app.timestamps_to_vtt(app.clip_timestamps(CLIPS, crossfade_ms=40))
+    assert vtt.splitlines() == [
+        "WEBVTT", "",
+        "1", "00:00:00.000 --> 00:00:00.960", "<c.joy>Hello there!</c>", "",
+        "2", "00:00:00.960 --> 00:00:03.420", "<c.sadness>It rained all day.</c>", "",
+        "3", "00:00:03.420 --> 00:00:03.920", "<c.fear>Run &lt;now&gt; &amp; hide.</c>",
+    ]
+
+
+def test_caption_time_past_an_hour():
+    stamps = [{'index': 0, 'start_ms': 3723004, 'end_ms': 3724000.4, 'emotion': "joy", 'text': "Late."}]
+    assert "01:02:03,004 --> 01:02:04,000" in app.timestamps_to_srt(stamps)
+    assert "01:02:03.004 --> 01:02:04.000" in app.timestamps_to_vtt(stamps)
+
+
+def test_json_timing_map():
+    stamps = app.clip_timestamps(CLIPS, crossfade_ms=40)
+    timing = json.loads(app.timestamps_to_json(stamps))
+    assert timing['duration_ms'] == 3920
+    assert timing['sentences'][1] == {'index': 1, 'start_ms': 960, 'end_ms': 3460, 'emotion': "sadness",
+                                      'text': "It rained\nall day."}
+    assert json.loads(app.timestamps_to_json([])) == {'duration_ms': 0, 'sentences': []}
@@ -0,0 +1,145 @@
+import numpy as np
+import pytest
+
+import app
+import benchmark
+
+EXPLANATORY = [
+    "Photosynthesis is the process by which plants convert light into chemical energy.",
+    "The mitochondria is known as the powerhouse of the cell.",
+    "Table 2 lists the boiling points of each compound at sea level.",
+    "An equation of this form is called a quadratic equation.",
+]
+
+
+class FakeModel:
+    """Stands in for the pipeline: labels every sentence `label` and records what it was asked"""
+
+    def __init__(self, label="fear"):
+        self.label = label
+        self.calls = []
+
+    def __call__(self, texts, **kwargs):
+        self.calls.append(list(texts))
+        return [[{'label': self.label, 'score': 0.9}, {'label': "neutral", 'score': 0.1}] for _ in texts]
+
+    @property
+    def seen(self):
+        return [text for call in self.calls for text in call]
+
+
+def cascade(**kwargs):
+    return app.EmotionCascade(**{'audit_rate': 0.0, 'learn': False, **kwargs})
+
+
+def test_explanatory_text_skips_the_model():
+    model = FakeModel()
+    outputs = cascade()(EXPLANATORY, model=model)
+    assert model.calls == []
+    assert [output[0]['label'] for output in outputs] == ["neutral"] * len(EXPLANATORY)
+
+
+def test_course_text_rarely_escalates():
+    # The escalation rates benchmark.py reports for detect_emotions.cascade.course and detect_emotions.cascade
+    course, mixed = cascade(), cascade()
+    course(benchmark.COURSE_SENTENCES, model=FakeModel())
+    mixed(benchmark.SAMPLE_SENTENCES, model=FakeModel())
+    assert course.stats()['escalation_rate'] <= 0.1
+    assert mixed.stats()['escalation_rate'] >= 0.5
+
+
+def test_confident_outputs_rank_every_label():
+    [output] = cascade()(["The results were wonderful and we celebrate this amazing success."], model=FakeModel())
+    assert output[0]['label'] == "joy"
+    assert sorted(entry['label'] for entry in output) == sorted(app.EMOTION_LABELS)
+    scores = [entry['score'] for entry in output]
+    assert scores == sorted(scores, reverse=True)
+    assert sum(scores) == pytest.approx(1.0)
+
+
+@pytest.mark.parametrize("sentence", [
+    "I am happy.",  # one cue word only ties with the neutral prior
+    "She missed him so much after he died.",  # pronouns and loss pull neutral below the margin
+    "Watch out!",
+    "Xyzzy plugh.",  # no feature the linear model knows
+])
+def test_uncertain_sentences_escalate(sentence):
+    model = FakeModel()
+    [output] = cascade()([sentence], model=model)
+    assert model.seen == [sentence]
+    assert output == [{'label': "fear", 'score': 0.9}, {'label': "neutral", 'score': 0.1}]
+
+
+def test_only_uncertain_sentences_escalate_in_order():
+    model = FakeModel()
+    texts = [EXPLANATORY[0], "I cried all night.", EXPLANATORY[1], "Xyzzy plugh."]
+    outputs = cascade()(texts, model=model)
+    assert model.calls == [["I cried all night.", "Xyzzy plugh."]]
+    assert [output[0]['label'] for output in outputs] == ["neutral", "fear", "neutral", "fear"]
+
+
+def test_single_string_and_empty_input():
+    model = FakeModel()
+    assert cascade()([], model=model) == [] and model.calls == []
+    assert len(cascade()(EXPLANATORY[0], model=model)) == 1
+
+
+def test_stats():
+    instance = cascade()
+    instance(EXPLANATORY + ["I cried all night."], model=FakeModel())
+    stats = instance.stats()
+    assert stats['sentences'] == 5 and stats['escalated'] == 1 and stats['audited'] == 0
+    assert stats['escalation_rate'] == pytest.approx(0.2)
+    assert stats['agreement'] == 0.0  # the linear model's label lost to the model's on the escalated sentence
+
+
+def test_audit_sends_confident_sentences_too():
+    instance = cascade(audit_rate=1.0)
+    model = FakeModel(label="neutral")
+    outputs = instance(EXPLANATORY, model=model)
+    assert model.seen == EXPLANATORY
+    assert outputs[0] == [{'label': "neutral", 'score': 0.9}, {'label': "neutral", 'score': 0.1}]
+    stats = instance.stats()
+    assert stats['escalated'] == 0 and stats['audited'] == 4 and stats['audit_agreement'] == 1.0
+    assert stats['estimated_agreement'] == 1.0
+
+
+def test_audit_choice_is_stable():
+    instance = cascade(audit_rate=0.5)
+    texts = [f"Sentence number {i} is about cells." for i in range(200)]
+    chosen = [instance._audited(text) for text in texts]
+    assert chosen == [instance._audited(text) for text in texts]
+    assert 60 < sum(chosen) < 140
+
+
+def test_weights_stay_fixed_unless_learning():
+    fixed, learning = cascade(), cascade(learn=True)
+    weights = fixed._weights.copy()
+    for instance in (fixed, learning):
+        instance(["Xyzzy plugh.", "I cried all night."], model=FakeModel())
+    assert np.array_equal(fixed._weights, weights)
+    assert not np.array_equal(learning._weights, weights)
+
+
+def test_learning_moves_towards_the_models_label():
+    instance = cascade(learn=True)
+    before = instance.probabilities([instance.features("Xyzzy plugh.")])[0]
+    for _ in range(5):
+        instance(["Xyzzy plugh."], model=FakeModel(label="fear"))
+    after = instance.probabilities([instance.features("Xyzzy plugh.")])[0]
+    fear = instance.labels.index("fear")
+    assert after[fear] > before[fear]
+
+
+def test_each_model_has_its_own_cascade():
+    assert app.emotion_cascade("small") is app.emotion_cascade("small")
+    assert app.emotion_cascade("small") is not app.emotion_cascade("base")
+
+
+def test_with_cascade(monkeypatch):
+    model = FakeModel()
+    assert app.with_cascade(None) is None
+    classifier = app.with_cascade(model, "base")
+    assert classifier(EXPLANATORY[:1])[0][0]['label'] == "neutral" and model.calls == []
+    monkeypatch.setattr(app, "CASCADE_ENABLED", False)
+    assert app.with_cascade(model, "base") is model
@@ -0,0 +1,78 @@
+import struct
+from io import BytesIO
+
+import pytest
+
+import id3_chapters
+
+CHAPTERS = [(0, 1500, "1. Joy: Hello there!"), (1500, 4200, "2-3. Sadness: Ça va… 日本")]
+
+
+def frames(data):
+    """(frame id, payload) of each frame in an ID3v2.3 frame area"""
+    found = []
+    while data:
+        frame_id, size = data[:4].decode("ascii"), struct.unpack(">I", data[4:8])[0]
+        found.append((frame_id, data[10:10 + size]))
+        data = data[10 + size:]
+    return found
+
+
+def test_header_size_is_syncsafe():
+    tag = id3_chapters.chapter_tag(CHAPTERS)
+    assert tag[:6] == b"ID3\x03\x00\x00"
+    assert all(byte < 0x80 for byte in tag[6:10])
+    assert id3_chapters.tag_length(tag) == len(tag)
+
+
+def test_table_of_contents_lists_every_chapter():
+    tag = id3_chapters.chapter_tag(CHAPTERS)
+    (toc_id, toc), *chapters = frames(tag[10:])
+    assert toc_id == "CTOC"
+    assert toc == b"toc\x00\x03\x02ch0\x00ch1\x00"
+    assert [frame_id for frame_id, _ in chapters] == ["CHAP", "CHAP"]
+
+
+def test_chapter_times_and_titles():
+    tag = id3_chapters.chapter_tag(CHAPTERS)
+    for (_, payload), (start_ms, end_ms, title), element_id in zip(frames(tag[10:])[1:], CHAPTERS, [b"ch0", b"ch1"]):
+        assert payload.startswith(element_id + b"\x00")
+        offset = len(element_id) + 1
+        assert struct.unpack(">IIII", payload[offset:offset + 16]) == (start_ms, end_ms, 0xFFFFFFFF, 0xFFFFFFFF)
+        [(sub_id, text)] = frames(payload[offset + 16:])
+        assert sub_id == "TIT2"
+        assert text[0] == 1 and text.endswith(b"\x00\x00")
+        assert text[1:-2].decode("utf-16") == title
+
+
+def test_no_chapters():
+    tag = id3_chapters.chapter_tag([])
+    assert frames(tag[10:]) == [("CTOC", b"toc\x00\x03\x00")]
+
+
+def test_too_many_chapters():
+    # The table of contents counts its entries in one byte
+    with pytest.raises(ValueError):
+        id3_chapters.chapter_tag([(i, i + 1, str(i)) for i in range(256)])
+
+
+def test_strip_tag():
+    audio = b"\xff\xfb\x90\x00" + bytes(100)
+    assert id3_chapters.strip_tag(id3_chapters.chapter_tag(CHAPTERS) + audio) == audio
+    assert id3_chapters.strip_tag(audio) == audio
+    assert id3_chapters.tag_length(b"ID3") == 0
+
+
+def test_tag_length_counts_the_footer():
+    header = b"ID3\x04\x00\x10\x00\x00\x01\x00"  # 128-byte body and a footer
+    assert id3_chapters.tag_length(header) == 10 + 128 + 10
+
+
+def test_mutagen_reads_the_chapters():
+    id3 = pytest.importorskip("mutagen.id3")
+    tags = id3.ID3()
+    tags.load(BytesIO(id3_chapters.chapter_tag(CHAPTERS) + b"\xff\xfb\x90\x00" + bytes(400)))
+    toc = tags.getall("CTOC")[0]
+    assert toc.child_element_ids == ["ch0", "ch1"]
+    chapters = sorted(tags.getall("CHAP"), key=lambda chap: chap.start_time)
+    assert [(chap.start_time, chap.end_time, str(chap.sub_frames["TIT2"])) for chap in chapters] == CHAPTERS
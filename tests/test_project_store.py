@@ -0,0 +1,147 @@
+import os
+import sqlite3
+import stat
+
+import numpy as np
+import pytest
+
+import app
+from project_store import ProjectStore
+
+OWNER = "ab" * 16
+
+
+def make_items(count, seed=0):
+    rng = np.random.default_rng(seed)
+    items = []
+    for i in range(count):
+        probabilities = rng.dirichlet(np.ones(len(app.EMOTION_LABELS))).round(4).tolist()
+        best = int(np.argmax(probabilities))
+        items.append({'sentence': f"Sentence {i}.", 'translated_sentence': f"Frase {i}.",
+                      'emotion': app.EMOTION_LABELS[best], 'score': probabilities[best],
+                      'probabilities': probabilities})
+    return items
+
+
+@pytest.fixture
+def store(tmp_path):
+    return ProjectStore(str(tmp_path / "projects"))
+
+
+def saved(store, items, owner=OWNER):
+    project_id = store.create("Test", owner)
+    store.save_analysis(project_id, "The document.", items, {'analysis': ["es", "auto"]})
+    return project_id
+
+
+def test_round_trip(store):
+    items = make_items(5)
+    project_id = saved(store, items)
+    project = store.project(project_id, OWNER)
+    assert project['sentence_count'] == 5
+    assert project['settings'] == {'analysis': ["es", "auto"]}
+    assert store.document(project_id) == "The document."
+    assert store.sentences(project_id) == items
+    assert store.sentences(project_id, 1, 3) == items[1:3]
+    assert store.translated(project_id)
+    np.testing.assert_allclose(store.probabilities(project_id), [item['probabilities'] for item in items], atol=1e-6)
+
+
+def test_save_analysis_replaces_rows(store):
+    project_id = saved(store, make_items(5))
+    store.save_analysis(project_id, "Shorter.", make_items(2, seed=1), {})
+    assert store.project(project_id, OWNER)['sentence_count'] == 2
+    assert store.sentences(project_id) == make_items(2, seed=1)
+
+
+def test_missing_rows_and_translations(store):
+    items = make_items(3)
+    del items[1]['probabilities']
+    del items[2]['translated_sentence']
+    project_id = saved(store, items)
+    assert store.probabilities(project_id) is None
+    assert not store.translated(project_id)
+    assert 'probabilities' not in store.sentences(project_id)[1]
+    assert 'translated_sentence' not in store.sentences(project_id)[2]
+
+
+def test_projects_are_per_owner(store):
+    mine = saved(store, make_items(1))
+    saved(store, make_items(1), owner="cd" * 16)
+    assert [project['id'] for project in store.recent(OWNER)] == [mine]
+    assert store.project(mine, "cd" * 16) is None
+    assert store.recent(OWNER, limit=0) == []
+
+
+def test_artifacts_and_blobs(store, tmp_path):
+    project_id = saved(store, make_items(1))
+    assert store.artifact(project_id, "report") is None
+    store.save_artifact(project_id, "report", {'blob': "x.pdf"})
+    assert store.artifact(project_id, "report") == {'blob': "x.pdf"}
+    name = store.put_bytes(b"%PDF", ".pdf")
+    assert store.put_bytes(b"%PDF", ".pdf") == name
+    source = tmp_path / "speech.MP3"
+    source.write_bytes(b"%PDF")
+    assert store.put_file(str(source)) == name.replace(".pdf", ".mp3")
+    with open(store.blob_path(name), 'rb') as f:
+        assert f.read() == b"%PDF"
+
+
+def test_signing_key_is_private_and_stable(store):
+    key = store.signing_key()
+    assert len(key) == 32
+    path = os.path.join(store.root, "owner.key")
+    assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+    assert ProjectStore(store.root).signing_key() == key
+
+
+def test_migrates_projects_without_owners(tmp_path):
+    root = tmp_path / "projects"
+    root.mkdir()
+    db = sqlite3.connect(root / "projects.sqlite3")
+    db.executescript("""
+        CREATE TABLE projects (id TEXT PRIMARY KEY, title TEXT NOT NULL, created REAL NOT NULL, updated REAL NOT NULL,
+                               sentence_count INTEGER NOT NULL DEFAULT 0, settings TEXT NOT NULL DEFAULT '{}');
+        INSERT INTO projects (id, title, created, updated) VALUES ('old', 'Old', 0, 0);
+    """)
+    db.commit()
+    db.close()
+    store = ProjectStore(str(root))
+    # Old projects keep their rows but belong to no browser
+    assert store.recent(OWNER) == []
+    assert store.project("old", "")['title'] == "Old"
+    columns = [row['name'] for row in store._query("PRAGMA table_info(projects)")]
+    assert "owner" in columns
+    assert store.project(saved(store, make_items(1)), OWNER) is not None
+
+
+def test_project_sentences_pages(store, monkeypatch):
+    monkeypatch.setattr(app, "PROJECT_PAGE_SIZE", 4)
+    items = make_items(10)
+    project_id = saved(store, items)
+    view = app.ProjectSentences.load(store, store.project(project_id, OWNER))
+    assert len(view) == 10 and view.translated
+    assert view[0] == items[0]
+    assert view[-1] == items[-1]
+    assert view[3:7] == items[3:7]
+    assert view[8:20] == items[8:]
+    assert view[5:2] == []
+    assert view[::3] == items[::3]
+    assert list(view) == items
+    assert list(view.column('translated_sentence')) == [item['translated_sentence'] for item in items]
+    with pytest.raises(IndexError):
+        view[10]
+
+
+@pytest.mark.parametrize("window, margin", [(1, 0.0), (3, 0.0), (5, 0.1), (1, 0.2)])
+def test_project_sentences_smooth_like_lists(store, window, margin):
+    items = make_items(30)
+    project_id = saved(store, items)
+    view = app.ProjectSentences.load(store, store.project(project_id, OWNER))
+    expected = app.apply_emotion_smoothing(items, window, margin)
+    smoothed = app.apply_emotion_smoothing(view, window, margin)
+    assert [item['emotion'] for item in smoothed] == [item['emotion'] for item in expected]
+    np.testing.assert_allclose([item['score'] for item in smoothed], [item['score'] for item in expected], atol=1e-4)
+    assert smoothed[7]['emotion'] == expected[7]['emotion']
+    # Smoothing makes a new view; the stored rows are unchanged
+    assert view[7] == items[7]
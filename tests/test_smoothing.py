@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+import app
+
+LABELS = app.EMOTION_LABELS
+
+
+def random_matrix(rows, seed=0):
+    return np.random.default_rng(seed).dirichlet(np.ones(len(LABELS)), size=rows).astype(np.float32)
+
+
+def reference_hysteresis(matrix, margin):
+    """Row by row: switch only when another label leads the current one by `margin`"""
+    current = int(matrix[0].argmax())
+    labels = []
+    for row in matrix:
+        best = int(row.argmax())
+        if best != current and row[best] - row[current] >= margin:
+            current = best
+        labels.append(current)
+    return labels
+
+
+def one_hot(*names):
+    return np.asarray([[1.0 if label == name else 0.0 for label in LABELS] for name in names], dtype=np.float32)
+
+
+def test_probability_row_full_output():
+    row = app.probability_row([{'label': "JOY", 'score': 0.6}, {'label': "sadness", 'score': 0.3},
+                               {'label': "disgust", 'score': 0.1}])
+    assert row.dtype == np.float32
+    assert row[LABELS.index("joy")] == pytest.approx(0.6)
+    # Labels without voice settings are voiced, and counted, as neutral
+    assert row[LABELS.index("neutral")] == pytest.approx(0.1)
+    assert row.sum() == pytest.approx(1.0)
+
+
+def test_probability_row_top_label_only():
+    row = app.probability_row([[{'label': "fear", 'score': 0.7}]])
+    assert row[LABELS.index("fear")] == pytest.approx(0.7)
+    assert np.allclose(np.delete(row, LABELS.index("fear")), 0.05)
+
+
+def test_probability_row_without_scores():
+    row = app.probability_row([])
+    np.testing.assert_allclose(row, 1 / len(LABELS))
+
+
+def test_window_one_is_a_copy():
+    matrix = random_matrix(5)
+    smoothed = app.smooth_probabilities(matrix, 1)
+    assert np.array_equal(smoothed, matrix) and smoothed is not matrix
+
+
+@pytest.mark.parametrize("window", [2, 3, 5, 8])
+def test_centred_window_shrinks_at_the_edges(window):
+    matrix = random_matrix(12)
+    half = window // 2
+    expected = [matrix[max(0, i - half):i + half + 1].mean(axis=0) for i in range(len(matrix))]
+    np.testing.assert_allclose(app.smooth_probabilities(matrix, window), expected, atol=1e-6)
+
+
+def test_smoothed_rows_stay_distributions():
+    smoothed = app.smooth_probabilities(random_matrix(50), 7)
+    assert smoothed.dtype == np.float32
+    np.testing.assert_allclose(smoothed.sum(axis=1), 1.0, atol=1e-5)
+
+
+def test_smoothing_removes_a_lone_flip():
+    matrix = one_hot("sadness", "sadness", "joy", "sadness", "sadness")
+    labels = app.smooth_probabilities(matrix, 3).argmax(axis=1)
+    assert [LABELS[label] for label in labels] == ["sadness"] * 5
+
+
+def test_hysteresis_off_is_argmax():
+    matrix = random_matrix(20)
+    assert np.array_equal(app.hysteresis_labels(matrix, 0), matrix.argmax(axis=1))
+
+
+def test_hysteresis_holds_a_narrow_lead():
+    joy, sadness = LABELS.index("joy"), LABELS.index("sadness")
+    matrix = np.zeros((4, len(LABELS)), dtype=np.float32)
+    matrix[:, joy] = [0.9, 0.45, 0.3, 0.45]
+    matrix[:, sadness] = [0.1, 0.55, 0.7, 0.55]
+    assert [LABELS[label] for label in app.hysteresis_labels(matrix, 0.2)] == ["joy", "joy", "sadness", "sadness"]
+
+
+@pytest.mark.parametrize("margin", [0.05, 0.1, 0.3])
+@pytest.mark.parametrize("seed", range(5))
+def test_hysteresis_matches_the_row_by_row_rule(margin, seed):
+    matrix = app.smooth_probabilities(random_matrix(200, seed), 3)
+    assert app.hysteresis_labels(matrix, margin).tolist() == reference_hysteresis(matrix, margin)
+
+
+def test_apply_smoothing_relabels_items():
+    matrix = one_hot("sadness", "sadness", "joy", "sadness", "sadness")
+    items = [{'sentence': f"S{i}.", 'emotion': LABELS[int(row.argmax())], 'score': 1.0, 'probabilities': row.tolist()}
+             for i, row in enumerate(matrix)]
+    smoothed = app.apply_emotion_smoothing(items, 3, 0)
+    assert [item['emotion'] for item in smoothed] == ["sadness"] * 5
+    assert smoothed[2]['score'] == pytest.approx(2 / 3)
+    assert smoothed[2]['sentence'] == "S2." and items[2]['emotion'] == "joy"
+
+
+def test_apply_smoothing_leaves_items_without_probabilities():
+    items = [{'sentence': "A.", 'emotion': "joy", 'score': 0.9}, {'sentence': "B.", 'emotion': "fear", 'score': 0.8}]
+    assert app.apply_emotion_smoothing(items, 5, 0.1) == items
+    assert app.emotion_matrix(items) is None
+
+
+def test_summary():
+    summary = app.emotion_summary(one_hot("joy", "joy", "neutral", "neutral", "neutral", "fear"))
+    assert summary['dominant'] == "neutral"
+    assert summary['dominant_emotional'] == "joy"
+    assert summary['shares']['neutral'] == pytest.approx(0.5)
+    assert summary['mean']['fear'] == pytest.approx(1 / 6)
+    assert summary['changes'] == 2
+    assert summary['uncertainty'] == pytest.approx(0.0, abs=1e-6)
+
+
+def test_summary_uncertainty_of_uniform_rows():
+    uniform = np.full((3, len(LABELS)), 1 / len(LABELS), dtype=np.float32)
+    assert app.emotion_summary(uniform)['uncertainty'] == pytest.approx(1.0, abs=1e-5)